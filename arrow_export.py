@@ -0,0 +1,162 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from transaction_buffer import MONEY_COLUMNS, TIMESTAMP_COLUMNS
+
+"""
+    Arrow / Parquet 导出
+    低基数的字符串列(开户行、交易类型、职业、学历、地址等)做字典编码，
+    时间戳保存为 int64 秒(或 timestamp[s])，金额保存为 decimal128(18, 2) 或 int64 分，
+    下游直接按列读取，不再需要解析 CSV
+"""
+
+# 交易表中做字典编码的列
+TRANSACTION_DICTIONARY_COLUMNS = ("sender_card_bank", "receiver_card_bank", "transaction_type", "typology")
+
+# 人员表中做字典编码的列
+PERSON_DICTIONARY_COLUMNS = ("gender", "occupation", "income_level", "marital_status", "address", "education")
+
+# 人员表中以分保存的金额列
+PERSON_MONEY_COLUMNS = ("monthly_income",)
+
+# 公司表中做字典编码的列和以分保存的金额列
+COMPANY_DICTIONARY_COLUMNS = ("company_type", "industry", "address", "bank", "risk_level")
+COMPANY_MONEY_COLUMNS = ("registered_capital",)
+
+# 金额编码: decimal -> decimal128(18, 2) 元, cents -> int64 分
+MONEY_ENCODINGS = ("decimal", "cents")
+
+# 时间戳编码: int64 -> 距 1970-01-01 的秒数, timestamp -> timestamp[s]
+TIMESTAMP_ENCODINGS = ("int64", "timestamp")
+
+DECIMAL_TYPE = pa.decimal128(18, 2)
+
+
+def money_array(cents, money="decimal"):
+    """
+    把 int64 分转换为 Arrow 金额列
+
+    decimal128 的存储值就是去掉小数点后的整数，所以分可以原样作为 scale=2 的存储值，
+    不经过浮点数，也不做除法
+
+    Args:
+        cents (np.ndarray): int64 分
+        money (str): decimal / cents
+    """
+    cents = pa.array(np.asarray(cents, dtype=np.int64))
+    if money == "cents":
+        return cents
+    if money != "decimal":
+        raise ValueError(f"不支持的金额编码: {money}, 可选 {MONEY_ENCODINGS}")
+    unscaled = cents.cast(pa.decimal128(19, 0))
+    return pa.Array.from_buffers(DECIMAL_TYPE, len(unscaled), unscaled.buffers())
+
+
+def timestamp_array(seconds, timestamp="int64"):
+    """
+    把 int64 秒转换为 Arrow 时间戳列
+
+    Args:
+        seconds (np.ndarray): 距 1970-01-01 的秒数
+        timestamp (str): int64 / timestamp
+    """
+    seconds = pa.array(np.asarray(seconds, dtype=np.int64))
+    if timestamp == "int64":
+        return seconds
+    if timestamp != "timestamp":
+        raise ValueError(f"不支持的时间戳编码: {timestamp}, 可选 {TIMESTAMP_ENCODINGS}")
+    return seconds.cast(pa.timestamp("s"))
+
+
+def dictionary_array(values):
+    """字符串列 -> dictionary<int32, string>"""
+    return pa.array(np.asarray(values, dtype=object), type=pa.string()).dictionary_encode()
+
+
+def columns_to_arrow(columns, dictionary_columns=(), money_columns=(), timestamp_columns=(), money="decimal",
+                     timestamp="int64"):
+    """
+    把内部列(金额为 int64 分、时间戳为 int64 秒)转换为 pyarrow.Table
+
+    Args:
+        columns (dict | pd.DataFrame): 列名到等长数组的映射
+        dictionary_columns (tuple): 做字典编码的列
+        money_columns (tuple): 以分保存的金额列
+        timestamp_columns (tuple): 以秒保存的时间戳列
+        money (str): decimal / cents
+        timestamp (str): int64 / timestamp
+    """
+    arrays = {}
+    for name in columns:
+        values = columns[name]
+        if name in dictionary_columns:
+            arrays[name] = dictionary_array(values)
+        elif name in money_columns:
+            arrays[name] = money_array(values, money)
+        elif name in timestamp_columns:
+            arrays[name] = timestamp_array(values, timestamp)
+        else:
+            arrays[name] = pa.array(np.asarray(values))
+
+    table = pa.table(arrays)
+    return table.replace_schema_metadata({"money": money, "timestamp": timestamp})
+
+
+def transactions_to_arrow(columns, money="decimal", timestamp="int64"):
+    """
+    交易列 -> pyarrow.Table
+
+    Args:
+        columns (dict): TransactionBuffer / iter_transactions 产出的列
+        money (str): decimal / cents
+        timestamp (str): int64 / timestamp
+    """
+    return columns_to_arrow(columns, TRANSACTION_DICTIONARY_COLUMNS, MONEY_COLUMNS, TIMESTAMP_COLUMNS, money,
+                            timestamp)
+
+
+def persons_to_arrow(persons, money="decimal"):
+    """
+    人员表 -> pyarrow.Table
+
+    Args:
+        persons (pd.DataFrame): generate_person 产出的人员表(月收入为分)
+        money (str): decimal / cents
+    """
+    return columns_to_arrow(persons, PERSON_DICTIONARY_COLUMNS, PERSON_MONEY_COLUMNS, money=money)
+
+
+def companies_to_arrow(companies, money="decimal"):
+    """
+    公司表 -> pyarrow.Table, 成立日期保存为 date32
+
+    Args:
+        companies (pd.DataFrame): generate_company 产出的公司表(注册资本为分)
+        money (str): decimal / cents
+    """
+    table = columns_to_arrow(companies, COMPANY_DICTIONARY_COLUMNS, COMPANY_MONEY_COLUMNS, money=money)
+    index = table.schema.get_field_index("establishment_date")
+    if index >= 0:
+        table = table.set_column(index, "establishment_date", table.column(index).cast(pa.date32()))
+    return table
+
+
+def parquet_writer(path, schema):
+    """
+    打开 Parquet 写出器: 字典编码列保持字典页, decimal128(18, 2) 以 INT64 物理类型存储
+    """
+    return pq.ParquetWriter(path, schema, use_dictionary=True, store_decimal_as_integer=True)
+
+
+def write_parquet(table, path, row_group_size=None):
+    """
+    写出整张表
+
+    Args:
+        table (pa.Table): 待写出的表
+        path (str): 输出文件路径
+        row_group_size (int, optional): 每个行组的最大行数, 默认由 pyarrow 决定
+    """
+    with parquet_writer(path, table.schema) as writer:
+        writer.write_table(table, row_group_size=row_group_size)
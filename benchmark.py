@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import pandas as pd
+
+import generate_transaction
+from generate_person import PersonDataGenerator
+from generate_transaction import ROWS_PER_ITERATION
+from transaction_buffer import TransactionBuffer, TRANSACTION_COLUMN_NAMES
+
+
+def _concat_baseline(rows):
+    """旧实现: 每批交易都 pd.concat 到总表上，用于对照"""
+    all_transactions = pd.DataFrame(columns=TRANSACTION_COLUMN_NAMES)
+    batch = pd.DataFrame({name: [0] * ROWS_PER_ITERATION for name in TRANSACTION_COLUMN_NAMES})
+    for _ in range(rows // ROWS_PER_ITERATION):
+        all_transactions = pd.concat([all_transactions, batch], ignore_index=True)
+    return all_transactions
+
+
+def _buffer_only(rows):
+    """只测缓冲区本身: 按同样的批大小追加"""
+    buffer = TransactionBuffer()
+    batch = {name: [0] * ROWS_PER_ITERATION for name in TRANSACTION_COLUMN_NAMES}
+    for _ in range(rows // ROWS_PER_ITERATION):
+        buffer.extend(batch)
+    return buffer.to_dataframe()
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, num_persons, concat_limit, seed=0):
+    people, _ = PersonDataGenerator(seed).generate_person(num_persons)
+
+    print(f"{'rows':>12} {'stage':>10} {'seconds':>10} {'rows/s':>12}")
+    for size in sizes:
+        stages = [("buffer", _buffer_only, (size,)),
+                  ("generate", generate_transaction.generate_transactions,
+                   (people, max(size // ROWS_PER_ITERATION, 1), True, seed))]
+        if size <= concat_limit:
+            stages.append(("per-row", generate_transaction.generate_transactions,
+                           (people, max(size // ROWS_PER_ITERATION, 1), False, seed)))
+            stages.append(("concat", _concat_baseline, (size,)))
+
+        for stage, func, args in stages:
+            frame, seconds = _timed(func, *args)
+            print(f"{len(frame):>12} {stage:>10} {seconds:>10.3f} {len(frame) / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="交易生成吞吐量基准: 行数线性增长时 rows/s 应保持稳定")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000],
+                        help="目标交易行数")
+    parser.add_argument("--persons", type=int, default=1000, help="参与交易的人数")
+    parser.add_argument("--concat-limit", type=int, default=100_000, help="逐笔模式和旧 pd.concat 实现只在不超过该行数时对照")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run(args.sizes, args.persons, args.concat_limit, args.seed)
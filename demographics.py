@@ -0,0 +1,272 @@
+import json
+
+import numpy as np
+
+from seeding import DEFAULT_RNG
+
+"""
+    人口属性的条件概率表和向量化抽样
+    年龄段 -> 职业 -> 收入水平 / 婚姻状况，收入水平 -> 月收入范围 / 教育水平，
+    全部以概率表表示(可从 JSON 加载经过校准的普查表)，抽样时整列按累积概率二分查找
+"""
+
+_MARITAL = ["未婚", "已婚", "离异"]
+
+# 默认概率表, 与原 assign_income_level_and_occupation / generate_monthly_income / generate_education_level 一致
+DEFAULT_TABLES = {
+    "age_bands": [
+        {"max_age": 25, "occupations": [
+            {"occupation": "学生", "probability": 0.8,
+             "income_level": {"低": 1.0}, "marital_status": {"未婚": 1.0}},
+            {"occupation": "初入职场人员", "probability": 0.15,
+             "income_level": {"低": 1.0}, "marital_status": dict(zip(_MARITAL, [0.8, 0.15, 0.05]))},
+            {"occupation": "自由职业者", "probability": 0.05,
+             "income_level": {"低": 0.7, "中": 0.3}, "marital_status": dict(zip(_MARITAL, [0.8, 0.15, 0.05]))},
+        ]},
+        {"max_age": 35, "occupations": [
+            {"occupation": "白领/公司职员", "probability": 0.4,
+             "income_level": {"低": 0.1, "中": 0.7, "高": 0.2},
+             "marital_status": dict(zip(_MARITAL, [0.3, 0.65, 0.05]))},
+            {"occupation": "专业技术人员", "probability": 0.3,
+             "income_level": {"低": 0.1, "中": 0.6, "高": 0.3},
+             "marital_status": dict(zip(_MARITAL, [0.2, 0.75, 0.05]))},
+            {"occupation": "自由职业者", "probability": 0.2,
+             "income_level": {"低": 0.2, "中": 0.5, "高": 0.3},
+             "marital_status": dict(zip(_MARITAL, [0.3, 0.65, 0.05]))},
+            {"occupation": "小企业主", "probability": 0.1,
+             "income_level": {"低": 0.1, "中": 0.5, "高": 0.4},
+             "marital_status": dict(zip(_MARITAL, [0.2, 0.75, 0.05]))},
+        ]},
+        {"max_age": 45, "occupations": [
+            {"occupation": "公司高层管理人员", "probability": 0.3,
+             "income_level": {"中": 0.05, "高": 0.95}, "marital_status": dict(zip(_MARITAL, [0.1, 0.85, 0.05]))},
+            {"occupation": "专业技术人员", "probability": 0.4,
+             "income_level": {"低": 0.1, "中": 0.6, "高": 0.3},
+             "marital_status": dict(zip(_MARITAL, [0.2, 0.75, 0.05]))},
+            {"occupation": "自由职业者", "probability": 0.2,
+             "income_level": {"中": 0.2, "高": 0.8}, "marital_status": dict(zip(_MARITAL, [0.2, 0.75, 0.05]))},
+            {"occupation": "中小企业主", "probability": 0.1,
+             "income_level": {"中": 0.05, "高": 0.95}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+        ]},
+        {"max_age": 60, "occupations": [
+            {"occupation": "高层管理人员", "probability": 0.3,
+             "income_level": {"高": 1.0}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+            {"occupation": "专业人士", "probability": 0.3,
+             "income_level": {"中": 0.2, "高": 0.8}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+            {"occupation": "企业主和高收入个体户", "probability": 0.3,
+             "income_level": {"高": 1.0}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+            {"occupation": "自由职业者", "probability": 0.1,
+             "income_level": {"中": 0.2, "高": 0.8}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+        ]},
+        {"max_age": None, "occupations": [
+            {"occupation": "退休人员", "probability": 0.5,
+             "income_level": {"中": 1.0}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+            {"occupation": "自由职业者和顾问", "probability": 0.3,
+             "income_level": {"中": 0.5, "高": 0.5}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+            {"occupation": "投资人", "probability": 0.1,
+             "income_level": {"高": 1.0}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+            {"occupation": "企业高层和企业主", "probability": 0.1,
+             "income_level": {"高": 1.0}, "marital_status": dict(zip(_MARITAL, [0.05, 0.85, 0.1]))},
+        ]},
+    ],
+    # 各收入水平的月收入范围(分, 含两端)
+    "monthly_income": {
+        "低": [200000, 500000],  # 低收入范围：2000-5000元
+        "中": [500000, 1500000],  # 中收入范围：5000-15000元
+        "高": [1500000, 5000000],  # 高收入范围：15000-50000元
+    },
+    # 教育水平和各收入水平对应的概率分布
+    "education": {
+        "levels": ["高中", "专科", "本科", "硕士", "博士"],
+        "by_income_level": {
+            "低": [0.4, 0.4, 0.15, 0.04, 0.01],  # 低收入的概率分布，高中文凭占比降低
+            "中": [0.2, 0.4, 0.3, 0.08, 0.02],  # 中等收入的概率分布，高中文凭占比进一步降低
+            "高": [0.05, 0.15, 0.5, 0.2, 0.1],  # 高收入的概率分布，高中比例最低，本科及以上占比更高
+        },
+    },
+}
+
+
+def _cdf_matrix(rows):
+    """
+    把若干行概率(长度可以不同)整理成逐行累积概率矩阵, 行尾用 1.0 补齐
+
+    Args:
+        rows (list): 每行一个概率列表
+    """
+    width = max(len(row) for row in rows)
+    matrix = np.ones((len(rows), width), dtype=np.float64)
+    for index, row in enumerate(rows):
+        row = np.asarray(row, dtype=np.float64)
+        if row.min() < 0 or row.sum() <= 0:
+            raise ValueError(f"概率表第 {index} 行无效: {row.tolist()}")
+        cdf = np.cumsum(row) / row.sum()
+        cdf[-1] = 1.0
+        matrix[index, :len(row)] = cdf
+    return matrix
+
+
+def sample_rows(cdf, rows, rng):
+    """
+    按行条件抽样: 第 i 个样本从 cdf[rows[i]] 描述的分布中抽取
+
+    每行累积概率都在 [0, 1] 内，加上行号后整张表展平仍单调递增，
+    因此一次 searchsorted 就能完成所有行的查找
+
+    Args:
+        cdf (np.ndarray): (行数, 类别数) 的累积概率矩阵
+        rows (np.ndarray): 每个样本所在的行
+        rng (np.random.Generator): 随机数生成器
+
+    Returns:
+        np.ndarray: 每个样本在所在行中的类别下标
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    width = cdf.shape[1]
+    flat = (cdf + np.arange(len(cdf))[:, None]).reshape(-1)
+    found = np.searchsorted(flat, rng.random(len(rows)) + rows, side='right')
+    return np.minimum(found - rows * width, width - 1)
+
+
+def load_tables(path):
+    """从 JSON 文件加载概率表, 结构与 DEFAULT_TABLES 相同"""
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+class DemographicSampler:
+    """
+    按概率表整列抽取人口属性
+    """
+
+    def __init__(self, tables=None):
+        """
+        Args:
+            tables (dict | str, optional): 概率表或 JSON 文件路径, 默认 DEFAULT_TABLES
+        """
+        if isinstance(tables, str):
+            tables = load_tables(tables)
+        self.tables = tables if tables is not None else DEFAULT_TABLES
+
+        income = self.tables["monthly_income"]
+        self.income_levels = list(income)
+        self.income_ranges = np.array([income[level] for level in self.income_levels], dtype=np.int64)
+        self._income_lookup = {level: code for code, level in enumerate(self.income_levels)}
+
+        # 年龄段: age <= max_age 落入该段, 最后一段 max_age 为 None 表示不设上限
+        bands = self.tables["age_bands"]
+        self.band_max_ages = np.array([band["max_age"] if band["max_age"] is not None else np.iinfo(np.int64).max
+                                       for band in bands], dtype=np.int64)
+
+        # 每个 (年龄段, 职业) 组合占一行, 收入水平和婚姻状况都以该行为条件
+        self.occupations = []
+        self.marital_statuses = []
+        occupation_rows, entry_occupations, income_rows, marital_rows = [], [], [], []
+        self.band_offsets = np.zeros(len(bands), dtype=np.int64)
+        for band_index, band in enumerate(bands):
+            self.band_offsets[band_index] = len(entry_occupations)
+            occupation_rows.append([entry["probability"] for entry in band["occupations"]])
+            for entry in band["occupations"]:
+                entry_occupations.append(self._code(entry["occupation"], self.occupations))
+                income_rows.append(self._distribution(entry["income_level"], self.income_levels, "收入水平"))
+                marital = entry["marital_status"]
+                for status in marital:
+                    self._code(status, self.marital_statuses)
+                marital_rows.append(marital)
+        marital_rows = [[row.get(status, 0.0) for status in self.marital_statuses] for row in marital_rows]
+
+        self.entry_occupations = np.array(entry_occupations, dtype=np.int64)
+        self.occupation_cdf = _cdf_matrix(occupation_rows)
+        self.income_cdf = _cdf_matrix(income_rows)
+        self.marital_cdf = _cdf_matrix(marital_rows)
+
+        education = self.tables["education"]
+        self.education_levels = list(education["levels"])
+        self.education_cdf = _cdf_matrix([education["by_income_level"][level] for level in self.income_levels])
+
+    @staticmethod
+    def _code(name, names):
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    @staticmethod
+    def _distribution(weights, levels, label):
+        unknown = set(weights) - set(levels)
+        if unknown:
+            raise ValueError(f"未知的{label}: {sorted(unknown)}")
+        return [weights.get(level, 0.0) for level in levels]
+
+    @classmethod
+    def from_json(cls, path):
+        return cls(load_tables(path))
+
+    def to_json(self, path):
+        """把当前概率表写成 JSON, 可作为校准表的模板"""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.tables, file, ensure_ascii=False, indent=2)
+
+    def income_codes(self, income_levels):
+        """收入水平名称 -> 编码"""
+        try:
+            return np.array([self._income_lookup[level] for level in income_levels], dtype=np.int64)
+        except KeyError:
+            raise ValueError(f"收入水平只能为 {'，'.join(repr(level) for level in self.income_levels)}") from None
+
+    def sample_occupations(self, ages, rng=None):
+        """
+        按年龄整列抽取职业、收入水平和婚姻状况
+
+        Args:
+            ages (np.ndarray): 年龄
+            rng (np.random.Generator, optional): 随机数生成器
+
+        Returns:
+            tuple: (职业编码, 收入水平编码, 婚姻状况编码)
+        """
+        rng = rng if rng is not None else DEFAULT_RNG
+        bands = np.searchsorted(self.band_max_ages, np.asarray(ages, dtype=np.int64), side='left')
+        entries = self.band_offsets[bands] + sample_rows(self.occupation_cdf, bands, rng)
+        income = sample_rows(self.income_cdf, entries, rng)
+        marital = sample_rows(self.marital_cdf, entries, rng)
+        return self.entry_occupations[entries], income, marital
+
+    def sample_monthly_incomes(self, income, rng=None):
+        """
+        按收入水平编码整列抽取月收入(分, 范围内均匀分布)
+        """
+        rng = rng if rng is not None else DEFAULT_RNG
+        income = np.asarray(income, dtype=np.int64)
+        if len(income) == 0:
+            return np.empty(0, dtype=np.int64)
+        return rng.integers(self.income_ranges[income, 0], self.income_ranges[income, 1] + 1)
+
+    def sample_education(self, income, rng=None):
+        """按收入水平编码整列抽取教育水平编码"""
+        rng = rng if rng is not None else DEFAULT_RNG
+        return sample_rows(self.education_cdf, income, rng)
+
+    def sample(self, ages, rng=None):
+        """
+        整列抽取全部人口属性
+
+        Args:
+            ages (np.ndarray): 年龄
+            rng (np.random.Generator, optional): 随机数生成器
+
+        Returns:
+            dict: occupation / income_level / marital_status / monthly_income(分) / education
+        """
+        rng = rng if rng is not None else DEFAULT_RNG
+        occupation, income, marital = self.sample_occupations(ages, rng)
+        return {
+            'occupation': np.asarray(self.occupations, dtype=object)[occupation],
+            'income_level': np.asarray(self.income_levels, dtype=object)[income],
+            'marital_status': np.asarray(self.marital_statuses, dtype=object)[marital],
+            'monthly_income': self.sample_monthly_incomes(income, rng),
+            'education': np.asarray(self.education_levels, dtype=object)[self.sample_education(income, rng)],
+        }
+
+
+# 未指定概率表时使用的共享抽样器
+DEFAULT_SAMPLER = DemographicSampler()
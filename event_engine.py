@@ -0,0 +1,444 @@
+import heapq
+
+import numpy as np
+
+import generate_transaction
+import profiling
+from generate_transaction import SCHEDULER, expand_plan
+from generate_transaction_model import COMPANY_PAYMENTS, ROW_DEFAULTS, RULE_TYPOLOGIES, CardTable
+from generate_transaction_model_illegal import TransactionGenerator
+from generate_transaction_model_illegal_2 import TransactionGeneratorIllegal
+from timestamp_sampler import SECONDS_PER_DAY
+from transaction_buffer import TransactionBuffer
+
+"""
+    按时间推进的离散事件引擎
+    各交易来源注册到以激活时间为键的优先队列中，全局时钟按时间窗(默认一天)前进:
+    每个时间窗只唤醒激活时间落在窗内的来源，把它们产生的交易与上一窗溢出的交易合并，
+    按时间戳排序后结算余额并输出。余额按时间顺序变化，输出本身就是按时间排好序的流，
+    下游不必再对全量数据排序
+"""
+
+# 交易数组的列, 来源产出的 dict 须包含前五列, 其余列可省略(取 ROW_DEFAULTS 中的值, 即正常交易)
+ROW_KEYS = ("sender_card", "receiver_card", "amount", "timestamp", "transaction_type", "risk_level", "typology",
+            "case_id", "group_id", "total_amount", "participants_count")
+
+
+def _take(rows, index):
+    return {key: values[index] for key, values in rows.items()}
+
+
+def _concat(parts):
+    parts = [part for part in parts if part is not None and len(part["timestamp"])]
+    if not parts:
+        return None
+    for part in parts:
+        for key, value in ROW_DEFAULTS.items():
+            if key not in part:
+                part[key] = np.full(len(part["timestamp"]), value, dtype=np.int64)
+    return {key: np.concatenate([part[key] for part in parts]) for key in ROW_KEYS}
+
+
+class LegalPatternSource:
+    """
+    正常交易来源: 总循环次数按时间窗逐段二项拆分(等价于整体多项分布)，每个时间窗只抽取本窗的计划，
+    交易日期限定在窗内
+    """
+
+    def __init__(self, generator, cards, num, graph=None, router=None):
+        """
+        Args:
+            generator (TransactionGeneratorLegal): 交易生成器, 时间范围取自它的时间戳采样器
+            cards (CardTable): 银行卡数组表
+            num (int): 总循环次数
+            graph (CounterpartyGraph, optional): 交易对手图
+            router (CrossShardRouter, optional): 跨分片路由, 给出时一部分转账改投其他分片的人员
+        """
+        self.generator = generator
+        self.cards = cards
+        self.graph = graph
+        self.router = router
+        self.remaining = num
+        self.start = generator.timestamp_sampler.start // SECONDS_PER_DAY * SECONDS_PER_DAY
+        # 采样器的结束日期当天也会产生交易
+        self.end = generator.timestamp_sampler.end // SECONDS_PER_DAY * SECONDS_PER_DAY + SECONDS_PER_DAY
+        self.cursor = self.start
+
+    def next_time(self, after):
+        """不早于 after 的下一次激活时间, 没有剩余循环时返回 None"""
+        if self.remaining <= 0 or self.cursor >= self.end:
+            return None
+        return max(after, self.cursor)
+
+    def emit(self, start, end):
+        """产生 [start, end) 窗内的交易"""
+        low, high = max(start, self.cursor), min(end, self.end)
+        if high <= low:
+            return None
+        rng = self.generator.rng
+        num = int(rng.binomial(self.remaining, (high - low) / (self.end - low)))
+        self.remaining -= num
+        self.cursor = high
+        if num == 0:
+            return None
+        plan = SCHEDULER.draw(num, len(self.cards.owner_index), rng, self.graph)
+        rows = expand_plan(self.generator, self.cards, plan, window=(low, high - 1))
+        if rows is not None and self.router is not None:
+            self.router.redirect(rows, rng)
+        return rows
+
+    def state(self):
+        return {'remaining': self.remaining, 'cursor': self.cursor}
+
+    def restore(self, state):
+        self.remaining, self.cursor = state['remaining'], state['cursor']
+
+
+class CompanyFlowSource:
+    """
+    公司资金往来来源: 工资由各公司在自己的发薪日(每月 1-28 日)按月发放给员工; 供应商付款和消费付款的
+    总对数与正常交易一样按时间窗逐段二项拆分
+    """
+
+    def __init__(self, generator, cards, companies, num, employment_rate=0.8):
+        """
+        Args:
+            generator (TransactionGeneratorLegal): 交易生成器, 时间范围取自它的时间戳采样器
+            cards (CardTable): 交易人员的银行卡数组表
+            companies (CardTable): 公司的对公账户数组表, 与人员共用同一个账本
+            num (int): 供应商付款和消费付款的总对数, 按 COMPANY_PAYMENTS 中的比例分配
+            employment_rate (float): 有雇主(领取工资)的人员比例
+        """
+        self.generator = generator
+        self.cards = cards
+        self.companies = companies
+        rng = generator.rng
+        num_companies = len(companies.owner_index)
+        weights = np.array([spec["weight"] for spec in COMPANY_PAYMENTS.values()], dtype=np.float64)
+        if num_companies < 2:
+            # 只有一家公司时没有供应商可付, 供应商付款的份额全部归入其余往来
+            weights[list(COMPANY_PAYMENTS).index("supplier")] = 0
+        self.remaining = rng.multinomial(num, weights / weights.sum()).astype(np.int64)
+
+        # 雇佣关系和工资卡在创建时一次抽定, 之后每月同一张卡领取
+        employees = np.flatnonzero(rng.random(len(cards.owner_index)) < employment_rate)
+        employers = rng.integers(num_companies, size=len(employees))
+        paydays = rng.integers(1, 29, num_companies)
+        salaries = np.array([person.monthly_income for person in cards.people], dtype=np.int64)[employees]
+        payer_cards = companies.pick(employers, rng)
+        payee_cards = cards.pick(employees, rng)
+        # 按发薪日分组(CSR): 每月 d 日发薪的员工为 [indptr[d], indptr[d + 1])
+        employee_paydays = paydays[employers]
+        order = np.argsort(employee_paydays, kind='stable')
+        self.indptr = np.zeros(30, dtype=np.int64)
+        np.cumsum(np.bincount(employee_paydays, minlength=29), out=self.indptr[1:])
+        self.payer_cards, self.payee_cards, self.salaries = payer_cards[order], payee_cards[order], salaries[order]
+
+        self.start = generator.timestamp_sampler.start // SECONDS_PER_DAY * SECONDS_PER_DAY
+        self.end = generator.timestamp_sampler.end // SECONDS_PER_DAY * SECONDS_PER_DAY + SECONDS_PER_DAY
+        self.cursor = self.start
+
+    def next_time(self, after):
+        if self.cursor >= self.end:
+            return None
+        return max(after, self.cursor)
+
+    def _salaries(self, low, high):
+        """[low, high) 内各发薪日的工资"""
+        days = np.arange(low // SECONDS_PER_DAY, -(-high // SECONDS_PER_DAY))
+        dates = days.astype('datetime64[D]')
+        days_of_month = (dates - dates.astype('datetime64[M]')).astype(np.int64) + 1
+        parts = []
+        for day, day_of_month in zip(days.tolist(), days_of_month.tolist()):
+            if day_of_month > 28:
+                continue
+            rows = slice(self.indptr[day_of_month], self.indptr[day_of_month + 1])
+            if rows.stop > rows.start:
+                parts.append(self.generator.expand_salaries(self.payer_cards[rows], self.payee_cards[rows],
+                                                            self.salaries[rows],
+                                                            np.full(rows.stop - rows.start, day, dtype=np.int64)))
+        return parts
+
+    def emit(self, start, end):
+        """产生 [start, end) 窗内的交易"""
+        low, high = max(start, self.cursor), min(end, self.end)
+        if high <= low:
+            return None
+        rng = self.generator.rng
+        fraction = (high - low) / (self.end - low)
+        self.cursor = high
+        with profiling.stage("expand.company") as stage:
+            parts = self._salaries(low, high)
+
+            num_companies = len(self.companies.owner_index)
+            for index, flow in enumerate(COMPANY_PAYMENTS):
+                num = int(rng.binomial(self.remaining[index], fraction))
+                if num == 0:
+                    continue
+                self.remaining[index] -= num
+                receivers = rng.integers(num_companies, size=num)
+                if flow == "supplier":
+                    # 付款公司从其余公司中抽取, 抽到不小于收款公司的下标时加一, 不会付给自己
+                    payers = rng.integers(num_companies - 1, size=num)
+                    payers += payers >= receivers
+                    senders = self.companies.pick(payers, rng)
+                else:
+                    senders = self.cards.pick(rng.integers(len(self.cards.owner_index), size=num), rng)
+                parts.append(self.generator.expand_company_payments(senders, self.companies.pick(receivers, rng), flow,
+                                                                    window=(low, high - 1)))
+            rows = _concat(parts)
+            stage.add_rows(0 if rows is None else len(rows["amount"]))
+        return rows
+
+    def state(self):
+        return {'remaining': self.remaining.tolist(), 'cursor': self.cursor}
+
+    def restore(self, state):
+        self.remaining = np.array(state['remaining'], dtype=np.int64)
+        self.cursor = state['cursor']
+
+
+class ScheduledEventSource:
+    """
+    预先生成的交易(如异常模式注入): 按时间戳排序后逐窗释放
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows (dict): 交易数组, 列见 ROW_KEYS
+        """
+        order = np.argsort(rows["timestamp"], kind='stable')
+        self.rows = _take(rows, order)
+        self.position = 0
+
+    def next_time(self, after):
+        if self.position >= len(self.rows["timestamp"]):
+            return None
+        return max(after, int(self.rows["timestamp"][self.position]))
+
+    def emit(self, start, end):
+        stop = int(np.searchsorted(self.rows["timestamp"], end, side='left'))
+        rows = _take(self.rows, slice(self.position, stop))
+        self.position = stop
+        return rows
+
+    def state(self):
+        return {'position': self.position}
+
+    def restore(self, state):
+        self.position = state['position']
+
+
+class EventEngine:
+    """
+    离散事件引擎: 优先队列中保存 (激活时间, 注册序号, 来源)，同一时刻的来源按注册顺序处理，结果可复现
+    """
+
+    def __init__(self, generator, cards, window_days=1, horizon=None, journal=None):
+        """
+        Args:
+            generator (TransactionGeneratorLegal): 用于结算和输出的交易生成器
+            cards (CardTable): 银行卡数组表
+            window_days (int): 时间窗天数, 决定每次排序和结算的数据量
+            horizon (int, optional): 结束时间(秒, 不含); 给出时超出的交易(如末日AA制的延迟转账)
+                截到结束前最后一秒, 保证追加下一个日期窗口时余额仍按时间顺序衔接
+            journal (CrossShardRouter, optional): 记录每笔已结算交易的卡下标, 供跨分片结算使用
+        """
+        self.generator = generator
+        self.cards = cards
+        self.journal = journal
+        self.window = window_days * SECONDS_PER_DAY
+        self.horizon = horizon
+        self.clock = None
+        self.sources = []
+        self._queue = []
+        # 时间戳超出当前窗口的交易(如AA制的延迟转账)，留到所在窗口再结算
+        self._pending = None
+
+    def register(self, source):
+        """注册交易来源"""
+        after = self.clock if self.clock is not None else np.iinfo(np.int64).min
+        time = source.next_time(after)
+        if time is not None:
+            heapq.heappush(self._queue, (time, len(self.sources), source))
+        self.sources.append(source)
+        return source
+
+    def state(self):
+        """
+        引擎的完整状态(检查点用): 随机数生成器、AA制群组编号、账本余额、时钟、队列、各来源位置和溢出交易
+
+        Returns:
+            tuple: (arrays, info) 数组和可 JSON 序列化的标量
+        """
+        arrays = {'balances': self.cards.balances.copy()}
+        if self._pending is not None:
+            arrays.update({f'pending_{key}': values for key, values in self._pending.items()})
+        info = {
+            'rng': self.generator.rng.bit_generator.state,
+            'next_group_id': self.generator.next_group_id,
+            'clock': self.clock,
+            'queue': [[int(time), order] for time, order, _ in self._queue],
+            'sources': [source.state() for source in self.sources],
+        }
+        return arrays, info
+
+    def restore(self, arrays, info):
+        """从 state() 的输出恢复; 来源须已按原顺序重新注册"""
+        if len(info['sources']) != len(self.sources):
+            raise ValueError("检查点中的交易来源与当前注册的不一致")
+        self.generator.rng.bit_generator.state = info['rng']
+        self.generator.next_group_id = info['next_group_id']
+        self.cards.balances[:] = arrays['balances']
+        self.clock = info['clock']
+        for source, state in zip(self.sources, info['sources']):
+            source.restore(state)
+        self._queue = [(time, order, self.sources[order]) for time, order in info['queue']]
+        heapq.heapify(self._queue)
+        pending = {key[len('pending_'):]: values for key, values in arrays.items() if key.startswith('pending_')}
+        self._pending = pending or None
+
+    def _next_time(self):
+        times = [self._queue[0][0]] if self._queue else []
+        if self._pending is not None:
+            times.append(int(self._pending["timestamp"].min()))
+        return min(times) if times else None
+
+    def step(self, buffer):
+        """
+        推进一个时间窗: 唤醒窗内的来源，排序并结算窗内交易，结果追加到 buffer
+
+        Returns:
+            bool: 是否还有待处理的事件
+        """
+        time = self._next_time()
+        if time is None:
+            return False
+        # 队列和溢出交易的时间都不早于上一窗的结束时间, 对齐后的窗口不会回退
+        start = time // self.window * self.window
+        end = start + self.window
+
+        parts = [self._pending]
+        while self._queue and self._queue[0][0] < end:
+            _, order, source = heapq.heappop(self._queue)
+            parts.append(source.emit(start, end))
+            time = source.next_time(end)
+            if time is not None:
+                heapq.heappush(self._queue, (time, order, source))
+
+        rows = _concat(parts)
+        self._pending = None
+        if rows is not None and self.horizon is not None and end >= self.horizon:
+            np.minimum(rows["timestamp"], self.horizon - 1, out=rows["timestamp"])
+        if rows is not None:
+            due = rows["timestamp"] < end
+            if not due.all():
+                self._pending = _take(rows, ~due)
+                rows = _take(rows, due)
+            with profiling.stage("engine.sort") as stage:
+                stage.add_rows(len(rows["timestamp"]))
+                rows = _take(rows, np.argsort(rows["timestamp"], kind='stable'))
+            self.generator.settle_rows(self.cards, rows, buffer=buffer, journal=self.journal)
+
+        self.clock = end
+        return bool(self._queue) or self._pending is not None
+
+    def run(self, batch_size=100000, checkpoint=None):
+        """
+        逐窗推进直到所有来源耗尽，按时间顺序分批产出
+
+        Args:
+            batch_size (int): 每批行数
+            checkpoint (Checkpointer, optional): 每推进一个时间窗检查一次是否需要保存检查点
+
+        Yields:
+            dict: 列名到数组的映射(时间戳为 int64 秒, 金额为 int64 分)
+        """
+        buffer = TransactionBuffer(capacity=2 * batch_size)
+        running = True
+        while running:
+            running = self.step(buffer)
+            while len(buffer) >= batch_size:
+                yield buffer.pop_batch(batch_size)
+            if checkpoint is not None and running and checkpoint.due():
+                # 先把缓冲区剩余的行交给调用方写出, 检查点只需记录输出偏移量
+                if len(buffer):
+                    yield buffer.pop_batch(len(buffer))
+                checkpoint.save(*self.state())
+        if len(buffer):
+            yield buffer.pop_batch(len(buffer))
+
+
+def iter_ordered_transactions(people, num, batch_size=100000, rng=None, graph=None, start_date=None, end_date=None,
+                              checkpoint=None, illegal_prevalence=0.0, rule_cases=0, first_case=0, sources=(),
+                              window_days=1, companies=None, company_flows=0, first_group=0, router=None):
+    """
+    按时间顺序流式生成交易，余额按时间顺序结算，参数与 generate_transaction.iter_transactions 相同
+
+    Args:
+        :param people: （Person）类 交易人员
+        :param num: 正常交易的循环次数
+        :param batch_size: 每批行数(最后一批可能不足)
+        :param rng: np.random.Generator 或种子, 默认随机初始化
+        :param graph: 交易对手图(CounterpartyGraph)
+        :param start_date: 交易开始日期, 默认 generate_transaction.START_DATE
+        :param end_date: 交易结束日期(含当天), 默认 generate_transaction.END_DATE
+        :param checkpoint: 检查点(Checkpointer), 已加载时从其中的状态继续
+        :param illegal_prevalence: 作为收款人卷入规律性异常案例的人员比例, 案例整批生成后按时间注入
+        :param rule_cases: 十条异常规则各自合成的案例数(每种相同, 便于得到类别均衡的训练集)
+        :param first_case: 第一个异常案例的编号
+        :param sources: 其他交易来源(如 ScheduledEventSource)
+        :param window_days: 时间窗天数
+        :param companies: 公司(Company)列表, 须与交易人员共用账本; 给出时按月发放工资, 对公异常规则的主体也从公司中抽取
+        :param company_flows: 供应商付款和消费付款的总对数
+        :param first_group: 第一个AA制群组的编号
+        :param router: 跨分片路由(settlement.CrossShardRouter), 正常转账按比例改投其他分片的人员并记录结算日志
+
+    Yields:
+        dict: 列名到数组的映射, 按时间戳非降序
+    """
+    generator = generate_transaction._legal_generator(rng, start_date, end_date)
+    generator.next_group_id = first_group
+    cards = CardTable(people)
+    legal = LegalPatternSource(generator, cards, num, graph=graph, router=router)
+    engine = EventEngine(generator, cards, window_days=window_days, horizon=legal.end, journal=router)
+    engine.register(legal)
+    if illegal_prevalence > 0:
+        # 异常案例与正常交易共用随机数生成器, 检查点恢复时重新生成的案例与原来一致
+        illegal = TransactionGeneratorIllegal(generator.start_date, generator.end_date, rng=generator.rng)
+        senders, receivers = illegal.draw_cases(len(people), illegal_prevalence)
+        with profiling.stage("expand.illegal"):
+            rows = illegal.expand_regular_patterns(cards, senders, receivers, first_case=first_case)
+        engine.register(ScheduledEventSource(rows))
+        first_case += len(receivers)
+    company_cards = CardTable(companies) if companies else None
+    if rule_cases > 0:
+        # 合成时为主体新开的卡在恢复检查点之前就已重新开好, 账本大小与保存时一致
+        rules = TransactionGenerator(generator.start_date, generator.end_date, rng=generator.rng)
+        parts = []
+        for typology in RULE_TYPOLOGIES:
+            with profiling.stage(f"expand.rules.{typology}"):
+                parts.append(rules.synthesize(cards, typology, rule_cases, first_case=first_case,
+                                              companies=company_cards))
+            first_case += rule_cases
+        rows = _concat(parts)
+        if rows is not None:
+            engine.register(ScheduledEventSource(rows))
+    if companies:
+        engine.register(CompanyFlowSource(generator, cards, company_cards, company_flows))
+    for source in sources:
+        engine.register(source)
+    if router is not None:
+        # 合成异常案例时可能为付款卡补足了余额, 跨分片重算余额链时以结算前的余额为期初
+        router.record_opening(cards.balances)
+    if checkpoint is not None and checkpoint.resuming:
+        engine.restore(checkpoint.arrays, checkpoint.info)
+    yield from engine.run(batch_size, checkpoint)
+
+
+# 交易生成引擎: batch 为按循环顺序结算(时间戳无序), event 为按时间顺序结算并输出有序流
+TRANSACTION_ENGINES = {
+    "batch": generate_transaction.iter_transactions,
+    "event": iter_ordered_transactions,
+}
@@ -1,51 +1,169 @@
-from faker import Faker
+import gc
+
+import numpy as np
 import pandas as pd
-import random
-from datetime import datetime
+
+from generate_person import CardLedger
+from identity import GENDERS, IdentityGenerator
+from money import to_cents, to_yuan
+from seeding import make_rng
+
+"""
+    公司主体批量生成
+    统一社会信用代码、公司名称、法定代表人姓名由 identity 中的词表和置换计数器整列生成，
+    不再逐个调用 Faker.unique；公司作为持有人登记到人员共用的账本中，对公账户与个人银行卡一起结算
+"""
+
+
+class Company:
+    """公司主体: 与 Person 一样是账本中的持有人, 对公账户保存在账本中"""
+
+    def __init__(self, company_id, company_name, company_type, industry, address, legal_representative, ledger,
+                 index):
+        self.company_id = company_id
+        self.company_name = company_name
+        self.company_type = company_type
+        self.industry = industry
+        self.address = address
+        self.legal_representative = legal_representative
+
+        # index 为公司在账本中的持有人下标
+        self.ledger = ledger
+        self.index = index
+        self.cards = []
+
+    @property
+    def name(self):
+        return self.company_name
+
+    def __repr__(self):
+        return f"Company(name={self.company_name}, industry={self.industry})"
 
 
 class CompanyDataGenerator:
-    def __init__(self):
-        self.fake = Faker(['zh_CN'])
+    def __init__(self, rng=None, identity=None, ledger=None):
+        """
+        Args:
+            rng (np.random.Generator | int, optional): 随机数生成器或种子
+            identity (IdentityGenerator, optional): 批量身份生成器, 分片生成时传入带步长和偏移的实例
+            ledger (CardLedger, optional): 开立对公账户的账本, 与交易人员共用时公司才能和人员互相转账
+        """
+        self.rng = make_rng(rng)
+        self.identity = identity if identity is not None else IdentityGenerator(self.rng)
+        self.ledger = ledger if ledger is not None else CardLedger(rng=self.rng)
 
         # 初始化常量数据
         self.company_types = ['有限责任公司', '股份有限公司', '国有企业', '外商投资企业', '合资企业']
         self.industries = ['制造业', '信息技术', '金融业', '房地产', '教育', '零售业', '医疗卫生', '物流运输']
         self.risk_levels = ['低风险', '中风险', '高风险']
+        self.banks = ["ICBC", "ABC", "CMB", "BOC", "SPDB", "CMBC"]
+
+    def draw_attributes(self, num_records):
+        """
+        批量抽取不依赖 Faker 的公司属性
+
+        Returns:
+            dict: 各属性的数组(注册资本为分, 成立日期为 datetime64[D])
+        """
+        rng = self.rng
+        # 成立日期在参照日期前 30 年内
+        establishment = self.identity.reference_days - rng.integers(0, 30 * 365 + 1, num_records)
+        return {
+            'company_type': np.asarray(self.company_types, dtype=object)[rng.integers(len(self.company_types),
+                                                                                      size=num_records)],
+            'registered_capital': to_cents(rng.uniform(100, 10000, num_records) * 10000),
+            'industry': np.asarray(self.industries, dtype=object)[rng.integers(len(self.industries), size=num_records)],
+            'risk_level': np.asarray(self.risk_levels, dtype=object)[rng.integers(len(self.risk_levels),
+                                                                                  size=num_records)],
+            'establishment_date': establishment.astype('datetime64[D]'),
+            'representative_gender': rng.integers(len(GENDERS), size=num_records),
+        }
 
     def generate_company(self, num_records=1):
-        """生成公司主体数据"""
-        companies = []
-        for _ in range(num_records):
-            company = {
-                # 基本信息
-                'company_id': self.fake.unique.credit_card_number(),  # 模拟统一社会信用代码
-                'company_name': self.fake.company(),
-                'company_type': random.choice(self.company_types),
-                'registered_capital': round(random.uniform(100, 10000) * 10000, 2),
-                'industry': random.choice(self.industries),
-                'address': self.fake.province(),
-                'establishment_date': self.fake.date_between(start_date='-30y', end_date='today'),
-                'legal_representative': self.fake.name(),
-                'tax_id': self.fake.unique.random_number(digits=15, fix_len=True),
-
-                # 账户信息
-                'account_id': self.fake.unique.random_number(digits=16, fix_len=True),
-                'risk_level': random.choice(self.risk_levels)
-            }
-            companies.append(company)
-
-        return pd.DataFrame(companies) if num_records > 1 else companies[0]
+        """
+        生成公司主体数据, 每家公司在账本中开一个对公账户, 初始余额为注册资本
+
+        Returns:
+            tuple: (companies, frame) Company 对象列表和公司表(注册资本为分); num_records 为 1 时公司表为 dict
+        """
+        attributes = self.draw_attributes(num_records)
+        identity = self.identity
+        company_id = identity.credit_codes(num_records)
+        company_name = identity.draw_company_names(num_records)
+        representative = identity.draw_names(attributes['representative_gender'])
+        address = identity.draw_provinces(num_records)
+
+        # 对公账户: 账本持有人为公司, 卡号规则与个人银行卡相同
+        first_owner = self.ledger.add_owners(company_id.tolist())
+        banks = np.asarray(self.banks, dtype=object)[self.rng.integers(len(self.banks), size=num_records)]
+        card_indices = self.ledger.add_cards(np.arange(first_owner, first_owner + num_records), banks,
+                                             attributes['registered_capital'])
+
+        frame = pd.DataFrame({
+            # 基本信息
+            'company_id': company_id,  # 统一社会信用代码
+            'company_name': company_name,
+            'company_type': attributes['company_type'],
+            'registered_capital': attributes['registered_capital'],
+            'industry': attributes['industry'],
+            'address': address,
+            'establishment_date': attributes['establishment_date'],
+            'legal_representative': representative,
+            'tax_id': company_id,  # 三证合一后纳税人识别号即统一社会信用代码
+
+            # 账户信息
+            'account_id': self.ledger.number_array(card_indices),
+            'bank': banks,
+            'risk_level': attributes['risk_level'],
+        })
+
+        # 与人员一样, 大批量创建对象时暂停循环垃圾回收
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            ledger = self.ledger
+            columns = (company_id, company_name, attributes['company_type'], attributes['industry'], address,
+                       representative)
+            companies = [Company(*row, ledger=ledger, index=first_owner + i)
+                         for i, row in enumerate(zip(*(column.tolist() for column in columns)))]
+            for company, card_index in zip(companies, card_indices.tolist()):
+                company.cards = [ledger.card(card_index, company)]
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        return companies, frame if num_records != 1 else frame.to_dict('records')[0]
 
 
 # 使用示例
-def generate_company_data(num_companies=100):
-    generator = CompanyDataGenerator()
-    companies = generator.generate_company(num_companies)
-    companies.to_csv('companies.csv', index=False, encoding='utf-8-sig')
-    return companies
+def generate_company_data(num_companies=100, path='data/companies.csv', row_group_size=None, rng=None,
+                          identity=None, ledger=None):
+    """
+    生成公司并写出公司表, 格式按扩展名推断(.csv / .parquet)
+
+    Args:
+        num_companies (int): 公司数
+        path (str): 输出文件路径
+        row_group_size (int, optional): Parquet 每个行组的最大行数
+        rng (np.random.Generator | int, optional): 随机数生成器或种子
+        identity (IdentityGenerator, optional): 批量身份生成器, 分片生成时用于保证统一社会信用代码全局唯一
+        ledger (CardLedger, optional): 开立对公账户的账本, 通常传入交易人员的账本
+    """
+    generator = CompanyDataGenerator(rng, identity=identity, ledger=ledger)
+    companies, frame = generator.generate_company(num_companies)
+    if num_companies == 1:
+        frame = pd.DataFrame([frame])
+    if path.endswith('.parquet'):
+        from arrow_export import companies_to_arrow, write_parquet
+        write_parquet(companies_to_arrow(frame), path, row_group_size=row_group_size)
+    else:
+        # 金额只在导出时由分转换为元
+        frame.assign(registered_capital=to_yuan(frame['registered_capital'])).to_csv(path, index=False,
+                                                                                      encoding='utf-8-sig',
+                                                                                      date_format='%Y-%m-%d')
+    return companies, frame
 
 
 if __name__ == "__main__":
-    companies = generate_company_data(100)
-    print(companies.head())
\ No newline at end of file
+    companies, frame = generate_company_data(100)
+    print(frame.head())
@@ -1,27 +1,301 @@
-import string
+import gc
 import uuid
 
-from faker import Faker
+import numpy as np
 import pandas as pd
-import random
 from datetime import datetime, timedelta
 
+from money import to_cents, to_yuan
+from demographics import DEFAULT_SAMPLER, DemographicSampler
+from identity import GENDERS, IdentityGenerator
+from seeding import DEFAULT_RNG, make_rng, pick
+
+
+class CardLedger:
+    """
+    银行卡账本: 所有卡按列保存在连续数组中(持有人下标、开户行编码、卡类型编码、卡号、余额)，
+    余额以分(int64)为单位；Person / BankCard 只是指向账本下标的视图
+    """
+
+    def __init__(self, capacity=1024, rng=None):
+        """
+        Args:
+            capacity (int): 初始容量(卡数), 不足时按倍数扩容
+            rng (np.random.Generator, optional): 生成卡号用的随机数生成器
+        """
+        self.rng = make_rng(rng)
+        self.size = 0
+        self._capacity = max(int(capacity), 1)
+        self._owners = np.empty(self._capacity, dtype=np.int64)
+        self._bank_codes = np.empty(self._capacity, dtype=np.int16)
+        self._type_codes = np.empty(self._capacity, dtype=np.int8)
+        self._numbers = np.empty(self._capacity, dtype='S16')
+        self._balances = np.empty(self._capacity, dtype=np.int64)
+
+        # 持有人登记表: 持有人下标 -> 证件号(由 attach 挂载时为定长字节数组)
+        self.owner_ids = []
+        # 编码表: 编码 -> 名称
+        self.bank_names = []
+        self.card_types = []
+        self._bank_lookup = {}
+        self._type_lookup = {}
+        self._owner_cards = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def owners(self):
+        return self._owners[:self.size]
+
+    @property
+    def bank_codes(self):
+        return self._bank_codes[:self.size]
+
+    @property
+    def type_codes(self):
+        return self._type_codes[:self.size]
+
+    @property
+    def numbers(self):
+        return self._numbers[:self.size]
+
+    @property
+    def balances(self):
+        """余额(分)视图, 可原地批量更新"""
+        return self._balances[:self.size]
+
+    def _reserve(self, extra):
+        required = self.size + extra
+        if required <= self._capacity:
+            return
+        capacity = max(self._capacity, 1)
+        while capacity < required:
+            capacity *= 2
+        for name in ("_owners", "_bank_codes", "_type_codes", "_numbers", "_balances"):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, name, grown)
+        self._capacity = capacity
+
+    @staticmethod
+    def _code(name, names, lookup):
+        code = lookup.get(name)
+        if code is None:
+            code = lookup[name] = len(names)
+            names.append(name)
+        return code
+
+    def bank_code(self, bank_name):
+        return self._code(bank_name, self.bank_names, self._bank_lookup)
+
+    def type_code(self, card_type):
+        return self._code(card_type, self.card_types, self._type_lookup)
+
+    def _owner_list(self):
+        """挂载的持有人数组在首次登记新持有人时转为列表"""
+        if isinstance(self.owner_ids, np.ndarray):
+            self.owner_ids = self.owner_ids.astype(str).tolist()
+        return self.owner_ids
+
+    def add_owner(self, owner_id):
+        """登记持有人，返回持有人下标"""
+        self._owner_list().append(owner_id)
+        self._owner_cards = None
+        return len(self.owner_ids) - 1
+
+    def add_owners(self, owner_ids):
+        """批量登记持有人，返回第一个持有人的下标(其余依次递增)"""
+        start = len(self.owner_ids)
+        self._owner_list().extend(owner_ids)
+        self._owner_cards = None
+        return start
+
+    def add_card(self, owner_index, bank_name, balance, card_type='C', account_number=None):
+        """
+        开一张卡，返回卡在账本中的下标
+
+        Args:
+            owner_index (int): 持有人下标
+            bank_name (str): 开户行
+            balance (int): 初始余额(分)
+            card_type (str): 卡类型
+            account_number (str, optional): 卡号, 默认随机生成8位纯数字卡号
+        """
+        if account_number is None:
+            account_number = f"{card_type}{int(self.rng.integers(10 ** 8)):08d}"  # 生成8位纯数字卡号
+        self._reserve(1)
+        index = self.size
+        self._owners[index] = owner_index
+        self._bank_codes[index] = self.bank_code(bank_name)
+        self._type_codes[index] = self.type_code(card_type)
+        self._numbers[index] = account_number
+        self._balances[index] = balance
+        self.size += 1
+        self._owner_cards = None
+        return index
+
+    def add_cards(self, owner_indices, bank_names, balances, card_type='C'):
+        """
+        批量开卡，卡号按与 add_card 相同的规则向量生成
+
+        Args:
+            owner_indices (np.ndarray): 每张卡的持有人下标
+            bank_names (list): 每张卡的开户行
+            balances (np.ndarray): 每张卡的初始余额(分)
+            card_type (str): 卡类型
+
+        Returns:
+            np.ndarray: 新卡在账本中的下标
+        """
+        count = len(owner_indices)
+        if count == 0:
+            return np.arange(self.size, self.size)
+        self._reserve(count)
+        start, stop = self.size, self.size + count
+        digits = np.char.zfill(self.rng.integers(10 ** 8, size=count).astype('U8'), 8)
+        self._owners[start:stop] = owner_indices
+        # 哈希分组, 不必对大量字符串排序
+        inverse, names = pd.factorize(np.asarray(bank_names, dtype=object))
+        self._bank_codes[start:stop] = np.array([self.bank_code(name) for name in names], dtype=np.int16)[inverse]
+        self._type_codes[start:stop] = self.type_code(card_type)
+        self._numbers[start:stop] = np.char.add(card_type, digits)
+        self._balances[start:stop] = balances
+        self.size = stop
+        self._owner_cards = None
+        return np.arange(start, stop)
+
+    def owner_cards(self):
+        """
+        按持有人分组的卡下标(CSR): 持有人 o 的卡为 cards[indptr[o]:indptr[o + 1]]
+        """
+        if self._owner_cards is None:
+            cards = np.argsort(self.owners, kind='stable')
+            counts = np.bincount(self.owners, minlength=len(self.owner_ids))
+            indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=indptr[1:])
+            self._owner_cards = (indptr, cards)
+        return self._owner_cards
+
+    def owner_id_array(self, cards):
+        """卡下标 -> 持有人证件号"""
+        if isinstance(self.owner_ids, np.ndarray):
+            return self.owner_ids[self.owners[cards]].astype(str).astype(object)
+        return np.asarray(self.owner_ids, dtype=object)[self.owners[cards]]
+
+    def bank_name_array(self, cards):
+        """卡下标 -> 开户行"""
+        return np.asarray(self.bank_names, dtype=object)[self.bank_codes[cards]]
+
+    def number_array(self, cards):
+        """卡下标 -> 卡号"""
+        return self.numbers[cards].astype(str).astype(object)
+
+    def is_current(self, cards):
+        """卡下标 -> 是否为 'C' 类卡"""
+        return self.type_codes[cards] == self._type_lookup.get('C', -1)
+
+    def apply_transfers(self, sender_cards, receiver_cards, amounts):
+        """批量记账(不做余额检查): 付款卡扣款、收款卡入账，金额单位为分"""
+        np.subtract.at(self._balances, sender_cards, amounts)
+        np.add.at(self._balances, receiver_cards, amounts)
+
+    def card(self, index, owner=None):
+        """返回下标对应卡的 BankCard 视图"""
+        return BankCard.view(self, index, owner)
+
+    def to_arrays(self):
+        """
+        导出账本的全部列(快照用), 字符串表转为定长 Unicode 数组
+
+        Returns:
+            dict: owners / bank_codes / type_codes / numbers / balances / owner_ids / bank_names / card_types
+        """
+        return {
+            'owners': self.owners,
+            'bank_codes': self.bank_codes,
+            'type_codes': self.type_codes,
+            'numbers': self.numbers,
+            'balances': self.balances,
+            'owner_ids': np.asarray(self.owner_ids, dtype=str),
+            'bank_names': np.asarray(self.bank_names, dtype=str),
+            'card_types': np.asarray(self.card_types, dtype=str),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, rng=None):
+        """
+        由 to_arrays 的输出重建账本
+
+        Args:
+            arrays (dict): 账本各列
+            rng (np.random.Generator, optional): 之后新开卡时生成卡号用的随机数生成器
+        """
+        ledger = cls(capacity=len(arrays['balances']), rng=rng)
+        size = len(arrays['balances'])
+        ledger._owners[:size] = arrays['owners']
+        ledger._bank_codes[:size] = arrays['bank_codes']
+        ledger._type_codes[:size] = arrays['type_codes']
+        ledger._numbers[:size] = arrays['numbers']
+        ledger._balances[:size] = arrays['balances']
+        ledger.size = size
+        ledger.owner_ids = np.asarray(arrays['owner_ids']).tolist()
+        for name in np.asarray(arrays['bank_names']).tolist():
+            ledger.bank_code(name)
+        for name in np.asarray(arrays['card_types']).tolist():
+            ledger.type_code(name)
+        return ledger
+
+    @classmethod
+    def attach(cls, arrays, rng=None, owner_cards=None):
+        """
+        直接引用给定的数组(可以是内存映射)重建账本, 不复制数据;
+        容量等于卡数, 之后再开卡时由 _reserve 复制为普通数组
+
+        Args:
+            arrays (dict): 与 to_arrays 相同的各列, owner_ids 为定长字节数组
+            rng (np.random.Generator, optional): 之后新开卡时生成卡号用的随机数生成器
+            owner_cards (tuple, optional): 预先算好的 (indptr, cards), 省去按持有人排序
+        """
+        ledger = cls(capacity=1, rng=rng)
+        ledger._owners = arrays['owners']
+        ledger._bank_codes = arrays['bank_codes']
+        ledger._type_codes = arrays['type_codes']
+        ledger._numbers = arrays['numbers']
+        ledger._balances = arrays['balances']
+        ledger.size = ledger._capacity = len(arrays['balances'])
+        ledger.owner_ids = arrays['owner_ids']
+        for name in np.asarray(arrays['bank_names']).tolist():
+            ledger.bank_code(name)
+        for name in np.asarray(arrays['card_types']).tolist():
+            ledger.type_code(name)
+        ledger._owner_cards = owner_cards
+        return ledger
+
+
+# 未指定账本时使用的全局账本
+DEFAULT_LEDGER = CardLedger()
+
 
 class Person:
     def __init__(self, person_id, name, gender, age, occupation, income_level, monthly_income, marital_status, address,
-                 education, credit_score):
+                 education, credit_score, ledger=None, index=None):
         self.person_id = person_id
         self.name = name
         self.age = age
         self.gender = gender
         self.occupation = occupation
         self.income_level = income_level
-        self.monthly_income = monthly_income
+        self.monthly_income = monthly_income  # 月收入(分)
         self.marital_status = marital_status
         self.address = address
         self.education = education
         self.credit_score = credit_score
 
+        # 银行卡保存在账本中, index 为本人在账本中的持有人下标(已批量登记时直接传入)
+        self.ledger = ledger if ledger is not None else DEFAULT_LEDGER
+        self.index = index if index is not None else self.ledger.add_owner(person_id)
         self.cards = []
 
     def add_card(self, card):
@@ -32,31 +306,72 @@ class Person:
 
 
 class BankCard:
+    """银行卡视图: 所有字段都读写自持有人账本中的对应下标"""
+    __slots__ = ("owner", "ledger", "index")
+
     def __init__(self, owner, bank_name, balance, card_type='C', account_number=None):
         self.owner = owner
-        self.bank_name = bank_name
-        self.card_type = card_type
-        self.balance = balance
-        if account_number is None:
-            account_number = card_type + ''.join(random.choices(string.digits, k=8))  # 生成8位纯数字卡号
-        self.account_number = account_number
+        self.ledger = getattr(owner, 'ledger', DEFAULT_LEDGER)
+        owner_index = getattr(owner, 'index', None)
+        if owner_index is None:
+            owner_index = self.ledger.add_owner(getattr(owner, 'person_id', None))
+        self.index = self.ledger.add_card(owner_index, bank_name, to_cents(balance), card_type, account_number)
+
+    @classmethod
+    def view(cls, ledger, index, owner=None):
+        card = cls.__new__(cls)
+        card.owner = owner
+        card.ledger = ledger
+        card.index = index
+        return card
+
+    @property
+    def bank_name(self):
+        return self.ledger.bank_names[self.ledger.bank_codes[self.index]]
+
+    @property
+    def card_type(self):
+        return self.ledger.card_types[self.ledger.type_codes[self.index]]
+
+    @property
+    def account_number(self):
+        return self.ledger.numbers[self.index].decode()
+
+    @property
+    def balance_cents(self):
+        return int(self.ledger.balances[self.index])
+
+    @balance_cents.setter
+    def balance_cents(self, value):
+        self.ledger.balances[self.index] = value
 
     @property
     def balance(self):
-        return self._balance
+        """余额(元), 只用于展示和兼容旧接口，计算请使用 balance_cents"""
+        return to_yuan(self.balance_cents)
 
     @balance.setter
     def balance(self, value):
-        # 使用round()函数确保value保持2位小数
-        self._balance = round(float(value), 2)
+        # 账本以分为单位保存，确保value保持2位小数
+        self.ledger.balances[self.index] = to_cents(value)
 
     def __repr__(self):
         return f"BankCard(owner={self.owner.name}, bank_name={self.bank_name}, account_number={self.account_number}, balance={self.balance})"
 
 
 class PersonDataGenerator:
-    def __init__(self):
-        self.fake = Faker(['zh_CN'])
+    def __init__(self, rng=None, identity=None, demographics=None):
+        """
+        Args:
+            rng (np.random.Generator | int, optional): 随机数生成器或种子
+            identity (IdentityGenerator, optional): 批量身份生成器, 分片生成时传入带步长和偏移的实例
+            demographics (DemographicSampler | dict | str, optional): 人口属性抽样器、概率表或其 JSON 路径
+        """
+        self.rng = make_rng(rng)
+        if not isinstance(demographics, DemographicSampler):
+            demographics = DemographicSampler(demographics) if demographics is not None else DEFAULT_SAMPLER
+        self.demographics = demographics
+        self.identity = identity if identity is not None else IdentityGenerator(self.rng)
 
         # 初始化常量数据
         self.occupations = ['学生', '白领', '教师', '医生', '工程师', '销售', '管理人员', '自由职业']
@@ -67,164 +382,161 @@ class PersonDataGenerator:
         self.consumption_categories = ['电子产品', '娱乐', '餐饮', '教育培训', '服装', '房租', '车贷', '旅行', '时尚',
                                        '健身', '家电', '装修', '医疗保健', '保险', '投资']
         self.banks = ["ICBC", "ABC", "CMB", "BOC", "SPDB", "CMBC"]
+        self.ledger = CardLedger(rng=self.rng)
+
+    def draw_attributes(self, num_records):
+        """
+        批量抽取除身份信息外的人员属性
+
+        Returns:
+            dict: 各属性的数组(月收入为分, gender_code 0 为男、1 为女)
+        """
+        rng = self.rng
+        age = rng.integers(18, 81, num_records)
+        gender_code = rng.integers(2, size=num_records)
+        # 职业、收入水平、婚姻状况、月收入和教育水平按概率表整列抽取
+        demographics = self.demographics.sample(age, rng)
+        return {
+            'age': age,
+            'gender_code': gender_code,
+            'gender': np.asarray(GENDERS, dtype=object)[gender_code],
+            **demographics,
+            'credit_score': rng.integers(300, 851, num_records),
+            'num_cards': rng.integers(1, 4, num_records),  # 每个人随机开1到3张卡
+        }
 
     def generate_person(self, num_records=1):
         """生成个人主体数据"""
-        persons = []
-        people = []
-        for _ in range(num_records):
-            age = random.randint(18, 80)
-            income_level, occupation, marital_statu = assign_income_level_and_occupation(age)
-
-            person_id = self.fake.unique.ssn()
-            name = self.fake.name()
-            gender = random.choice(['男', '女'])
-            monthly_income = generate_monthly_income(income_level)
-            address = self.fake.province()
-            education = generate_education_level(income_level)
-            credit_score = random.randint(300, 850)
-
-            person = Person(person_id, name, gender, age, occupation, income_level, monthly_income, marital_statu,
-                            address, education, credit_score)
-            num_cards = random.randint(1, 3)  # 每个人随机开1到3张卡
-            for _ in range(num_cards):
-                bank_name = random.choice(self.banks)
-                person.add_card(BankCard(owner=person, bank_name=bank_name, balance=round(monthly_income * 10, 2)))
-
-            person_table = {
-                # 基本信息
-                'person_id': person_id,
-                'name': name,
-                'gender': gender,
-                'age': age,
-                'occupation': occupation,
-                'income_level': income_level,
-                'monthly_income': monthly_income,
-                'marital_status': marital_statu,
-                'address': address,
-                'education': education,
-
-                # 补充信息
-                'credit_score': credit_score
-            }
-            people.append(person)
-            persons.append(person_table)
-
-        return people, pd.DataFrame(persons) if num_records > 1 else persons[0]
+        attributes = self.draw_attributes(num_records)
+        identity = self.identity.generate(attributes['age'], attributes['gender_code'])
+
+        # 人员表按列组装
+        persons = pd.DataFrame({
+            # 基本信息
+            'person_id': identity['person_id'],
+            'name': identity['name'],
+            'gender': attributes['gender'],
+            'age': attributes['age'],
+            'occupation': attributes['occupation'],
+            'income_level': attributes['income_level'],
+            'monthly_income': attributes['monthly_income'],
+            'marital_status': attributes['marital_status'],
+            'address': identity['address'],
+            'education': attributes['education'],
+
+            # 补充信息
+            'credit_score': attributes['credit_score'],
+        })
+
+        # 大批量创建对象时暂停循环垃圾回收, 避免新建的 Person / BankCard 反复触发全量扫描
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            people = self._build_people(attributes, identity)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        return people, persons if num_records > 1 else persons.to_dict('records')[0]
+
+    def _build_people(self, attributes, identity):
+        """由属性列创建 Person 对象并批量开卡"""
+        num_records = len(attributes['age'])
+        first_owner = self.ledger.add_owners(identity['person_id'].tolist())
+        columns = (identity['person_id'], identity['name'], attributes['gender'], attributes['age'],
+                   attributes['occupation'], attributes['income_level'], attributes['monthly_income'],
+                   attributes['marital_status'], identity['address'], attributes['education'],
+                   attributes['credit_score'])
+        people = [Person(*row, ledger=self.ledger, index=first_owner + i)
+                  for i, row in enumerate(zip(*(column.tolist() for column in columns)))]
+
+        # 一次性开卡，初始余额为十个月的月收入
+        num_cards = attributes['num_cards']
+        owners = np.repeat(np.arange(first_owner, first_owner + num_records), num_cards)
+        banks = np.asarray(self.banks, dtype=object)[self.rng.integers(len(self.banks), size=len(owners))]
+        balances = np.repeat(attributes['monthly_income'] * 10, num_cards)
+        card_indices = self.ledger.add_cards(owners, banks, balances).tolist()
+        stops = np.cumsum(num_cards).tolist()
+        start = 0
+        view, ledger = BankCard.view, self.ledger
+        for person, stop in zip(people, stops):
+            person.cards = [view(ledger, card_index, person) for card_index in card_indices[start:stop]]
+            start = stop
+        return people
+
+
+# 以下逐人接口保留给旧调用方, 内部都转调 demographics 中的整列抽样
+# 依据年龄生成"收入水平"和"职业"
+def assign_income_level_and_occupation(age, rng=None):
+    sampled = DEFAULT_SAMPLER.sample_occupations([age], rng)
+    occupation, income, marital = (int(codes[0]) for codes in sampled)
+    return (DEFAULT_SAMPLER.income_levels[income], DEFAULT_SAMPLER.occupations[occupation],
+            DEFAULT_SAMPLER.marital_statuses[marital])
 
 
-# 依据年龄生成"收入水平"和"职业"
-def assign_income_level_and_occupation(age):
-    if age <= 25:
-        occupations = ["学生", "初入职场人员", "自由职业者"]
-        probabilities = [0.8, 0.15, 0.05]
-    elif 26 <= age <= 35:
-        occupations = ["白领/公司职员", "专业技术人员", "自由职业者", "小企业主"]
-        probabilities = [0.4, 0.3, 0.2, 0.1]
-    elif 36 <= age <= 45:
-        occupations = ["公司高层管理人员", "专业技术人员", "自由职业者", "中小企业主"]
-        probabilities = [0.3, 0.4, 0.2, 0.1]
-    elif 46 <= age <= 60:
-        occupations = ["高层管理人员", "专业人士", "企业主和高收入个体户", "自由职业者"]
-        probabilities = [0.3, 0.3, 0.3, 0.1]
-    else:
-        occupations = ["退休人员", "自由职业者和顾问", "投资人", "企业高层和企业主"]
-        probabilities = [0.5, 0.3, 0.1, 0.1]
-
-    occupation = random.choices(occupations, probabilities)[0]
-
-    if occupation == "学生":
-        income_level = "低"
-        marital_statu = "未婚"
-    elif occupation == "初入职场人员":
-        income_level = "低"
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.8, 0.15, 0.05])[0]
-    elif occupation == "自由职业者" and age <= 25:
-        income_level = random.choices(["低", "中"], [0.7, 0.3])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.8, 0.15, 0.05])[0]
-    elif occupation == "白领/公司职员":
-        income_level = random.choices(["低", "中", "高"], [0.1, 0.7, 0.2])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.3, 0.65, 0.05])[0]
-    elif occupation == "专业技术人员":
-        income_level = random.choices(["低", "中", "高"], [0.1, 0.6, 0.3])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.2, 0.75, 0.05])[0]
-    elif occupation == "自由职业者" and 26 <= age <= 35:
-        income_level = random.choices(["低", "中", "高"], [0.2, 0.5, 0.3])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.3, 0.65, 0.05])[0]
-    elif occupation == "小企业主":
-        income_level = random.choices(["低", "中", "高"], [0.1, 0.5, 0.4])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.2, 0.75, 0.05])[0]
-    elif occupation == "公司高层管理人员":
-        income_level = random.choices(["中", "高"], [0.05, 0.95])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.1, 0.85, 0.05])[0]
-    elif occupation == "自由职业者" and 36 <= age <= 45:
-        income_level = random.choices(["中", "高"], [0.2, 0.8])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.2, 0.75, 0.05])[0]
-    elif occupation == "中小企业主":
-        income_level = random.choices(["中", "高"], [0.05, 0.95])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "高层管理人员":
-        income_level = "高"
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "专业人士":
-        income_level = random.choices(["中", "高"], [0.2, 0.8])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "企业主和高收入个体户":
-        income_level = "高"
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "自由职业者" and 46 <= age <= 60:
-        income_level = random.choices(["中", "高"], [0.2, 0.8])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "退休人员":
-        income_level = "中"
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "自由职业者和顾问":
-        income_level = random.choices(["中", "高"], [0.5, 0.5])[0]
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "投资人":
-        income_level = "高"
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-    elif occupation == "企业高层和企业主":
-        income_level = "高"
-        marital_statu = random.choices(["未婚", "已婚", "离异"], [0.05, 0.85, 0.1])[0]
-
-    return income_level, occupation, marital_statu
-
-
-def generate_monthly_income(level):
-    if level == '低':
-        return round(random.uniform(2000, 5000), 2)  # 低收入范围：2000-5000
-    elif level == '中':
-        return round(random.uniform(5000, 15000), 2)  # 中收入范围：5000-15000
-    elif level == '高':
-        return round(random.uniform(15000, 50000), 2)  # 高收入范围：15000-50000
-    else:
-        raise ValueError("收入水平只能为 '低'，'中'，或 '高'")
+def generate_monthly_income(level, rng=None):
+    """按收入水平生成月收入，单位为分"""
+    return int(generate_monthly_incomes([level], rng)[0])
 
 
-def generate_education_level(income_level):
-    # 定义教育水平和对应的概率分布
-    education_levels = ['高中', '专科', '本科', '硕士', '博士']
+def generate_monthly_incomes(levels, rng=None):
+    """
+    批量按收入水平生成月收入
 
-    if income_level == '低':
-        probabilities = [0.4, 0.4, 0.15, 0.04, 0.01]  # 低收入的概率分布，高中文凭占比降低
-    elif income_level == '中':
-        probabilities = [0.2, 0.4, 0.3, 0.08, 0.02]  # 中等收入的概率分布，高中文凭占比进一步降低
-    elif income_level == '高':
-        probabilities = [0.05, 0.15, 0.5, 0.2, 0.1]  # 高收入的概率分布，高中比例最低，本科及以上占比更高
-    else:
-        raise ValueError("收入水平只能为 '低'，'中'，或 '高'")
+    Args:
+        levels (array-like): 每个人的收入水平
+        rng (np.random.Generator, optional): 随机数生成器
+
+    Returns:
+        np.ndarray: int64 分
+    """
+    return DEFAULT_SAMPLER.sample_monthly_incomes(DEFAULT_SAMPLER.income_codes(levels), rng)
+
+
+def generate_education_level(income_level, rng=None):
+    """根据收入水平的概率分布随机选择教育水平"""
+    return generate_education_levels([income_level], rng)[0]
 
-    # 根据概率分布随机选择教育水平
-    education_level = random.choices(education_levels, weights=probabilities, k=1)[0]
-    return education_level
+
+def generate_education_levels(income_levels, rng=None):
+    """
+    批量按收入水平生成教育水平
+
+    Args:
+        income_levels (array-like): 每个人的收入水平
+        rng (np.random.Generator, optional): 随机数生成器
+
+    Returns:
+        np.ndarray: 教育水平(object 数组)
+    """
+    codes = DEFAULT_SAMPLER.sample_education(DEFAULT_SAMPLER.income_codes(income_levels), rng)
+    return np.asarray(DEFAULT_SAMPLER.education_levels, dtype=object)[codes]
 
 
 # 使用示例
-def generate_person_data(num_persons=1000):
-    generator = PersonDataGenerator()
+def generate_person_data(num_persons=1000, path='data/persons.csv', row_group_size=None, rng=None, identity=None,
+                         demographics=None):
+    """
+    生成人员并写出人员表, 格式按扩展名推断(.csv / .parquet)
+
+    Args:
+        num_persons (int): 人数
+        path (str): 输出文件路径
+        row_group_size (int, optional): Parquet 每个行组的最大行数
+        rng (np.random.Generator | int, optional): 随机数生成器或种子
+        identity (IdentityGenerator, optional): 批量身份生成器, 分片生成时用于保证身份证号全局唯一
+        demographics (DemographicSampler | dict | str, optional): 人口属性概率表或其 JSON 路径
+    """
+    generator = PersonDataGenerator(rng, identity=identity, demographics=demographics)
     people, persons = generator.generate_person(num_persons)
-    persons.to_csv('data/persons.csv', index=False, encoding='utf-8-sig')
+    if path.endswith('.parquet'):
+        # 职业、学历、地址等做字典编码，月收入保存为 decimal128(18, 2)
+        from arrow_export import persons_to_arrow, write_parquet
+        write_parquet(persons_to_arrow(persons), path, row_group_size=row_group_size)
+    else:
+        # 金额只在导出时由分转换为元
+        persons.assign(monthly_income=to_yuan(persons['monthly_income'])).to_csv(path, index=False,
+                                                                                  encoding='utf-8-sig')
     return people, persons
 
 
@@ -232,5 +544,5 @@ if __name__ == "__main__":
     people, persons = generate_person_data(10)
     print(persons.head())
 
-    person = random.choice(people)
+    person = pick(DEFAULT_RNG, people)
     print(person.name, person.age, person.cards)
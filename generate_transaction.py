@@ -1,108 +1,230 @@
-import random
 from datetime import datetime
 
-import pandas as pd
+import numpy as np
 
-from generate_transaction_model import TransactionGeneratorLegal
+import profiling
+from generate_transaction_model import (TransactionGeneratorLegal, CardTable, PATTERN_NAMES, ROW_DEFAULTS,
+                                        RULE_TYPOLOGIES)
+from generate_transaction_model_illegal import TransactionGenerator
 from generate_transaction_model_illegal_2 import TransactionGeneratorIllegal
+from scheduler import PatternScheduler, distinct_members
+from seeding import randint
+from transaction_buffer import TransactionBuffer
 
-def generate_transactions(people, num):
+# 交易模式及其权重
+PATTERNS = ["small", "medium", "large", "investment", "frequent_large", "aa_payment"]
+WEIGHTS = [0.54, 0.3, 0.07, 0.03, 0.01, 0.05]
+
+# 按权重抽取整批计划的调度器, AA制为多人参与的模式
+SCHEDULER = PatternScheduler(PATTERNS, WEIGHTS, group_patterns=("aa_payment",), group_size=(3, 10))
+
+# 默认的交易日期范围(含两端)
+START_DATE = datetime(2023, 1, 1)
+END_DATE = datetime(2023, 12, 31)
+
+# 每次循环平均产生的交易行数(已扣除余额不足被跳过的部分)，用于按目标行数估算循环次数
+ROWS_PER_ITERATION = 20
+
+
+def _legal_generator(rng=None, start_date=None, end_date=None):
+    """创建交易生成器实例, 日期范围默认为 START_DATE - END_DATE"""
+    start_date = START_DATE if start_date is None else start_date
+    end_date = END_DATE if end_date is None else end_date
+    return TransactionGeneratorLegal(start_date, end_date, rng=rng)
+
+
+def generate_transactions(people, num, batched=True, rng=None, graph=None):
     """
     Args:
         :param people: （Person）类 交易人员
         :param num: 循环次数
+        :param batched: 是否使用批量(NumPy)模式, False 时逐笔生成
+        :param rng: np.random.Generator 或种子, 默认随机初始化
+        :param graph: 交易对手图(CounterpartyGraph), 节点为 people 中的下标; 默认接收方均匀抽取
     """
-    patterns = ["small", "medium", "large", "investment", "frequent_large", "aa_payment"]
-    weights = [0.54, 0.3, 0.07, 0.03, 0.01, 0.05]
-
-
-
-    # 创建交易生成器实例
-    start_date = datetime(2023, 1, 1)
-    end_date = datetime(2023, 12, 31)
-    generator = TransactionGeneratorLegal(start_date, end_date)
-
-    all_transactions = pd.DataFrame(columns=[
-        "sender_id", "sender_card_bank", "sender_card_number", "sender_card_balance_old", "sender_card_balance_new",
-        "receiver_id", "receiver_card_bank", "receiver_card_number", "receiver_card_balance_old",
-        "receiver_card_balance_new", "amount", "timestamp", "transaction_type", "risk_level"
-    ])
-    new_transactions = pd.DataFrame(columns=[
-        "sender_id", "sender_card_bank", "sender_card_number", "sender_card_balance_old", "sender_card_balance_new",
-        "receiver_id", "receiver_card_bank", "receiver_card_number", "receiver_card_balance_old",
-        "receiver_card_balance_new", "amount", "timestamp", "transaction_type", "risk_level"
-    ])
-    for _ in range(num):
-        sender = random.choice(people)
-        receiver = random.choice(people)
-        pattern = random.choices(patterns, weights)[0]
-
-        while receiver == sender:
-            receiver = random.choice(people)
-
-        if pattern == "small":
-            new_transactions = generator.generate_small_transfers(sender, receiver)
-        if pattern == "medium":
-            new_transactions = generator.generate_medium_transfers(sender, receiver)
-        if pattern == "large":
-            new_transactions = generator.generate_large_transfers(sender, receiver)
-        if pattern == "investment":
-            new_transactions = generator.generate_investment_transfers(sender, receiver)
-        if pattern == "frequent_large":
-            new_transactions = generator.generate_frequent_large_transfers(sender, receiver)
-        if pattern == "aa_payment":
-            num_to_select = random.randint(3, 10)
-            selected_people = random.sample(people, num_to_select)
-            random_float = round(random.uniform(60, 2000), 2)
-            new_transactions = generator.generate_aa_payments(selected_people, random_float)
-
-        all_transactions = pd.concat([all_transactions, new_transactions], ignore_index=True)
-    return all_transactions
-
-def generate_transactions_illegal(people, num):
+    generator = _legal_generator(rng)
+
+    # 所有交易追加到列式缓冲区，最后一次性导出，避免逐次 pd.concat 的整表复制
+    buffer = TransactionBuffer()
+    if batched:
+        _generate_transactions_batched(generator, people, CardTable(people), num, buffer, graph)
+        return buffer.to_dataframe()
+
+    # 逐笔模式同样先抽出整批计划，再按模式名称查表分派
+    rng = generator.rng
+    plan = SCHEDULER.draw(num, len(people), rng, graph)
+    columns = (plan[name].tolist() for name in ('pattern', 'sender', 'receiver', 'group_size'))
+    for pattern, sender, receiver, group_size in zip(*columns):
+        if group_size:
+            selected_people = [people[index] for index in rng.choice(len(people), size=group_size, replace=False)]
+            total_amount = randint(rng, 6000, 200000)  # 60-2000元(分)
+            generator.generate_aa_payments(selected_people, total_amount, buffer=buffer)
+        else:
+            transfer = getattr(generator, f"generate_{PATTERNS[pattern]}_transfers")
+            transfer(people[sender], people[receiver], buffer=buffer)
+
+    return buffer.to_dataframe()
+
+
+def iter_transactions(people, num, batch_size=100000, rng=None, graph=None, start_date=None, end_date=None,
+                      checkpoint=None, first_group=0):
     """
+    流式生成交易: 按循环分段批量生成，每凑满 batch_size 行产出一批，内存占用只与批大小有关
+
     Args:
         :param people: （Person）类 交易人员
         :param num: 循环次数
+        :param batch_size: 每批行数(最后一批可能不足)
+        :param rng: np.random.Generator 或种子, 默认随机初始化
+        :param graph: 交易对手图(CounterpartyGraph), 节点为 people 中的下标; 默认接收方均匀抽取
+        :param start_date: 交易开始日期, 默认 START_DATE
+        :param end_date: 交易结束日期(含当天), 默认 END_DATE
+        :param checkpoint: 检查点(Checkpointer), 已加载时从其中的状态继续
+        :param first_group: 第一个AA制群组的编号
+
+    Yields:
+        dict: 列名到数组的映射(时间戳为 int64 秒, 金额为 int64 分)
     """
-    patterns = []
-    weights = [0.54, 0.3, 0.07, 0.03, 0.01, 0.05]
-
-
-
-    # 创建交易生成器实例
-    start_date = datetime(2023, 1, 1)
-    end_date = datetime(2023, 12, 31)
-    generator = TransactionGeneratorIllegal(start_date, end_date)
-
-    all_transactions = pd.DataFrame(columns=[
-        "sender_id", "sender_card_bank", "sender_card_number", "sender_card_balance_old", "sender_card_balance_new",
-        "receiver_id", "receiver_card_bank", "receiver_card_number", "receiver_card_balance_old",
-        "receiver_card_balance_new", "amount", "timestamp", "transaction_type", "risk_level"
-    ])
-    new_transactions = pd.DataFrame(columns=[
-        "sender_id", "sender_card_bank", "sender_card_number", "sender_card_balance_old", "sender_card_balance_new",
-        "receiver_id", "receiver_card_bank", "receiver_card_number", "receiver_card_balance_old",
-        "receiver_card_balance_new", "amount", "timestamp", "transaction_type", "risk_level"
-    ])
-
-    for _ in range(num):
-        sender = random.choice(people)
-        receiver = random.choice(people)
-        # pattern = random.choices(patterns, weights)[0]
-
-
-        new_transactions = generator.generate_regular_pattern_transfers(sender, receiver)
-        all_transactions = pd.concat([all_transactions, new_transactions], ignore_index=True)
-    return all_transactions
-
-
+    generator = _legal_generator(rng, start_date, end_date)
+    generator.next_group_id = first_group
+    cards = CardTable(people)
+    buffer = TransactionBuffer(capacity=2 * batch_size)
+    chunk_iterations = max(batch_size // ROWS_PER_ITERATION, 1)
+
+    position = 0
+    if checkpoint is not None and checkpoint.resuming:
+        generator.rng.bit_generator.state = checkpoint.info['rng']
+        cards.balances[:] = checkpoint.arrays['balances']
+        position = checkpoint.info['position']
+        generator.next_group_id = checkpoint.info['next_group_id']
+
+    for start in range(position, num, chunk_iterations):
+        _generate_transactions_batched(generator, people, cards, min(chunk_iterations, num - start), buffer,
+                                       graph)
+        while len(buffer) >= batch_size:
+            yield buffer.pop_batch(batch_size)
+        if checkpoint is not None and start + chunk_iterations < num and checkpoint.due():
+            # 先把缓冲区剩余的行交给调用方写出, 检查点只需记录输出偏移量
+            if len(buffer):
+                yield buffer.pop_batch(len(buffer))
+            checkpoint.save({'balances': cards.balances.copy()},
+                            {'rng': generator.rng.bit_generator.state, 'position': start + chunk_iterations,
+                             'next_group_id': generator.next_group_id})
+
+    if len(buffer):
+        yield buffer.pop_batch(len(buffer))
+
+
+def _expand_transfer_batch(generator, cards, plan, iterations, window=None):
+    """普通转账模式整批展开(PATTERNS 中转账模式的编码与 PATTERN_NAMES 一致)"""
+    with profiling.stage("expand.transfers") as stage:
+        rows = generator.expand_transfers(cards, plan['sender'][iterations], plan['receiver'][iterations],
+                                          plan['pattern'][iterations], window=window)
+        stage.add_rows(len(rows["amount"]))
+    return rows
+
+
+def _expand_aa_batch(generator, cards, plan, iterations, window=None):
+    """AA制整批展开: 成员不放回抽取，活动费用整列抽取"""
+    rng = generator.rng
+    with profiling.stage("expand.aa_payment") as stage:
+        members, offsets = distinct_members(len(cards.owner_index), plan['group_size'][iterations], rng)
+        totals = rng.integers(6000, 200001, len(iterations))  # 60-2000元(分)
+        rows = generator.expand_aa_payments(cards, members, offsets, totals, window=window)
+        stage.add_rows(len(rows["amount"]))
+    return rows
+
+
+# 模式 -> 批量展开函数, 共用同一函数的模式由调度器合成一批
+BATCH_HANDLERS = {**{name: _expand_transfer_batch for name in PATTERN_NAMES}, "aa_payment": _expand_aa_batch}
+
+
+def expand_plan(generator, cards, plan, window=None):
+    """
+    按模式分组整批展开一份计划，再按循环顺序合并
 
+    Args:
+        generator (TransactionGeneratorLegal): 交易生成器
+        cards (CardTable): 银行卡数组表
+        plan (dict): SCHEDULER.draw 的输出
+        window (tuple, optional): (开始, 结束) 秒, 交易日期限定在其中
 
+    Returns:
+        dict: 逐笔交易数组(不含 owner), 计划为空时返回 None
+    """
+    parts, orders = [], []
+    for handler, iterations in SCHEDULER.batches(plan, BATCH_HANDLERS):
+        rows = handler(generator, cards, plan, iterations, window=window)
+        parts.append(rows)
+        orders.append(iterations[rows.pop("owner")])
 
+    if not parts:
+        return None
 
+    # 各批交易按所属循环序号合并，保证余额结算顺序与逐笔模式一致; 只有部分批次带的列(如AA制群组列)在其余批次中取默认值
+    order = np.argsort(np.concatenate(orders), kind='stable')
+    keys = dict.fromkeys(key for part in parts for key in part)
+    return {key: np.concatenate([part[key] if key in part else np.full(len(part["amount"]), ROW_DEFAULTS[key],
+                                                                        dtype=np.int64) for part in parts])[order]
+            for key in keys}
 
 
+def _generate_transactions_batched(generator, people, cards, num, buffer, graph=None):
+    """
+    批量模式: 先抽出全部 num 次循环的计划，再按模式分组整批展开，最后按循环顺序结算余额
+    """
+    plan = SCHEDULER.draw(num, len(people), generator.rng, graph)
+    rows = expand_plan(generator, cards, plan)
+    if rows is not None:
+        generator.settle_rows(cards, rows, buffer=buffer)
+    return buffer
 
 
+def generate_transactions_illegal(people, num, batched=True, rng=None):
+    """
+    Args:
+        :param people: （Person）类 交易人员
+        :param num: 异常案例数
+        :param batched: 是否整批生成, False 时逐个案例生成
+        :param rng: np.random.Generator 或种子, 默认随机初始化
+    """
+    generator = TransactionGeneratorIllegal(START_DATE, END_DATE, rng=rng)
+    rng = generator.rng
+
+    # 付款人和收款人整列抽取, 收款人抽到不小于付款人的下标时加一, 不会自己转给自己
+    senders = rng.integers(len(people), size=num)
+    receivers = rng.integers(len(people) - 1, size=num)
+    receivers += receivers >= senders
+
+    if batched:
+        # 整批展开后按时间顺序结算, 不再为每个案例构造 DataFrame
+        cards = CardTable(people)
+        rows = generator.expand_regular_patterns(cards, senders, receivers)
+        order = np.argsort(rows["timestamp"], kind='stable')
+        return generator.settle_rows(cards, {key: values[order] for key, values in rows.items()})
+
+    # 所有交易追加到列式缓冲区，最后一次性导出，避免逐次 pd.concat 的整表复制
+    buffer = TransactionBuffer()
+    for case_id, (sender, receiver) in enumerate(zip(senders.tolist(), receivers.tolist())):
+        generator.generate_regular_pattern_transfers(people[sender], people[receiver], case_id=case_id,
+                                                     buffer=buffer)
+    return buffer.to_dataframe()
+
+
+def generate_transactions_rules(people, num, typologies=None, rng=None):
+    """
+    按十条异常规则合成带标注的交易，每种规则 num 个案例
 
+    Args:
+        :param people: （Person）类 交易人员
+        :param num: 每种规则的案例数
+        :param typologies: 规则名称列表, 默认 RULE_TYPOLOGIES 全部
+        :param rng: np.random.Generator 或种子, 默认随机初始化
+    """
+    generator = TransactionGenerator(START_DATE, END_DATE, rng=rng)
+    cards = CardTable(people)
+    parts = [generator.synthesize(cards, typology, num, first_case=index * num)
+             for index, typology in enumerate(typologies or RULE_TYPOLOGIES)]
+    rows = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    order = np.argsort(rows["timestamp"], kind='stable')
+    return generator.settle_rows(cards, {key: values[order] for key, values in rows.items()})
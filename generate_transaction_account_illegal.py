@@ -1,3 +1,21 @@
+"""
+    账户资料异常检测
+    对法人、联系电话、地址、代办人四个字段各维护一个倒排计数索引(取值 -> 客户数)，
+    新增或更新客户资料时增量维护，单个客户的检测只需四次字典查询
+"""
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# 计数索引覆盖的字段, 与检测条件 X / Y / M / N 一一对应
+INDEXED_FIELDS = ('legal_representative', 'contact_number', 'address', 'agent')
+SENSITIVE_INDUSTRY_KEYWORDS = ["房地产项目", "投资物业管理服务", "企业管理咨询服务", "投资管理咨询服务", "养殖", "种植",
+                               "生物技术", "养老服务"]
+SUSPICIOUS_COMPANY_KEYWORDS = ["P2P网贷", "担保公司", "投资公司"]
+
+
 class AccountAnomalyDetector:
     def __init__(self, corporate_data):
         """
@@ -5,8 +23,59 @@ class AccountAnomalyDetector:
 
         Args:
             corporate_data (dict): 企业和客户信息数据，包含法人、联系电话、地址、代办人等信息
+                检测器保存资料的副本, 之后新增或修改客户资料须通过 add_record / remove_record
+        """
+        # 复制客户资料, 调用方之后直接修改原字典不会使计数索引过期
+        self.corporate_data = {person_id: dict(record) for person_id, record in corporate_data.items()}
+        # 字段 -> Counter(取值 -> 客户数), 缺少该字段的客户计入 None
+        self.indexes = {field: Counter(record.get(field) for record in self.corporate_data.values())
+                        for field in INDEXED_FIELDS}
+
+    def add_record(self, person_id, record):
+        """
+        新增客户资料, 客户已存在时替换原资料
+
+        Args:
+            person_id (str): 客户ID
+            record (dict): 客户资料
+        """
+        if person_id in self.corporate_data:
+            self.remove_record(person_id)
+        record = dict(record)
+        self.corporate_data[person_id] = record
+        for field, index in self.indexes.items():
+            index[record.get(field)] += 1
+
+    def remove_record(self, person_id):
+        """
+        删除客户资料
+
+        Args:
+            person_id (str): 客户ID
+
+        Returns:
+            dict: 被删除的资料
+        """
+        record = self.corporate_data.pop(person_id)
+        for field, index in self.indexes.items():
+            value = record.get(field)
+            index[value] -= 1
+            if index[value] <= 0:
+                del index[value]
+        return record
+
+    def field_counts(self, person_id):
         """
-        self.corporate_data = corporate_data
+        客户四个字段的取值各对应多少个客户(含自身)
+
+        Args:
+            person_id (str): 目标客户ID
+
+        Returns:
+            dict: 字段 -> 客户数
+        """
+        record = self.corporate_data[person_id]
+        return {field: index[record.get(field)] for field, index in self.indexes.items()}
 
     def check_account_data_anomaly(self, person_id, x, y, m, n):
         """
@@ -27,26 +96,11 @@ class AccountAnomalyDetector:
         Returns:
             bool: 是否符合异常条件
         """
-        legal_representative = self.corporate_data[person_id].get('legal_representative')
-        contact_number = self.corporate_data[person_id].get('contact_number')
-        address = self.corporate_data[person_id].get('address')
-        agent = self.corporate_data[person_id].get('agent')
-
-        # 查询同一法人对应的对公账户数量
-        accounts_with_same_legal_rep = sum(
-            1 for p in self.corporate_data.values() if p.get('legal_representative') == legal_representative)
-        # 查询统一联系电话对应的对公账户数量
-        accounts_with_same_contact = sum(
-            1 for p in self.corporate_data.values() if p.get('contact_number') == contact_number)
-        # 查询同一地址对应的客户数量
-        accounts_with_same_address = sum(1 for p in self.corporate_data.values() if p.get('address') == address)
-        # 查询同一代办人对应的客户数量
-        accounts_with_same_agent = sum(1 for p in self.corporate_data.values() if p.get('agent') == agent)
-
-        return (accounts_with_same_legal_rep >= x and
-                accounts_with_same_contact >= y and
-                accounts_with_same_address >= m and
-                accounts_with_same_agent >= n)
+        counts = self.field_counts(person_id)
+        return (counts['legal_representative'] >= x and
+                counts['contact_number'] >= y and
+                counts['address'] >= m and
+                counts['agent'] >= n)
 
     def check_sensitive_industry(self, person_id):
         """
@@ -60,11 +114,9 @@ class AccountAnomalyDetector:
         Returns:
             bool: 是否符合敏感行业条件
         """
-        sensitive_keywords = ["房地产项目", "投资物业管理服务", "企业管理咨询服务", "投资管理咨询服务", "养殖", "种植",
-                              "生物技术", "养老服务"]
         business_scope = self.corporate_data[person_id].get('business_scope', "")
 
-        return any(keyword in business_scope for keyword in sensitive_keywords)
+        return any(keyword in business_scope for keyword in SENSITIVE_INDUSTRY_KEYWORDS)
 
     def check_suspicious_company_type(self, person_id):
         """
@@ -77,7 +129,39 @@ class AccountAnomalyDetector:
         Returns:
             bool: 是否符合可疑公司性质条件
         """
-        suspicious_keywords = ["P2P网贷", "担保公司", "投资公司"]
         registered_platform = self.corporate_data[person_id].get('registered_platform', "")
 
-        return any(keyword in registered_platform for keyword in suspicious_keywords)
+        return any(keyword in registered_platform for keyword in SUSPICIOUS_COMPANY_KEYWORDS)
+
+    def score_all(self, x, y, m, n):
+        """
+        一次检测全部客户
+
+        四个计数列由计数索引逐列查出; 两个关键字条件对整列字符串做一次正则匹配
+
+        Args:
+            x (int): 对公账户数量阈值
+            y (int): 联系电话对应账户数量阈值
+            m (int): 地址对应客户数量阈值
+            n (int): 代办人对应客户数量阈值
+
+        Returns:
+            pd.DataFrame: 以客户ID为索引, 四个字段的客户数、account_data_anomaly、sensitive_industry、
+                suspicious_company_type 三个检测结果
+        """
+        records = self.corporate_data.values()
+        result = pd.DataFrame(index=pd.Index(list(self.corporate_data.keys()), name='person_id'))
+        for field, index in self.indexes.items():
+            result[f'{field}_count'] = np.fromiter((index[record.get(field)] for record in records),
+                                                   dtype=np.int64, count=len(result))
+        result['account_data_anomaly'] = ((result['legal_representative_count'] >= x) &
+                                          (result['contact_number_count'] >= y) &
+                                          (result['address_count'] >= m) &
+                                          (result['agent_count'] >= n))
+        for column, field, keywords in (('sensitive_industry', 'business_scope', SENSITIVE_INDUSTRY_KEYWORDS),
+                                        ('suspicious_company_type', 'registered_platform',
+                                         SUSPICIOUS_COMPANY_KEYWORDS)):
+            text = pd.Series([record.get(field, "") for record in records], index=result.index, dtype=object)
+            pattern = "|".join(re.escape(keyword) for keyword in keywords)
+            result[column] = text.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+        return result
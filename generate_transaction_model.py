@@ -1,60 +1,261 @@
-import random
 from datetime import datetime, timedelta
 import numpy as np
-import pandas as pd
+
+import profiling
+from generate_person import DEFAULT_LEDGER
+from money import to_cents
+from seeding import make_rng, pick, randint
+from timestamp_sampler import SECONDS_PER_DAY, TimestampSampler
+from transaction_buffer import columns_to_dataframe, records_to_dataframe
+
+# 批量模式下各转账模式的参数: 每次交易笔数范围(含两端)、金额分布、交易类型
+TRANSFER_PATTERNS = {
+    "small": {"num_transactions": (20, 50), "amount": ("uniform", 100, 2000),
+              "transaction_type": "small_transfer"},
+    "medium": {"num_transactions": (5, 15), "amount": ("uniform", 2000, 20000),
+               "transaction_type": "medium_transfer"},
+    "large": {"num_transactions": (1, 3), "amount": ("uniform", 20000, 200000),
+              "transaction_type": "large_transfer"},
+    "investment": {"num_transactions": (3, 8), "amount": ("lognormal", 11, 1),
+                   "transaction_type": "investment_transfer"},
+    "frequent_large": {"num_transactions": (15, 30), "amount": ("uniform", 50000, 500000),
+                       "transaction_type": "frequent_large_transfer"},
+}
+PATTERN_NAMES = list(TRANSFER_PATTERNS)
+
+# 公司与人员之间的资金往来: 工资按月发放, 供应商付款(公司 -> 公司)和消费付款(个人 -> 公司)按对抽取,
+# 每对的交易笔数范围(含两端)、金额分布(元)和在两者中所占的比例
+SALARY_TYPE_NAME = "salary"
+COMPANY_PAYMENTS = {
+    "supplier": {"num_transactions": (1, 6), "amount": ("lognormal", 11, 1), "weight": 0.2,
+                 "transaction_type": "supplier_payment"},
+    "consumer": {"num_transactions": (1, 10), "amount": ("uniform", 20, 2000), "weight": 0.8,
+                 "transaction_type": "consumer_payment"},
+}
+COMPANY_TRANSACTION_TYPES = [SALARY_TYPE_NAME] + [spec["transaction_type"] for spec in COMPANY_PAYMENTS.values()]
+
+# 十条异常规则对应的交易合成模式, 名称与 generate_transaction_model_illegal.TransactionGenerator 中的规则一致
+RULE_TYPOLOGIES = ["daily_open_account_and_outflow", "short_term_private_transactions",
+                   "incoming_and_outgoing_transactions", "location_mismatch", "new_account_activity",
+                   "online_bank_low_balance", "frequent_small_inflows", "keyword_related_outflows",
+                   "low_balance_large_inflow_outflow", "outflow_dominant_transactions"]
+
+# 异常交易类型, 由 generate_transaction_model_illegal_2 / generate_transaction_model_illegal 批量注入;
+# 规则模式按案例主体的资金方向分为转入(_in)和转出(_out)两类
+ILLEGAL_TRANSACTION_TYPES = (["regular_pattern_initial", "regular_pattern_in", "regular_pattern_rebate"] +
+                             [f"{name}_{direction}" for name in RULE_TYPOLOGIES for direction in ("in", "out")])
+
+# 交易类型编码表, 批量模式中以下标表示交易类型
+TRANSACTION_TYPES = ([spec["transaction_type"] for spec in TRANSFER_PATTERNS.values()] + ["aa_payment"] +
+                     COMPANY_TRANSACTION_TYPES + ILLEGAL_TRANSACTION_TYPES)
+AA_PAYMENT_TYPE = TRANSACTION_TYPES.index("aa_payment")
+SALARY_TYPE = TRANSACTION_TYPES.index(SALARY_TYPE_NAME)
+
+# 标注编码表: 交易所属的异常类型, 0 为正常交易
+TYPOLOGIES = ["normal", "regular_pattern"] + RULE_TYPOLOGIES
+
+# 交易数组中可省略的列及其默认值: 风险等级、标注(正常交易)和AA制群组信息(非AA制交易)
+ROW_DEFAULTS = {"risk_level": 0, "typology": 0, "case_id": -1, "group_id": -1, "total_amount": 0,
+                "participants_count": 0}
+
+class CardTable:
+    """
+    批量模式下一组人员到账本的映射: 人员在列表中的位置 -> 账本持有人下标 -> 其名下的卡
+    余额直接读写账本中的数组，不再逐个操作 BankCard 对象
+    """
+
+    def __init__(self, people):
+        """
+        Args:
+            people (list): 交易人员(Person)列表, 须共用同一个账本
+        """
+        self.people = people
+        self.ledger = people[0].ledger if people else DEFAULT_LEDGER
+        if any(person.ledger is not self.ledger for person in people):
+            raise ValueError("银行卡数组表中的人员须共用同一个账本")
+        self.owner_index = np.array([person.index for person in people], dtype=np.int64)
+
+        indptr, self.owner_cards = self.ledger.owner_cards()
+        self.offsets = indptr[self.owner_index]
+        self.counts = indptr[self.owner_index + 1] - self.offsets
+
+    @classmethod
+    def concat(cls, tables):
+        """
+        把共用同一账本的几张表首尾相接, 各表的人员依次排列; 只拼接各表建立时的卡列表,
+        之后新开的卡不会被 pick 选中, 与原来各表一致
+
+        Args:
+            tables (list): CardTable 列表
+        """
+        if any(table.ledger is not tables[0].ledger for table in tables):
+            raise ValueError("只能拼接共用同一账本的银行卡数组表")
+        table = cls.__new__(cls)
+        table.people = [person for part in tables for person in part.people]
+        table.ledger = tables[0].ledger
+        table.owner_index = np.concatenate([part.owner_index for part in tables])
+        table.owner_cards = np.concatenate([part.owner_cards for part in tables])
+        starts = np.cumsum([0] + [len(part.owner_cards) for part in tables[:-1]])
+        table.offsets = np.concatenate([part.offsets + start for part, start in zip(tables, starts)])
+        table.counts = np.concatenate([part.counts for part in tables])
+        return table
+
+    @property
+    def balances(self):
+        return self.ledger.balances
+
+    def pick(self, persons, rng):
+        """为每个人员(列表中的位置)随机选一张卡，返回账本中的卡下标"""
+        persons = np.asarray(persons, dtype=np.int64)
+        choice = self.offsets[persons] + (rng.random(len(persons)) * self.counts[persons]).astype(np.int64)
+        return self.owner_cards[choice]
+
+
+def split_amounts(totals, sizes):
+    """
+    AA制分摊: 每组费用按人数均分到分, 除不尽的余数由组内前几名成员各多付 1 分, 组内份额之和等于总费用
+
+    Args:
+        totals (np.ndarray): 每组的总费用(分)
+        sizes (np.ndarray): 每组人数
+
+    Returns:
+        np.ndarray: 按组依次排列的每名成员的份额(分), 长度为 sizes.sum()
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    sizes = np.asarray(sizes, dtype=np.int64)
+    group = np.repeat(np.arange(len(sizes)), sizes)
+    starts = np.cumsum(sizes) - sizes
+    rank = np.arange(len(group)) - starts[group]
+    return totals[group] // sizes[group] + (rank < totals[group] % sizes[group])
+
+
+def _balances_before(balances, sender_cards, receiver_cards, amounts):
+    """
+    假设所有交易都成功，按交易顺序计算每笔交易发生前双方卡上的余额
+    每笔交易拆成"付款方扣款、收款方入账"两条分录，按卡稳定排序后做分组累加
+    """
+    num_rows = len(amounts)
+    cards = np.empty(2 * num_rows, dtype=np.int64)
+    cards[0::2] = sender_cards
+    cards[1::2] = receiver_cards
+    deltas = np.empty(2 * num_rows, dtype=np.int64)
+    deltas[0::2] = -amounts
+    deltas[1::2] = amounts
+
+    order = np.argsort(cards, kind='stable')
+    sorted_cards = cards[order]
+    sorted_deltas = deltas[order]
+
+    # 组内不含本条的累加和 = 全局不含本条的累加和 - 组首位置的全局不含本条累加和
+    exclusive = np.cumsum(sorted_deltas) - sorted_deltas
+    group_start = np.ones(len(sorted_cards), dtype=bool)
+    group_start[1:] = sorted_cards[1:] != sorted_cards[:-1]
+    start_index = np.maximum.accumulate(np.where(group_start, np.arange(len(sorted_cards)), 0))
+
+    before = np.empty(2 * num_rows, dtype=np.int64)
+    before[order] = balances[sorted_cards] + exclusive - exclusive[start_index]
+    return before[0::2], before[1::2]
+
+
+def _settle_sequential(balances, sender_cards, receiver_cards, amounts):
+    """逐笔顺序结算: 把涉及的卡映射成局部下标，在 Python 列表上循环，最后写回 balances"""
+    num_rows = len(amounts)
+    cards, local = np.unique(np.concatenate([sender_cards, receiver_cards]), return_inverse=True)
+    local_balances = balances[cards].tolist()
+
+    accepted = [False] * num_rows
+    sender_old = [0] * num_rows
+    receiver_old = [0] * num_rows
+    rows = zip(local[:num_rows].tolist(), local[num_rows:].tolist(), amounts.tolist())
+    for index, (sender, receiver, amount) in enumerate(rows):
+        balance = local_balances[sender]
+        if amount > balance and balance > 0:
+            continue
+        accepted[index] = True
+        sender_old[index] = balance
+        receiver_old[index] = local_balances[receiver]
+        local_balances[sender] = balance - amount
+        local_balances[receiver] += amount
+
+    balances[cards] = local_balances
+    return np.array(accepted, dtype=bool), np.array(sender_old, dtype=np.int64), np.array(receiver_old, dtype=np.int64)
+
+
+def settle_transfers(balances, sender_cards, receiver_cards, amounts, min_chunk=256, max_chunk=65536):
+    """
+    按交易顺序结算一批转账，沿用逐笔模式的跳过规则: 金额大于付款卡余额且余额为正时跳过该笔
+    每一段先假设全部成功，用按卡分组的累加和一次算出所有余额；第一笔违反规则的交易之前的部分
+    直接成交，从该笔起本段剩余部分逐笔结算。段长随跳过频率自适应，结果与逐笔顺序结算完全一致
+
+    Args:
+        balances (np.ndarray): 卡余额(分)，原地更新
+        sender_cards (np.ndarray): 付款卡下标
+        receiver_cards (np.ndarray): 收款卡下标
+        amounts (np.ndarray): 金额(分)
+        min_chunk (int): 最小段长
+        max_chunk (int): 最大段长
+
+    Returns:
+        tuple: (accepted, sender_old, receiver_old) 是否成交的掩码，以及成交时双方的原余额
+    """
+    num_rows = len(amounts)
+    accepted = np.zeros(num_rows, dtype=bool)
+    sender_old = np.zeros(num_rows, dtype=np.int64)
+    receiver_old = np.zeros(num_rows, dtype=np.int64)
+
+    start = 0
+    chunk = min_chunk
+    while start < num_rows:
+        stop = min(start + chunk, num_rows)
+        senders = sender_cards[start:stop]
+        receivers = receiver_cards[start:stop]
+        chunk_amounts = amounts[start:stop]
+        senders_before, receivers_before = _balances_before(balances, senders, receivers, chunk_amounts)
+
+        violations = np.flatnonzero((chunk_amounts > senders_before) & (senders_before > 0))
+        keep = violations[0] if len(violations) else stop - start
+
+        accepted[start:start + keep] = True
+        sender_old[start:start + keep] = senders_before[:keep]
+        receiver_old[start:start + keep] = receivers_before[:keep]
+        np.subtract.at(balances, senders[:keep], chunk_amounts[:keep])
+        np.add.at(balances, receivers[:keep], chunk_amounts[:keep])
+
+        if len(violations):
+            tail = slice(start + keep, stop)
+            accepted[tail], sender_old[tail], receiver_old[tail] = _settle_sequential(
+                balances, senders[keep:], receivers[keep:], chunk_amounts[keep:])
+            chunk = max(min_chunk, chunk // 2)
+        else:
+            chunk = min(max_chunk, chunk * 2)
+        start = stop
+
+    return accepted, sender_old, receiver_old
 
 
 class TransactionGeneratorLegal:
-    def __init__(self, start_date, end_date):
+    def __init__(self, start_date, end_date, rng=None):
         """
         初始化交易生成器
 
         Args:
             start_date (datetime): 交易开始日期
             end_date (datetime): 交易结束日期
+            rng (np.random.Generator | int, optional): 随机数生成器或种子, 逐笔和批量模式都只从中取随机数
         """
         self.start_date = start_date
         self.end_date = end_date
-
-    def _generate_weighted_random_time(self):
-        """生成加权随机时间，精确到秒"""
-        # 定义时间段及其权重
-        time_slots = [
-            (9, 18, 5),  # 白天正常交易时间 9:00 - 18:00，权重为5
-            (0, 6, 1),   # 凌晨异常交易时间 00:00 - 6:00，权重为1
-            (6, 9, 2),   # 早上 6:00 - 9:00，权重为2
-            (18, 24, 2)  # 晚上 18:00 - 24:00，权重为2
-        ]
-
-        # 计算总权重
-        total_weight = sum(slot[2] for slot in time_slots)
-
-        # 生成一个随机数
-        rand_num = random.uniform(0, total_weight)
-
-        # 累计权重，找到对应的时段
-        cumulative_weight = 0
-        for start_hour, end_hour, weight in time_slots:
-            cumulative_weight += weight
-            if rand_num < cumulative_weight:
-                hour = random.randint(start_hour, end_hour - 1)
-                minute = random.randint(0, 59)
-                second = random.randint(0, 59)
-                return hour, minute, second
+        self.rng = make_rng(rng)
+        self.timestamp_sampler = TimestampSampler(start_date, end_date, rng=self.rng)
+        # 下一个AA制活动的群组编号, 分片或追加生成时由调用方错开
+        self.next_group_id = 0
 
     def _generate_timestamp(self):
         """生成随机时间戳，具体到秒"""
-        time_between_dates = self.end_date - self.start_date
-        total_seconds = int(time_between_dates.total_seconds())
-        random_seconds = random.randint(0, total_seconds)
-        random_date = self.start_date + timedelta(seconds=random_seconds)
+        return self.timestamp_sampler.sample_one()
 
-        # 生成加权随机时间
-        hour, minute, second = self._generate_weighted_random_time()
-        random_date = random_date.replace(hour=hour, minute=minute, second=second, microsecond=0)
-        return random_date
-
-    def generate_small_transfers(self, sender, receiver, risk=0, num_transactions=None):
+    def generate_small_transfers(self, sender, receiver, risk=0, num_transactions=None, buffer=None):
         """
         生成小额频繁转账模式
         适用场景：日常生活支付、租金、水电费等
@@ -64,50 +265,55 @@ class TransactionGeneratorLegal:
             receiver (Person): 接收方
             num_transactions (int, optional): 交易数量, 默认随机20-50笔
             risk (str): 交易风险等级
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
         """
         if num_transactions is None:
-            num_transactions = random.randint(20, 50)
+            num_transactions = randint(self.rng, 20, 50)
 
         transactions = []
         for _ in range(num_transactions):
-            amount = round(random.uniform(100, 2000), 2)  # 100-2000元的小额转账
+            amount = randint(self.rng, 10000, 200000)  # 100-2000元的小额转账(分)
             timestamp = self._generate_timestamp()
 
             sender_id = sender.person_id
             receiver_id = receiver.person_id
-            sender_card = random.choice(sender.cards) if sender.cards else None
-            receiver_card = random.choice(receiver.cards) if receiver.cards else None
+            sender_card = pick(self.rng, sender.cards) if sender.cards else None
+            receiver_card = pick(self.rng, receiver.cards) if receiver.cards else None
 
-            if amount > sender_card.balance and sender_card.balance > 0:
+            if amount > sender_card.balance_cents and sender_card.balance_cents > 0:
                 continue
 
-            sender_card_balance_old = sender_card.balance
-            sender_card.balance = sender_card.balance - amount
-            receiver_card_balance_old = receiver_card.balance if receiver_card.card_type == 'C' else 0
-            receiver_card.balance = receiver_card.balance + amount
-            receiver_card_balance_new = receiver_card.balance if receiver_card.card_type == 'C' else 0
+            sender_card_balance_old = sender_card.balance_cents
+            sender_card.balance_cents = sender_card_balance_old - amount
+            receiver_card_balance_old = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+            receiver_card.balance_cents = receiver_card.balance_cents + amount
+            receiver_card_balance_new = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
 
             transaction = {
                 'sender_id': sender_id,
                 'sender_card_bank': sender_card.bank_name,
                 'sender_card_number': sender_card.account_number,
                 'sender_card_balance_old': sender_card_balance_old,
-                'sender_card_balance_new': sender_card.balance,
+                'sender_card_balance_new': sender_card.balance_cents,
                 'receiver_id': receiver_id,
                 'receiver_card_bank': receiver_card.bank_name,
                 'receiver_card_number': receiver_card.account_number,
                 'receiver_card_balance_old': receiver_card_balance_old,
                 'receiver_card_balance_new': receiver_card_balance_new,
-                'amount': round(amount, 2),
+                'amount': amount,
                 'timestamp': timestamp,
                 'transaction_type': 'small_transfer',
                 'risk_level': risk
             }
             transactions.append(transaction)
 
-        return pd.DataFrame(transactions) if num_transactions > 1 else transactions[0]
+        if buffer is not None:
+            buffer.extend_records(transactions)
+            return buffer
+
+        return records_to_dataframe(transactions) if num_transactions > 1 else transactions[0]
 
-    def generate_medium_transfers(self, sender, receiver, risk=0, num_transactions=None):
+    def generate_medium_transfers(self, sender, receiver, risk=0, num_transactions=None, buffer=None):
         """
         生成中等金额转账模式
         适用场景：购物、装修、购买电子产品等
@@ -117,50 +323,55 @@ class TransactionGeneratorLegal:
             receiver (Person): 接收方
             num_transactions (int, optional): 交易数量, 默认随机5-15笔
             risk (str): 交易风险等级
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
         """
         if num_transactions is None:
-            num_transactions = random.randint(5, 15)
+            num_transactions = randint(self.rng, 5, 15)
 
         transactions = []
         for _ in range(num_transactions):
-            amount = round(random.uniform(2000, 20000), 2)  # 2000-20000元的中额转账
+            amount = randint(self.rng, 200000, 2000000)  # 2000-20000元的中额转账(分)
             timestamp = self._generate_timestamp()
 
             sender_id = sender.person_id
             receiver_id = receiver.person_id
-            sender_card = random.choice(sender.cards) if sender.cards else None
-            receiver_card = random.choice(receiver.cards) if receiver.cards else None
+            sender_card = pick(self.rng, sender.cards) if sender.cards else None
+            receiver_card = pick(self.rng, receiver.cards) if receiver.cards else None
 
-            if amount > sender_card.balance and sender_card.balance > 0:
+            if amount > sender_card.balance_cents and sender_card.balance_cents > 0:
                 continue
 
-            sender_card_balance_old = sender_card.balance
-            sender_card.balance = sender_card.balance - amount
-            receiver_card_balance_old = receiver_card.balance if receiver_card.card_type == 'C' else 0
-            receiver_card.balance = receiver_card.balance + amount
-            receiver_card_balance_new = receiver_card.balance if receiver_card.card_type == 'C' else 0
+            sender_card_balance_old = sender_card.balance_cents
+            sender_card.balance_cents = sender_card_balance_old - amount
+            receiver_card_balance_old = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+            receiver_card.balance_cents = receiver_card.balance_cents + amount
+            receiver_card_balance_new = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
 
             transaction = {
                 'sender_id': sender_id,
                 'sender_card_bank': sender_card.bank_name,
                 'sender_card_number': sender_card.account_number,
                 'sender_card_balance_old': sender_card_balance_old,
-                'sender_card_balance_new': sender_card.balance,
+                'sender_card_balance_new': sender_card.balance_cents,
                 'receiver_id': receiver_id,
                 'receiver_card_bank': receiver_card.bank_name,
                 'receiver_card_number': receiver_card.account_number,
                 'receiver_card_balance_old': receiver_card_balance_old,
                 'receiver_card_balance_new': receiver_card_balance_new,
-                'amount': round(amount, 2),
+                'amount': amount,
                 'timestamp': timestamp,
                 'transaction_type': 'medium_transfer',
                 'risk_level': risk
             }
             transactions.append(transaction)
 
-        return pd.DataFrame(transactions) if num_transactions > 1 else transactions[0]
+        if buffer is not None:
+            buffer.extend_records(transactions)
+            return buffer
 
-    def generate_large_transfers(self, sender, receiver, risk=0, num_transactions=None):
+        return records_to_dataframe(transactions) if num_transactions > 1 else transactions[0]
+
+    def generate_large_transfers(self, sender, receiver, risk=0, num_transactions=None, buffer=None):
         """
         生成大额转账模式
         适用场景：购房首付、购车等
@@ -170,50 +381,55 @@ class TransactionGeneratorLegal:
             receiver (Person): 接收方
             num_transactions (int, optional): 交易数量, 默认随机1-3笔
             risk (str): 交易风险等级
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
         """
         if num_transactions is None:
-            num_transactions = random.randint(1, 3)
+            num_transactions = randint(self.rng, 1, 3)
 
         transactions = []
         for _ in range(num_transactions):
-            amount = round(random.uniform(20000, 200000), 2)  # 20000-200000元的大额转账
+            amount = randint(self.rng, 2000000, 20000000)  # 20000-200000元的大额转账(分)
             timestamp = self._generate_timestamp()
 
             sender_id = sender.person_id
             receiver_id = receiver.person_id
-            sender_card = random.choice(sender.cards) if sender.cards else None
-            receiver_card = random.choice(receiver.cards) if receiver.cards else None
+            sender_card = pick(self.rng, sender.cards) if sender.cards else None
+            receiver_card = pick(self.rng, receiver.cards) if receiver.cards else None
 
-            if amount > sender_card.balance and sender_card.balance > 0:
+            if amount > sender_card.balance_cents and sender_card.balance_cents > 0:
                 continue
 
-            sender_card_balance_old = sender_card.balance
-            sender_card.balance = sender_card.balance - amount
-            receiver_card_balance_old = receiver_card.balance if receiver_card.card_type == 'C' else 0
-            receiver_card.balance = receiver_card.balance + amount
-            receiver_card_balance_new = receiver_card.balance if receiver_card.card_type == 'C' else 0
+            sender_card_balance_old = sender_card.balance_cents
+            sender_card.balance_cents = sender_card_balance_old - amount
+            receiver_card_balance_old = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+            receiver_card.balance_cents = receiver_card.balance_cents + amount
+            receiver_card_balance_new = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
 
             transaction = {
                 'sender_id': sender_id,
                 'sender_card_bank': sender_card.bank_name,
                 'sender_card_number': sender_card.account_number,
                 'sender_card_balance_old': sender_card_balance_old,
-                'sender_card_balance_new': sender_card.balance,
+                'sender_card_balance_new': sender_card.balance_cents,
                 'receiver_id': receiver_id,
                 'receiver_card_bank': receiver_card.bank_name,
                 'receiver_card_number': receiver_card.account_number,
                 'receiver_card_balance_old': receiver_card_balance_old,
                 'receiver_card_balance_new': receiver_card_balance_new,
-                'amount': round(amount, 2),
+                'amount': amount,
                 'timestamp': timestamp,
                 'transaction_type': 'large_transfer',
                 'risk_level': risk
             }
             transactions.append(transaction)
 
-        return pd.DataFrame(transactions) if num_transactions >= 1 else transactions[0]
+        if buffer is not None:
+            buffer.extend_records(transactions)
+            return buffer
+
+        return records_to_dataframe(transactions) if num_transactions >= 1 else transactions[0]
 
-    def generate_investment_transfers(self, sender, receiver, risk=0, num_transactions=None):
+    def generate_investment_transfers(self, sender, receiver, risk=0, num_transactions=None, buffer=None):
         """
         生成投资类大额转账模式
         适用场景：理财产品、股票投资、基金投资等
@@ -223,51 +439,56 @@ class TransactionGeneratorLegal:
             receiver (Person): 接收方
             num_transactions (int, optional): 交易数量, 默认随机3-8笔
             risk (str): 交易风险等级
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
         """
         if num_transactions is None:
-            num_transactions = random.randint(3, 8)
+            num_transactions = randint(self.rng, 3, 8)
 
         transactions = []
         for _ in range(num_transactions):
             # 使用对数正态分布生成投资金额，使其更符合真实投资场景
-            amount = round(np.random.lognormal(mean=11, sigma=1) , 2) # 生成较多50000-200000之间的金额
+            amount = to_cents(self.rng.lognormal(mean=11, sigma=1))  # 生成较多50000-200000元之间的金额(分)
             timestamp = self._generate_timestamp()
 
             sender_id = sender.person_id
             receiver_id = receiver.person_id
-            sender_card = random.choice(sender.cards) if sender.cards else None
-            receiver_card = random.choice(receiver.cards) if receiver.cards else None
+            sender_card = pick(self.rng, sender.cards) if sender.cards else None
+            receiver_card = pick(self.rng, receiver.cards) if receiver.cards else None
 
-            if amount > sender_card.balance and sender_card.balance > 0:
+            if amount > sender_card.balance_cents and sender_card.balance_cents > 0:
                 continue
 
-            sender_card_balance_old = sender_card.balance
-            sender_card.balance = sender_card.balance - amount
-            receiver_card_balance_old = receiver_card.balance if receiver_card.card_type == 'C' else 0
-            receiver_card.balance = receiver_card.balance + amount
-            receiver_card_balance_new = receiver_card.balance if receiver_card.card_type == 'C' else 0
+            sender_card_balance_old = sender_card.balance_cents
+            sender_card.balance_cents = sender_card_balance_old - amount
+            receiver_card_balance_old = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+            receiver_card.balance_cents = receiver_card.balance_cents + amount
+            receiver_card_balance_new = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
 
             transaction = {
                 'sender_id': sender_id,
                 'sender_card_bank': sender_card.bank_name,
                 'sender_card_number': sender_card.account_number,
                 'sender_card_balance_old': sender_card_balance_old,
-                'sender_card_balance_new': sender_card.balance,
+                'sender_card_balance_new': sender_card.balance_cents,
                 'receiver_id': receiver_id,
                 'receiver_card_bank': receiver_card.bank_name,
                 'receiver_card_number': receiver_card.account_number,
                 'receiver_card_balance_old': receiver_card_balance_old,
                 'receiver_card_balance_new': receiver_card_balance_new,
-                'amount': round(amount, 2),
+                'amount': amount,
                 'timestamp': timestamp,
                 'transaction_type': 'investment_transfer',
                 'risk_level': risk
             }
             transactions.append(transaction)
 
-        return pd.DataFrame(transactions) if num_transactions > 1 else transactions[0]
+        if buffer is not None:
+            buffer.extend_records(transactions)
+            return buffer
+
+        return records_to_dataframe(transactions) if num_transactions > 1 else transactions[0]
 
-    def generate_frequent_large_transfers(self, sender, receiver, risk=0, num_transactions=None):
+    def generate_frequent_large_transfers(self, sender, receiver, risk=0, num_transactions=None, buffer=None):
         """
         生成频繁大额转账模式
         适用场景：商业经营、企业资金往来等
@@ -278,57 +499,63 @@ class TransactionGeneratorLegal:
             receiver (Person): 接收方
             num_transactions (int, optional): 交易数量, 默认随机15-30笔
             risk (str): 交易风险等级
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
         """
         if num_transactions is None:
-            num_transactions = random.randint(15, 30)
+            num_transactions = randint(self.rng, 15, 30)
 
         transactions = []
         for _ in range(num_transactions):
-            amount = round(random.uniform(50000, 500000), 2)  # 50000-500000元的大额频繁转账
+            amount = randint(self.rng, 5000000, 50000000)  # 50000-500000元的大额频繁转账(分)
             timestamp = self._generate_timestamp()
 
             sender_id = sender.person_id
             receiver_id = receiver.person_id
-            sender_card = random.choice(sender.cards) if sender.cards else None
-            receiver_card = random.choice(receiver.cards) if receiver.cards else None
+            sender_card = pick(self.rng, sender.cards) if sender.cards else None
+            receiver_card = pick(self.rng, receiver.cards) if receiver.cards else None
 
-            if amount > sender_card.balance and sender_card.balance > 0:
+            if amount > sender_card.balance_cents and sender_card.balance_cents > 0:
                 continue
 
-            sender_card_balance_old = sender_card.balance
-            sender_card.balance = sender_card.balance - amount
-            receiver_card_balance_old = receiver_card.balance if receiver_card.card_type == 'C' else 0
-            receiver_card.balance = receiver_card.balance + amount
-            receiver_card_balance_new = receiver_card.balance if receiver_card.card_type == 'C' else 0
+            sender_card_balance_old = sender_card.balance_cents
+            sender_card.balance_cents = sender_card_balance_old - amount
+            receiver_card_balance_old = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+            receiver_card.balance_cents = receiver_card.balance_cents + amount
+            receiver_card_balance_new = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
 
             transaction = {
                 'sender_id': sender_id,
                 'sender_card_bank': sender_card.bank_name,
                 'sender_card_number': sender_card.account_number,
                 'sender_card_balance_old': sender_card_balance_old,
-                'sender_card_balance_new': sender_card.balance,
+                'sender_card_balance_new': sender_card.balance_cents,
                 'receiver_id': receiver_id,
                 'receiver_card_bank': receiver_card.bank_name,
                 'receiver_card_number': receiver_card.account_number,
                 'receiver_card_balance_old': receiver_card_balance_old,
                 'receiver_card_balance_new': receiver_card_balance_new,
-                'amount': round(amount, 2),
+                'amount': amount,
                 'timestamp': timestamp,
                 'transaction_type': 'frequent_large_transfer',
                 'risk_level': risk
             }
             transactions.append(transaction)
 
-        return pd.DataFrame(transactions) if num_transactions > 1 else transactions[0]
+        if buffer is not None:
+            buffer.extend_records(transactions)
+            return buffer
 
-    def generate_aa_payments(self, participants, total_amount, risk=0):
+        return records_to_dataframe(transactions) if num_transactions > 1 else transactions[0]
+
+    def generate_aa_payments(self, participants, total_amount, risk=0, buffer=None):
         """
         生成AA制交易模式
         适用场景：聚餐、团建、集体活动等场景的费用分摊
 
         Args:
             participants (list): 参与AA的用户列表
-            total_amount (float): 活动总费用
+            total_amount (int): 活动总费用(分), 由全部参与者(含收款人)均摊
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
 
         Returns:
             list: 包含所有AA制相关交易的列表
@@ -336,52 +563,295 @@ class TransactionGeneratorLegal:
         transactions = []
 
         timestamp = self._generate_timestamp()
+        group_id = self.next_group_id
+        self.next_group_id += 1
 
         # 每人应付金额
-        per_person_amount = total_amount
+        shares = split_amounts([total_amount], [len(participants)]).tolist()
 
         # 随机选择收款人
-        payer = random.choice(participants)
+        payer = pick(self.rng, participants)
         receiver_id = payer.person_id
-        receiver_card = random.choice(payer.cards) if payer.cards else None
+        receiver_card = pick(self.rng, payer.cards) if payer.cards else None
 
         # 生成转账记录
-        for participant in participants:
+        for participant, per_person_amount in zip(participants, shares):
             if participant != payer:  # 不包括付款方自己
                 sender_id = participant.person_id
-                sender_card = random.choice(participant.cards) if participant.cards else None
+                sender_card = pick(self.rng, participant.cards) if participant.cards else None
 
-                if per_person_amount > sender_card.balance and sender_card.balance > 0:
+                if per_person_amount > sender_card.balance_cents and sender_card.balance_cents > 0:
                     continue
 
-                sender_card_balance_old = sender_card.balance
-                sender_card.balance = sender_card.balance - per_person_amount
-                receiver_card_balance_old = receiver_card.balance if receiver_card.card_type == 'C' else 0
-                receiver_card.balance = receiver_card.balance + per_person_amount
-                receiver_card_balance_new = receiver_card.balance if receiver_card.card_type == 'C' else 0
+                sender_card_balance_old = sender_card.balance_cents
+                sender_card.balance_cents = sender_card_balance_old - per_person_amount
+                receiver_card_balance_old = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+                receiver_card.balance_cents = receiver_card.balance_cents + per_person_amount
+                receiver_card_balance_new = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
 
                 transaction = {
                     'sender_id': sender_id,
                     'sender_card_bank': sender_card.bank_name,
                     'sender_card_number': sender_card.account_number,
                     'sender_card_balance_old': sender_card_balance_old,
-                    'sender_card_balance_new': sender_card.balance,
+                    'sender_card_balance_new': sender_card.balance_cents,
                     'receiver_id': receiver_id,
                     'receiver_card_bank': receiver_card.bank_name,
                     'receiver_card_number': receiver_card.account_number,
                     'receiver_card_balance_old': receiver_card_balance_old,
                     'receiver_card_balance_new': receiver_card_balance_new,
                     'amount': per_person_amount,
-                    'timestamp': timestamp + timedelta(minutes=random.randint(1, 60)),  # 添加随机延迟
+                    'timestamp': timestamp + timedelta(minutes=randint(self.rng, 1, 60)),  # 添加随机延迟
                     'transaction_type': 'aa_payment',
                     'risk_level': risk,
-                    # 'group_id': f'aa_{timestamp.strftime("%Y%m%d_%H%M")}',  # 添加群组ID以关联同一活动的交易
-                    # 'total_amount': total_amount,
-                    # 'participants_count': len(participants)
+                    'group_id': group_id,  # 群组ID, 关联同一活动的交易
+                    'total_amount': total_amount,
+                    'participants_count': len(participants)
                 }
                 transactions.append(transaction)
 
-        return pd.DataFrame(transactions)
+        if buffer is not None:
+            buffer.extend_records(transactions)
+            return buffer
+
+        return records_to_dataframe(transactions)
+
+    def _generate_timestamps(self, num, window=None):
+        """批量生成加权随机时间戳，具体到秒，返回 int64 秒; window 为 (开始, 结束) 秒时日期限定在其中"""
+        with profiling.stage("timestamps") as stage:
+            stage.add_rows(num)
+            if window is None:
+                return self.timestamp_sampler.sample(num)
+            return self.timestamp_sampler.sample(num, *window)
+
+    def _sample_amounts(self, amount, count):
+        """按 ("uniform" | "lognormal", a, b) 抽取 count 个金额(元, float64)"""
+        distribution, a, b = amount
+        if distribution == "uniform":
+            return self.rng.uniform(a, b, count)
+        return self.rng.lognormal(a, b, count)
+
+    def _draw_amounts(self, patterns):
+        """按模式批量抽取交易金额，返回以分为单位的 int64 数组"""
+        amounts = np.empty(len(patterns), dtype=np.float64)
+        for code, name in enumerate(PATTERN_NAMES):
+            mask = patterns == code
+            count = np.count_nonzero(mask)
+            if count == 0:
+                continue
+            amounts[mask] = self._sample_amounts(TRANSFER_PATTERNS[name]["amount"], count)
+        return to_cents(amounts)
+
+    def expand_transfers(self, cards, senders, receivers, patterns, window=None):
+        """
+        把一批 (发送方, 接收方, 模式) 三元组一次性展开成逐笔交易数组
+        交易笔数、金额、时间戳和双方银行卡都以向量方式抽取
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            senders (np.ndarray): 发送方人员下标
+            receivers (np.ndarray): 接收方人员下标
+            patterns (np.ndarray): 模式编码(PATTERN_NAMES 中的下标)
+            window (tuple, optional): (开始, 结束) 秒, 交易日期限定在其中, 默认为整个时间范围
+
+        Returns:
+            dict: 逐笔交易数组, owner 为每笔交易所属三元组的下标
+        """
+        senders = np.asarray(senders, dtype=np.int64)
+        receivers = np.asarray(receivers, dtype=np.int64)
+        patterns = np.asarray(patterns, dtype=np.int64)
+
+        bounds = np.array([TRANSFER_PATTERNS[name]["num_transactions"] for name in PATTERN_NAMES], dtype=np.int64)
+        counts = self.rng.integers(bounds[patterns, 0], bounds[patterns, 1] + 1)
+        owner = np.repeat(np.arange(len(patterns)), counts)
+        row_patterns = patterns[owner]
+
+        return {
+            "owner": owner,
+            "sender_card": cards.pick(senders[owner], self.rng),
+            "receiver_card": cards.pick(receivers[owner], self.rng),
+            "amount": self._draw_amounts(row_patterns),
+            "timestamp": self._generate_timestamps(len(owner), window),
+            "transaction_type": row_patterns,
+        }
+
+    def expand_aa_payments(self, cards, members, offsets, total_amounts, window=None):
+        """
+        把多组AA制活动展开成逐笔交易数组，规则与 generate_aa_payments 相同:
+        每组随机选一名收款人，费用由全组均摊，其余参与者各向其转账自己的份额，时间在活动时间后1-60分钟内
+
+        各组成员以不规则数组(成员下标 + 偏移量)给出，收款人、份额和群组信息都按组整列计算，不逐组循环
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            members (np.ndarray): 按组依次排列的参与者人员下标
+            offsets (np.ndarray): 第 g 组成员为 members[offsets[g]:offsets[g + 1]], 每组至少一人
+            total_amounts (np.ndarray): 每组的活动费用(分)
+            window (tuple, optional): (开始, 结束) 秒, 活动日期限定在其中, 默认为整个时间范围
+
+        Returns:
+            dict: 逐笔交易数组, owner 为每笔交易所属活动的下标, 带 group_id / total_amount / participants_count 列
+        """
+        members = np.asarray(members, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        total_amounts = np.asarray(total_amounts, dtype=np.int64)
+        sizes = np.diff(offsets)
+        num_groups = len(sizes)
+
+        group_timestamps = self._generate_timestamps(num_groups, window)
+        payers = offsets[:-1] + self.rng.integers(0, sizes)
+        group_ids = self.next_group_id + np.arange(num_groups, dtype=np.int64)
+        self.next_group_id += num_groups
+
+        # 除收款人外每名成员一笔, 金额为本人的份额
+        paying = np.ones(len(members), dtype=bool)
+        paying[payers] = False
+        owner = np.repeat(np.arange(num_groups), sizes)[paying]
+        receiver_cards = cards.pick(members[payers], self.rng)
+        delays = self.rng.integers(1, 61, len(owner)) * 60
+
+        return {
+            "owner": owner,
+            "sender_card": cards.pick(members[paying], self.rng),
+            "receiver_card": receiver_cards[owner],
+            "amount": split_amounts(total_amounts, sizes)[paying],
+            "timestamp": group_timestamps[owner] + delays,
+            "transaction_type": np.full(len(owner), AA_PAYMENT_TYPE, dtype=np.int64),
+            "group_id": group_ids[owner],
+            "total_amount": total_amounts[owner],
+            "participants_count": sizes[owner],
+        }
+
+    def expand_salaries(self, payer_cards, payee_cards, salaries, days):
+        """
+        展开一批工资发放: 每名员工一笔, 在发薪日 9:00-18:00 之间由公司对公账户转入工资卡
+
+        Args:
+            payer_cards (np.ndarray): 每名员工所在公司的对公账户(账本卡下标)
+            payee_cards (np.ndarray): 每名员工的工资卡(账本卡下标)
+            salaries (np.ndarray): 工资(分)
+            days (np.ndarray): 发薪日(距 1970-01-01 的天数)
+
+        Returns:
+            dict: 逐笔交易数组
+        """
+        days = np.asarray(days, dtype=np.int64)
+        return {
+            "sender_card": np.asarray(payer_cards, dtype=np.int64),
+            "receiver_card": np.asarray(payee_cards, dtype=np.int64),
+            "amount": np.asarray(salaries, dtype=np.int64),
+            "timestamp": days * SECONDS_PER_DAY + self.rng.integers(9 * 3600, 18 * 3600, len(days)),
+            "transaction_type": np.full(len(days), SALARY_TYPE, dtype=np.int64),
+        }
+
+    def expand_company_payments(self, sender_cards, receiver_cards, flow, window=None):
+        """
+        把一批 (付款卡, 收款卡) 对展开成逐笔的供应商付款或消费付款, 笔数、金额和时间戳整列抽取
+
+        Args:
+            sender_cards (np.ndarray): 每对的付款卡(账本卡下标)
+            receiver_cards (np.ndarray): 每对的收款卡(账本卡下标)
+            flow (str): COMPANY_PAYMENTS 中的名称
+            window (tuple, optional): (开始, 结束) 秒, 交易日期限定在其中, 默认为整个时间范围
+
+        Returns:
+            dict: 逐笔交易数组
+        """
+        spec = COMPANY_PAYMENTS[flow]
+        low, high = spec["num_transactions"]
+        counts = self.rng.integers(low, high + 1, len(sender_cards))
+        owner = np.repeat(np.arange(len(sender_cards)), counts)
+        return {
+            "sender_card": np.asarray(sender_cards, dtype=np.int64)[owner],
+            "receiver_card": np.asarray(receiver_cards, dtype=np.int64)[owner],
+            "amount": to_cents(self._sample_amounts(spec["amount"], len(owner))),
+            "timestamp": self._generate_timestamps(len(owner), window),
+            "transaction_type": np.full(len(owner), TRANSACTION_TYPES.index(spec["transaction_type"]),
+                                        dtype=np.int64),
+        }
+
+    def settle_rows(self, cards, rows, risk=0, buffer=None, journal=None):
+        """
+        按数组顺序结算逐笔交易并输出交易表，余额直接更新到账本
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            rows (dict): expand_transfers / expand_aa_payments 的输出, 可带逐笔的 risk_level 列、
+                标注列 typology(TYPOLOGIES 中的下标) / case_id 和AA制群组列 group_id / total_amount /
+                participants_count, 没有时取 ROW_DEFAULTS 中的值
+            risk (int): 交易风险等级, rows 中没有 risk_level 列时使用
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
+            journal (CrossShardRouter, optional): 跨分片结算时按输出顺序记录成功交易的卡下标、金额和时间戳
+        """
+        with profiling.stage("settle") as stage:
+            stage.add_rows(len(rows["amount"]))
+            accepted, sender_old, receiver_old = settle_transfers(
+                cards.balances, rows["sender_card"], rows["receiver_card"], rows["amount"])
+        profiling.record_rows(TRANSACTION_TYPES, rows["transaction_type"], accepted)
+
+        sender_card = rows["sender_card"][accepted]
+        receiver_card = rows["receiver_card"][accepted]
+        amount = rows["amount"][accepted]
+        sender_old = sender_old[accepted]
+        receiver_old = receiver_old[accepted]
+        ledger = cards.ledger
+        # 收款卡非 'C' 类时不展示余额
+        is_current = ledger.is_current(receiver_card)
+        if journal is not None:
+            journal.record(sender_card, receiver_card, amount, rows["timestamp"][accepted])
+
+        # 按卡下标查出证件号、开户行、卡号等展示列
+        with profiling.stage("columns") as stage:
+            stage.add_rows(len(amount))
+            columns = {
+                'sender_id': ledger.owner_id_array(sender_card),
+                'sender_card_bank': ledger.bank_name_array(sender_card),
+                'sender_card_number': ledger.number_array(sender_card),
+                'sender_card_balance_old': sender_old,
+                'sender_card_balance_new': sender_old - amount,
+                'receiver_id': ledger.owner_id_array(receiver_card),
+                'receiver_card_bank': ledger.bank_name_array(receiver_card),
+                'receiver_card_number': ledger.number_array(receiver_card),
+                'receiver_card_balance_old': np.where(is_current, receiver_old, 0),
+                'receiver_card_balance_new': np.where(is_current, receiver_old + amount, 0),
+                'amount': amount,
+                'timestamp': rows["timestamp"][accepted],
+                'transaction_type': np.array(TRANSACTION_TYPES, dtype=object)[rows["transaction_type"][accepted]],
+                'risk_level': (rows["risk_level"][accepted] if "risk_level" in rows
+                               else np.full(len(amount), risk, dtype=np.int64)),
+                'typology': (np.array(TYPOLOGIES, dtype=object)[rows["typology"][accepted]] if "typology" in rows
+                             else np.full(len(amount), TYPOLOGIES[0], dtype=object)),
+                'case_id': (rows["case_id"][accepted] if "case_id" in rows
+                            else np.full(len(amount), -1, dtype=np.int64)),
+            }
+            for key in ("group_id", "total_amount", "participants_count"):
+                columns[key] = (rows[key][accepted] if key in rows
+                                else np.full(len(amount), ROW_DEFAULTS[key], dtype=np.int64))
+
+        if buffer is not None:
+            with profiling.stage("buffer") as stage:
+                stage.add_rows(len(amount))
+                buffer.extend(columns)
+            return buffer
+
+        return columns_to_dataframe(columns)
+
+    def generate_transfers_batch(self, people, senders, receivers, patterns, risk=0, buffer=None):
+        """
+        批量生成转账: 一次性为整批 (发送方, 接收方, 模式) 三元组抽取金额、时间戳和银行卡，
+        再按三元组顺序结算余额，结果与逐笔调用 generate_*_transfers 的规则一致
+
+        Args:
+            people (list): 交易人员(Person)列表
+            senders (np.ndarray): 发送方在 people 中的下标
+            receivers (np.ndarray): 接收方在 people 中的下标
+            patterns (np.ndarray): 模式编码(PATTERN_NAMES 中的下标)
+            risk (int): 交易风险等级
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
+        """
+        cards = CardTable(people)
+        rows = self.expand_transfers(cards, senders, receivers, patterns)
+        return self.settle_rows(cards, rows, risk=risk, buffer=buffer)
 
 if __name__ == "__main__":
     pass
@@ -1,16 +1,73 @@
-import random
 from datetime import datetime, timedelta
 
+import numpy as np
+
+from generate_transaction_model import (RULE_TYPOLOGIES, TRANSACTION_TYPES, TYPOLOGIES, CardTable,
+                                        TransactionGeneratorLegal)
+from money import to_cents
+from scheduler import distinct_members
+from seeding import make_rng
+from timestamp_sampler import SECONDS_PER_DAY, TimestampSampler
+
+"""
+    十条异常规则
+    generate_* 按规则判定单个账户的统计量是否异常；synthesize_* 反过来把每条规则当作交易合成模式，
+    按相同的阈值为整批案例一次性生成满足规则的逐笔转账(带 typology / case_id 标注)，
+    输出与正常交易相同的交易数组，由调用方与正常交易一起按时间结算
+"""
+
+# 主体为对公账户的规则(模式2、3、8、10), 有公司时从公司中抽取主体
+CORPORATE_TYPOLOGIES = ("short_term_private_transactions", "incoming_and_outgoing_transactions",
+                        "keyword_related_outflows", "outflow_dominant_transactions")
+
+
+def _ragged(counts):
+    """每个案例的笔数 -> (每笔所属的案例, 在案例内的序号)"""
+    counts = np.asarray(counts, dtype=np.int64)
+    case = np.repeat(np.arange(len(counts)), counts)
+    return case, np.arange(len(case)) - (np.cumsum(counts) - counts)[case]
+
+
+def _split(rng, totals, case, low=0.5, high=1.5):
+    """
+    把每个案例的总金额(分)随机拆到案例内的各笔，每笔约为均值的 low-high 倍，合计恰好等于总额
+    (取整差额计入案例的最后一笔)；case 须按案例非降序排列，每个案例至少一笔
+    """
+    num_cases = len(totals)
+    weights = rng.uniform(low, high, len(case))
+    amounts = (totals[case] * weights / np.bincount(case, weights, minlength=num_cases)[case]).astype(np.int64)
+    last = np.cumsum(np.bincount(case, minlength=num_cases)) - 1
+    amounts[last] += totals - np.bincount(case, amounts, minlength=num_cases).astype(np.int64)
+    return amounts
+
+
+def _case_max(values, counts):
+    """按案例取最大值; values 按案例连续排列, 每个案例至少一个"""
+    return np.maximum.reduceat(values, np.cumsum(counts) - counts)
+
 
 class TransactionGenerator:
-    def __init__(self, start_date, end_date):
+    def __init__(self, start_date, end_date, rng=None):
+        """
+        Args:
+            start_date (datetime): 交易开始日期
+            end_date (datetime): 交易结束日期
+            rng (np.random.Generator | int, optional): 随机数生成器或种子
+        """
         self.start_date = start_date
         self.end_date = end_date
+        self.rng = make_rng(rng)
+        self.timestamp_sampler = TimestampSampler(start_date, end_date, rng=self.rng)
+        # 已合成的案例要从各张卡付出的合计(卡下标 -> 分), 同一张卡在多个案例中付款时一并补足
+        self._committed = {}
+
+    # 结算和输出规则与正常交易相同
+    settle_rows = TransactionGeneratorLegal.settle_rows
 
     def _generate_timestamp(self):
         """生成随机时间戳"""
         time_between_dates = self.end_date - self.start_date
-        return self.start_date + timedelta(days=random.randrange(time_between_dates.days))
+        return self.start_date + timedelta(days=int(self.rng.integers(time_between_dates.days)))
 
     def generate_daily_open_account_and_outflow(self, num_accounts, total_outflow, account_threshold=10,
                                                 outflow_threshold=100000):
@@ -180,3 +237,505 @@ class TransactionGenerator:
             'is_abnormal': is_abnormal,
             'risk_level': 'high' if is_abnormal else 'low'
         }
+
+    # ---- 规则对应的交易合成 ----
+    # 各规则的主体原为对公账户或带关键字的客户; 有公司时对公规则(CORPORATE_TYPOLOGIES)的主体从公司中抽取,
+    # 公司在银行卡数组表中排在人员之后, 对手仍为前 num_people 名个人; 没有公司时由被抽中的人员充当主体。
+    # 只有规则本身要求新卡、零余额卡或只看本账户笔数之比的模式1、5、6、8、9、10为主体新开卡, 其余用主体已有的卡。
+    # 付款方(转入的对手和模式2 的主体)用已有的卡, 余额不够案例中要付的合计时在生成时补足(见 _top_up),
+    # 不为每笔交易开一次性的卡; 之后正常交易花掉这笔钱时, 余额不足的交易在结算时照常跳过
+
+    def _times_of_day(self, num):
+        """按小时权重抽取一天内的秒数"""
+        return self.timestamp_sampler.sample_hours(num) * 3600 + self.rng.integers(0, 3600, num)
+
+    def _others(self, subjects, num_people):
+        """为每笔抽一名不是主体本人的对手(前 num_people 名人员中的下标); 主体为公司时从全部人员中抽取"""
+        if len(subjects) and subjects.min() >= num_people:
+            return self.rng.integers(num_people, size=len(subjects))
+        others = self.rng.integers(num_people - 1, size=len(subjects))
+        return others + (others >= subjects)
+
+    def _distinct_others(self, subjects, counts, num_people):
+        """为每个案例不放回地抽取 counts 名互不相同、且不是主体本人的对手; 主体为公司时从全部人员中抽取"""
+        if len(subjects) and subjects.min() >= num_people:
+            members, _ = distinct_members(num_people, counts, self.rng)
+            return members
+        members, _ = distinct_members(num_people - 1, counts, self.rng)
+        return members + (members >= np.repeat(subjects, counts))
+
+    def _open_cards(self, cards, persons, balances):
+        """
+        为人员(列表中的位置)开新卡，开户行在账本已有的银行中随机选取
+
+        Returns:
+            np.ndarray: 新卡在账本中的下标
+        """
+        ledger = cards.ledger
+        banks = np.asarray(ledger.bank_names, dtype=object)[self.rng.integers(len(ledger.bank_names),
+                                                                              size=len(persons))]
+        return ledger.add_cards(cards.owner_index[persons], banks, balances)
+
+    def _top_up(self, cards, card, amount):
+        """
+        给要付款的已有卡补足余额: 卡上余额扣除之前案例已要付出的部分后, 少于本次要付出的合计时
+        补到合计的 1.2-3 倍, 余额够的卡不动; 付款后卡上仍有余额, 不会出现付完即空的卡
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            card (np.ndarray): 每笔付款的卡(账本下标)
+            amount (np.ndarray): 每笔付款的金额(分)
+        """
+        unique, inverse = np.unique(card, return_inverse=True)
+        needed = np.bincount(inverse, amount, minlength=len(unique)).astype(np.int64)
+        committed = np.array([self._committed.get(card, 0) for card in unique.tolist()], dtype=np.int64)
+        balances = cards.balances
+        short = np.flatnonzero(balances[unique] - committed < needed)
+        balances[unique[short]] = committed[short] + np.rint(
+            needed[short] * self.rng.uniform(1.2, 3.0, len(short))).astype(np.int64)
+        for card, total in zip(unique.tolist(), (committed + needed).tolist()):
+            self._committed[card] = total
+
+    def _assemble(self, cards, typology, num_cases, legs, risk, first_case):
+        """
+        把案例内的交易腿换成交易数组: 对手按人员选卡，各案例的起始日在日期范围内随机分布，
+        超出日期范围的交易丢弃
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            typology (str): RULE_TYPOLOGIES 中的名称
+            num_cases (int): 案例数
+            legs (list): 每项为 (case, outgoing, subject_card, counterparty, amount, offset) 六个等长数组:
+                所属案例、是否由主体转出、主体的卡、对手(人员下标)、金额(分)、距案例第一天零点的秒数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+
+        Returns:
+            dict: 逐笔交易数组, 带 risk_level / typology / case_id 列
+        """
+        case, outgoing, subject_card, counterparty, amount, offset = (np.concatenate(column) for column in zip(*legs))
+        outgoing = outgoing.astype(bool)
+
+        spans = np.zeros(num_cases, dtype=np.int64)
+        np.maximum.at(spans, case, offset // SECONDS_PER_DAY)
+        timestamps = self.timestamp_sampler.sample_start_days(spans)[case] * SECONDS_PER_DAY + offset
+        first = self.timestamp_sampler.start // SECONDS_PER_DAY * SECONDS_PER_DAY
+        last = self.timestamp_sampler.end // SECONDS_PER_DAY * SECONDS_PER_DAY + SECONDS_PER_DAY
+        valid = (timestamps >= first) & (timestamps < last)
+
+        # 对手用其已有的卡, 转入主体的对手按需补足余额
+        counterparty_card = cards.pick(counterparty, self.rng)
+        incoming = ~outgoing & valid
+        self._top_up(cards, counterparty_card[incoming], amount[incoming])
+        rows = {
+            "sender_card": np.where(outgoing, subject_card, counterparty_card),
+            "receiver_card": np.where(outgoing, counterparty_card, subject_card),
+            "amount": amount,
+            "timestamp": timestamps,
+            # 每条规则的 _in / _out 两种交易类型在编码表中相邻
+            "transaction_type": TRANSACTION_TYPES.index(f"{typology}_in") + outgoing.astype(np.int64),
+            "risk_level": np.full(len(case), risk, dtype=np.int64),
+            "typology": np.full(len(case), TYPOLOGIES.index(typology), dtype=np.int64),
+            "case_id": first_case + case,
+        }
+        return {key: values[valid] for key, values in rows.items()}
+
+    def synthesize_daily_open_account_and_outflow(self, cards, subjects, account_threshold=10,
+                                                  outflow_threshold=100000, risk=2, first_case=0):
+        """
+        模式1 的合成: 主体当天新开 X+1 到 2X 张卡，开户资金在当天全部汇出给其他人，汇出合计为阈值的 1.1-3 倍
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            account_threshold (int): 开户数阈值
+            outflow_threshold (int): 当天汇出金额阈值(元)
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+        """
+        rng = self.rng
+        num_cases = len(subjects)
+        counts = rng.integers(account_threshold + 1, 2 * account_threshold + 1, num_cases)
+        case, _ = _ragged(counts)
+        totals = np.rint(to_cents(outflow_threshold) * rng.uniform(1.1, 3.0, num_cases)).astype(np.int64)
+        amounts = _split(rng, totals, case)
+        new_cards = self._open_cards(cards, subjects[case], amounts)
+        legs = [(case, np.ones(len(case)), new_cards, self._others(subjects[case], len(cards.owner_index)),
+                 amounts, self._times_of_day(len(case)))]
+        return self._assemble(cards, "daily_open_account_and_outflow", num_cases, legs, risk, first_case)
+
+    def synthesize_short_term_private_transactions(self, cards, subjects, num_days=10, account_threshold=10, risk=2,
+                                                   first_case=0, num_people=None):
+        """
+        模式2 的合成: 主体在 num_days 天内用已有的一张卡向 X+1 到 2X 名互不相同的个人转账(每笔 1000-20000 元)，
+        卡上余额不够时补足
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            num_days (int): 统计天数
+            account_threshold (int): 对私账户数阈值
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+            num_people (int, optional): 表中个人的人数, 主体为公司时给出, 默认为表中全部主体
+        """
+        rng = self.rng
+        num_cases = len(subjects)
+        num_people = num_people or len(cards.owner_index)
+        counts = np.minimum(rng.integers(account_threshold + 1, 2 * account_threshold + 1, num_cases),
+                            num_people - 1)
+        case, _ = _ragged(counts)
+        amounts = to_cents(rng.uniform(1000, 20000, len(case)))
+        subject_cards = cards.pick(subjects, rng)
+        self._top_up(cards, subject_cards[case], amounts)
+        offsets = rng.integers(0, num_days, len(case)) * SECONDS_PER_DAY + self._times_of_day(len(case))
+        legs = [(case, np.ones(len(case)), subject_cards[case], self._distinct_others(subjects, counts, num_people),
+                 amounts, offsets)]
+        return self._assemble(cards, "short_term_private_transactions", num_cases, legs, risk, first_case)
+
+    def synthesize_incoming_and_outgoing_transactions(self, cards, subjects, transaction_threshold=20,
+                                                      days_threshold=2, num_days=10, risk=2, first_case=0,
+                                                      num_people=None):
+        """
+        模式3 的合成: 主体在 num_days 天内收到 X 到 2X 笔转入(每笔 5000-50000 元)，
+        最晚一笔转入后 Y 天内分 1-3 笔转出转入总额的 90%-100%; 主体为公司时转入方为其他公司
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            transaction_threshold (int): 转入笔数阈值
+            days_threshold (int): 转出日期与最晚转入日期相差的天数阈值
+            num_days (int): 转入持续的天数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+            num_people (int, optional): 表中个人的人数, 主体为公司时给出, 默认为表中全部主体
+        """
+        rng = self.rng
+        num_cases = len(subjects)
+        num_people = num_people or len(cards.owner_index)
+        in_counts = rng.integers(transaction_threshold, 2 * transaction_threshold + 1, num_cases)
+        in_case, _ = _ragged(in_counts)
+        in_amounts = to_cents(rng.uniform(5000, 50000, len(in_case)))
+        in_offsets = rng.integers(0, num_days, len(in_case)) * SECONDS_PER_DAY + self._times_of_day(len(in_case))
+
+        out_counts = rng.integers(1, 4, num_cases)
+        out_case, _ = _ragged(out_counts)
+        out_totals = np.rint(np.bincount(in_case, in_amounts, minlength=num_cases) *
+                             rng.uniform(0.9, 1.0, num_cases)).astype(np.int64)
+        out_amounts = _split(rng, out_totals, out_case)
+        # 转出时间不早于最晚转入 1 分钟, 相差不足 Y 天(日期差不超过 Y)
+        out_offsets = (_case_max(in_offsets, in_counts)[out_case] +
+                       rng.integers(60, max(days_threshold * SECONDS_PER_DAY, 61), len(out_case)))
+
+        subject_cards = cards.pick(subjects, rng)
+        num_companies = len(cards.owner_index) - num_people
+        if num_companies > 1:
+            # 转入方为主体以外的公司
+            payers = self._others(subjects[in_case] - num_people, num_companies) + num_people
+        else:
+            payers = self._others(subjects[in_case], num_people)
+        legs = [(in_case, np.zeros(len(in_case)), subject_cards[in_case], payers, in_amounts, in_offsets),
+                (out_case, np.ones(len(out_case)), subject_cards[out_case],
+                 self._others(subjects[out_case], num_people), out_amounts, out_offsets)]
+        return self._assemble(cards, "incoming_and_outgoing_transactions", num_cases, legs, risk, first_case)
+
+    def synthesize_location_mismatch(self, cards, subjects, num_days=30, risk=2, first_case=0):
+        """
+        模式4 的合成: 主体在 num_days 天内与 3-8 名开户地(人员的省份)与本人不同的对手往来，
+        每笔 1000-20000 元、方向随机，使用主体已有的卡
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            num_days (int): 案例持续的天数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+        """
+        rng = self.rng
+        num_cases, num_people = len(subjects), len(cards.owner_index)
+        _, provinces = np.unique(np.array([person.address for person in cards.people], dtype=object),
+                                 return_inverse=True)
+        if provinces.max(initial=0) == 0:
+            raise ValueError("所有人员的开户地相同, 无法合成开户地不一致的交易")
+
+        counts = rng.integers(3, 9, num_cases)
+        case, _ = _ragged(counts)
+        owners = subjects[case]
+        counterparties = self._others(owners, num_people)
+        redraw = np.flatnonzero(provinces[counterparties] == provinces[owners])
+        while len(redraw):
+            counterparties[redraw] = self._others(owners[redraw], num_people)
+            redraw = redraw[provinces[counterparties[redraw]] == provinces[owners[redraw]]]
+
+        subject_cards = cards.pick(subjects, rng)
+        offsets = rng.integers(0, num_days, len(case)) * SECONDS_PER_DAY + self._times_of_day(len(case))
+        legs = [(case, rng.random(len(case)) < 0.5, subject_cards[case], counterparties,
+                 to_cents(rng.uniform(1000, 20000, len(case))), offsets)]
+        return self._assemble(cards, "location_mismatch", num_cases, legs, risk, first_case)
+
+    def synthesize_new_account_activity(self, cards, subjects, transaction_threshold=30, amount_threshold=500000,
+                                        half_days=15, risk=2, first_case=0):
+        """
+        模式5 的合成: 主体新开一张卡，开卡后前 half_days 天只有 1-5 笔小额转入(100-2000 元)，
+        后 half_days 天转入 X 到 2X 笔、合计为金额阈值的 1.05-2 倍
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            transaction_threshold (int): 后半段交易笔数阈值
+            amount_threshold (int): 后半段交易金额阈值(元)
+            half_days (int): 前后两段各自的天数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+        """
+        rng = self.rng
+        num_cases, num_people = len(subjects), len(cards.owner_index)
+        subject_cards = self._open_cards(cards, subjects, np.zeros(num_cases, dtype=np.int64))
+
+        half = half_days * SECONDS_PER_DAY
+        first_counts = rng.integers(1, 6, num_cases)
+        first_case_index, position = _ragged(first_counts)
+        # 开卡当天即有第一笔转入; 检测从第一笔交易的时刻起算前后两段, 其余各笔都按第一笔的时刻偏移,
+        # 前半段落在 [第一笔, 第一笔 + half_days 天), 后半段落在 [第一笔 + half_days 天, 第一笔 + 2 * half_days 天)
+        opening = self._times_of_day(num_cases)
+        first_offsets = opening[first_case_index] + np.where(position > 0,
+                                                             rng.integers(0, half, len(first_case_index)), 0)
+
+        second_counts = rng.integers(transaction_threshold, 2 * transaction_threshold + 1, num_cases)
+        second_case, _ = _ragged(second_counts)
+        totals = np.rint(to_cents(amount_threshold) * rng.uniform(1.05, 2.0, num_cases)).astype(np.int64)
+        second_offsets = opening[second_case] + half + rng.integers(0, half, len(second_case))
+
+        legs = [(first_case_index, np.zeros(len(first_case_index)), subject_cards[first_case_index],
+                 self._others(subjects[first_case_index], num_people),
+                 to_cents(rng.uniform(100, 2000, len(first_case_index))), first_offsets),
+                (second_case, np.zeros(len(second_case)), subject_cards[second_case],
+                 self._others(subjects[second_case], num_people), _split(rng, totals, second_case), second_offsets)]
+        return self._assemble(cards, "new_account_activity", num_cases, legs, risk, first_case)
+
+    def synthesize_online_bank_low_balance(self, cards, subjects, inflow_threshold=200000, balance_threshold=100,
+                                           num_days=7, risk=2, first_case=0):
+        """
+        模式6 的合成: 主体新开一张零余额的卡，num_days 天内收到 5-15 笔转入、合计为流入阈值的 1.05-2 倍，
+        每笔到账后 1-30 分钟内转给其他人，每个案例留在卡上的合计不超过余额阈值，流入流出之比接近 1
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            inflow_threshold (int): 流入金额阈值(元)
+            balance_threshold (int): 余额阈值(元)
+            num_days (int): 案例持续的天数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+        """
+        rng = self.rng
+        num_cases, num_people = len(subjects), len(cards.owner_index)
+        subject_cards = self._open_cards(cards, subjects, np.zeros(num_cases, dtype=np.int64))
+
+        counts = rng.integers(5, 16, num_cases)
+        case, _ = _ragged(counts)
+        totals = np.rint(to_cents(inflow_threshold) * rng.uniform(1.05, 2.0, num_cases)).astype(np.int64)
+        in_amounts = _split(rng, totals, case)
+        in_offsets = rng.integers(0, num_days, len(case)) * SECONDS_PER_DAY + self._times_of_day(len(case))
+        kept = (rng.random(len(case)) * to_cents(balance_threshold) / counts[case]).astype(np.int64)
+
+        legs = [(case, np.zeros(len(case)), subject_cards[case], self._others(subjects[case], num_people),
+                 in_amounts, in_offsets),
+                (case, np.ones(len(case)), subject_cards[case], self._others(subjects[case], num_people),
+                 in_amounts - kept, in_offsets + rng.integers(60, 1801, len(case)))]
+        return self._assemble(cards, "online_bank_low_balance", num_cases, legs, risk, first_case)
+
+    def synthesize_frequent_small_inflows(self, cards, subjects, interval_spread=3, backtracking_period=60,
+                                          base_amount=10000, risk=2, first_case=0):
+        """
+        模式7 的合成: 同一名对手在回溯期内向主体已有的卡转入 4-7 次相同金额(万元的 1-3 倍)，
+        相邻两次的间隔天数相差不超过 interval_spread 天
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            interval_spread (int): 最大间隔与最小间隔之差的阈值(天)
+            backtracking_period (int): 回溯天数, 整个案例落在其中
+            base_amount (int): 入账金额的基数(元)
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+        """
+        rng = self.rng
+        num_cases, num_people = len(subjects), len(cards.owner_index)
+        max_inflows = 7
+        counts = rng.integers(4, max_inflows + 1, num_cases)
+        case, position = _ragged(counts)
+
+        # 各案例的最短间隔, 保证 max_inflows 次入账也不超出回溯期
+        high = max(1, backtracking_period // (max_inflows - 1) - interval_spread)
+        lows = rng.integers(1, high + 1, num_cases)
+        intervals = np.where(position > 0, lows[case] + rng.integers(0, interval_spread + 1, len(case)), 0)
+        # 案例内的累计天数: 每个案例第一笔的间隔为 0, 减去该笔处的全局累加和即可
+        elapsed = np.cumsum(intervals)
+        days = elapsed - elapsed[np.cumsum(counts) - counts][case]
+
+        amounts = to_cents(base_amount) * rng.integers(1, 4, num_cases)
+        legs = [(case, np.zeros(len(case)), cards.pick(subjects, rng)[case],
+                 self._others(subjects, num_people)[case], amounts[case],
+                 days * SECONDS_PER_DAY + self._times_of_day(len(case)))]
+        return self._assemble(cards, "frequent_small_inflows", num_cases, legs, risk, first_case)
+
+    def _fan(self, cards, subjects, many_inflows, inflow_threshold, inflow_outflow_ratio, count_ratio, private_count,
+             num_days, num_people=None):
+        """
+        模式8 / 10 共用的扇入、扇出结构: 一侧 1-3 笔，另一侧笔数至少为其 count_ratio 倍且对手为
+        至少 private_count 名互不相同的个人；转入在 num_days 天内，转出在最晚转入之后 1 小时到 3 天，
+        转入合计为流入阈值的 1.05-2 倍，转入与转出之比在 inflow_outflow_ratio 内(且不小于 1)
+
+        Returns:
+            list: 交易腿, 见 _assemble
+        """
+        rng = self.rng
+        num_cases = len(subjects)
+        num_people = num_people or len(cards.owner_index)
+        few = rng.integers(1, 4, num_cases)
+        many = np.minimum(np.maximum(count_ratio * few, private_count) + rng.integers(0, 6, num_cases),
+                          num_people - 1)
+        in_counts, out_counts = (many, few) if many_inflows else (few, many)
+
+        in_case, _ = _ragged(in_counts)
+        out_case, _ = _ragged(out_counts)
+        in_totals = np.rint(to_cents(inflow_threshold) * rng.uniform(1.05, 2.0, num_cases)).astype(np.int64)
+        ratios = rng.uniform(max(1.0, inflow_outflow_ratio[0]), inflow_outflow_ratio[1], num_cases)
+        out_totals = np.floor(in_totals / ratios).astype(np.int64)
+        subject_cards = self._open_cards(cards, subjects, np.zeros(num_cases, dtype=np.int64))
+
+        in_offsets = (rng.integers(0, num_days, len(in_case)) * SECONDS_PER_DAY +
+                      self._times_of_day(len(in_case)))
+        out_offsets = (_case_max(in_offsets, in_counts)[out_case] +
+                       rng.integers(3600, 3 * SECONDS_PER_DAY, len(out_case)))
+        if many_inflows:
+            in_counterparties = self._distinct_others(subjects, in_counts, num_people)
+            out_counterparties = self._others(subjects[out_case], num_people)
+        else:
+            in_counterparties = self._others(subjects[in_case], num_people)
+            out_counterparties = self._distinct_others(subjects, out_counts, num_people)
+
+        return [(in_case, np.zeros(len(in_case)), subject_cards[in_case], in_counterparties,
+                 _split(rng, in_totals, in_case), in_offsets),
+                (out_case, np.ones(len(out_case)), subject_cards[out_case], out_counterparties,
+                 _split(rng, out_totals, out_case), out_offsets)]
+
+    def synthesize_keyword_related_outflows(self, cards, subjects, inflow_outflow_ratio=(0.9, 1.1),
+                                            inflow_threshold=500000, count_ratio=5, private_count=10, num_days=10,
+                                            risk=2, first_case=0, num_people=None):
+        """
+        模式8 的合成(扇入): 至少 private_count 名个人频繁转入，转入笔数至少为转出的 count_ratio 倍，
+        转入合计不少于流入阈值，随后少数几笔转出，转入转出之比接近 1
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            inflow_outflow_ratio (tuple): 转入与转出金额之比的范围
+            inflow_threshold (int): 转入金额阈值(元)
+            count_ratio (int): 转入笔数与转出笔数之比的阈值
+            private_count (int): 对私账户数阈值
+            num_days (int): 转入持续的天数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+            num_people (int, optional): 表中个人的人数, 主体为公司时给出, 默认为表中全部主体
+        """
+        legs = self._fan(cards, subjects, True, inflow_threshold, inflow_outflow_ratio, count_ratio, private_count,
+                         num_days, num_people)
+        return self._assemble(cards, "keyword_related_outflows", len(subjects), legs, risk, first_case)
+
+    def synthesize_low_balance_large_inflow_outflow(self, cards, subjects, inflow_outflow_ratio=(0.9, 1.1),
+                                                    inflow_threshold=200000, balance_threshold=1000,
+                                                    transaction_threshold=10, num_days=10, risk=2, first_case=0):
+        """
+        模式9 的合成: 主体新开一张零余额的卡，num_days 天内大额转入合计为流入阈值的 1.05-2 倍，
+        随后分笔转出，只在卡上留下不超过余额阈值的金额；转入、转出各占交易笔数阈值的一半到全部
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            inflow_outflow_ratio (tuple): 转入与转出金额之比的范围
+            inflow_threshold (int): 转入金额阈值(元)
+            balance_threshold (int): 余额阈值(元)
+            transaction_threshold (int): 交易笔数阈值
+            num_days (int): 转入持续的天数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+        """
+        rng = self.rng
+        num_cases, num_people = len(subjects), len(cards.owner_index)
+        subject_cards = self._open_cards(cards, subjects, np.zeros(num_cases, dtype=np.int64))
+        half = (transaction_threshold + 1) // 2
+
+        in_counts = rng.integers(half, transaction_threshold + 1, num_cases)
+        out_counts = rng.integers(half, transaction_threshold + 1, num_cases)
+        in_case, _ = _ragged(in_counts)
+        out_case, _ = _ragged(out_counts)
+        in_totals = np.rint(to_cents(inflow_threshold) * rng.uniform(1.05, 2.0, num_cases)).astype(np.int64)
+        # 留存金额同时满足余额阈值和金额之比的上限
+        kept = np.minimum(rng.random(num_cases) * to_cents(balance_threshold),
+                          in_totals * (1 - 1 / inflow_outflow_ratio[1])).astype(np.int64)
+        out_totals = in_totals - kept
+
+        in_offsets = (rng.integers(0, num_days, len(in_case)) * SECONDS_PER_DAY +
+                      self._times_of_day(len(in_case)))
+        out_offsets = (_case_max(in_offsets, in_counts)[out_case] +
+                       rng.integers(3600, 2 * SECONDS_PER_DAY, len(out_case)))
+        legs = [(in_case, np.zeros(len(in_case)), subject_cards[in_case],
+                 self._others(subjects[in_case], num_people), _split(rng, in_totals, in_case), in_offsets),
+                (out_case, np.ones(len(out_case)), subject_cards[out_case],
+                 self._others(subjects[out_case], num_people), _split(rng, out_totals, out_case), out_offsets)]
+        return self._assemble(cards, "low_balance_large_inflow_outflow", num_cases, legs, risk, first_case)
+
+    def synthesize_outflow_dominant_transactions(self, cards, subjects, inflow_outflow_ratio=(0.9, 1.1),
+                                                 inflow_threshold=200000, count_ratio=5, private_count=10,
+                                                 num_days=10, risk=2, first_case=0, num_people=None):
+        """
+        模式10 的合成(扇出): 少数几笔转入合计不少于流入阈值，随后转给至少 private_count 名个人，
+        转出笔数至少为转入的 count_ratio 倍，转入转出之比接近 1
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            subjects (np.ndarray): 每个案例的主体(人员下标)
+            inflow_outflow_ratio (tuple): 转入与转出金额之比的范围
+            inflow_threshold (int): 转入金额阈值(元)
+            count_ratio (int): 转出笔数与转入笔数之比的阈值
+            private_count (int): 对私账户数阈值
+            num_days (int): 转入持续的天数
+            risk (int): 风险等级
+            first_case (int): 第一个案例的编号
+            num_people (int, optional): 表中个人的人数, 主体为公司时给出, 默认为表中全部主体
+        """
+        legs = self._fan(cards, subjects, False, inflow_threshold, inflow_outflow_ratio, count_ratio, private_count,
+                         num_days, num_people)
+        return self._assemble(cards, "outflow_dominant_transactions", len(subjects), legs, risk, first_case)
+
+    def synthesize(self, cards, typology, num_cases, first_case=0, risk=2, companies=None, **thresholds):
+        """
+        为一种规则抽取主体(互不重复)并合成 num_cases 个案例
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            typology (str): RULE_TYPOLOGIES 中的名称
+            num_cases (int): 案例数, 超过人数时取人数
+            first_case (int): 第一个案例的编号, 其余依次递增
+            risk (int): 风险等级
+            companies (CardTable, optional): 公司的银行卡数组表, 须与 cards 共用账本; 给出时
+                对公规则(CORPORATE_TYPOLOGIES)的主体从公司中抽取, 案例数超过公司数时取公司数
+            thresholds: 传给对应 synthesize_<typology> 的阈值参数
+
+        Returns:
+            dict: 逐笔交易数组(未排序), 带 risk_level / typology / case_id 列
+        """
+        if typology not in RULE_TYPOLOGIES:
+            raise ValueError(f"未知的异常规则: {typology}")
+        if typology in CORPORATE_TYPOLOGIES and companies is not None and len(companies.owner_index):
+            num_people, num_companies = len(cards.owner_index), len(companies.owner_index)
+            subjects = num_people + self.rng.choice(num_companies, size=min(num_cases, num_companies), replace=False)
+            cards = CardTable.concat([cards, companies])
+            return getattr(self, f"synthesize_{typology}")(cards, subjects, risk=risk, first_case=first_case,
+                                                           num_people=num_people, **thresholds)
+        subjects = self.rng.choice(len(cards.owner_index), size=min(num_cases, len(cards.owner_index)),
+                                   replace=False)
+        return getattr(self, f"synthesize_{typology}")(cards, subjects, risk=risk, first_case=first_case,
+                                                       **thresholds)
@@ -1,65 +1,116 @@
-import random
 from datetime import timedelta, datetime
 import numpy as np
-import pandas as pd
+
+from generate_transaction_model import TRANSACTION_TYPES, TYPOLOGIES, TransactionGeneratorLegal
+from money import to_cents
+from seeding import make_rng, pick, randint
+from timestamp_sampler import SECONDS_PER_DAY, TimestampSampler
+from transaction_buffer import records_to_dataframe
 
 """
     生成异常交易模式
-    
+    逐笔接口按原规则逐个案例生成；批量接口一次为整批案例抽取日期、金额和银行卡，
+    输出与正常交易相同的交易数组并带上标注(typology / case_id)，由调用方与正常交易一起结算
 """
 class TransactionGeneratorIllegal:
-    def __init__(self, start_date, end_date):
+    def __init__(self, start_date, end_date, rng=None):
         """
         初始化交易生成器
 
         Args:
             start_date (datetime): 交易开始日期
             end_date (datetime): 交易结束日期
+            rng (np.random.Generator | int, optional): 随机数生成器或种子
         """
         self.start_date = start_date
         self.end_date = end_date
-
-    def _generate_weighted_random_time(self):
-        """生成加权随机时间，精确到秒"""
-        # 定义时间段及其权重
-        time_slots = [
-            (9, 18, 5),  # 白天正常交易时间 9:00 - 18:00，权重为5
-            (0, 6, 1),   # 凌晨异常交易时间 00:00 - 6:00，权重为1
-            (6, 9, 2),   # 早上 6:00 - 9:00，权重为2
-            (18, 24, 2)  # 晚上 18:00 - 24:00，权重为2
-        ]
-
-        # 计算总权重
-        total_weight = sum(slot[2] for slot in time_slots)
-
-        # 生成一个随机数
-        rand_num = random.uniform(0, total_weight)
-
-        # 累计权重，找到对应的时段
-        cumulative_weight = 0
-        for start_hour, end_hour, weight in time_slots:
-            cumulative_weight += weight
-            if rand_num < cumulative_weight:
-                hour = random.randint(start_hour, end_hour - 1)
-                minute = random.randint(0, 59)
-                second = random.randint(0, 59)
-                return hour, minute, second
+        self.rng = make_rng(rng)
+        self.timestamp_sampler = TimestampSampler(start_date, end_date, rng=self.rng)
 
     def _generate_timestamp(self):
         """生成随机时间戳，具体到秒"""
-        time_between_dates = self.end_date - self.start_date
-        total_seconds = int(time_between_dates.total_seconds())
-        random_seconds = random.randint(0, total_seconds)
-        random_date = self.start_date + timedelta(seconds=random_seconds)
+        return self.timestamp_sampler.sample_one()
+
+    # 结算和输出规则与正常交易相同
+    settle_rows = TransactionGeneratorLegal.settle_rows
+
+    def _select_valid_card(self, person, amount):
+        """
+        从本人的卡中随机选一张能完成转账的卡: 余额不少于金额，或余额不为正(与正常交易的跳过规则一致)
 
-        # 生成加权随机时间
-        hour, minute, second = self._generate_weighted_random_time()
-        random_date = random_date.replace(hour=hour, minute=minute, second=second, microsecond=0)
-        return random_date
+        Returns:
+            BankCard | None: 没有可用的卡时返回 None
+        """
+        cards = [card for card in person.cards if not (amount > card.balance_cents > 0)]
+        return pick(self.rng, cards) if cards else None
+
+    def _execute_transfer(self, sender, receiver, sender_card, receiver_card, amount, timestamp, transaction_type,
+                          risk, case_id=-1):
+        """
+        执行一笔转账并返回交易记录，余额变化与正常交易相同(收款卡非 'C' 类时不展示余额)
+
+        Args:
+            sender (Person): 发送方
+            receiver (Person): 接收方
+            sender_card (BankCard): 付款卡
+            receiver_card (BankCard): 收款卡
+            amount (int): 金额(分)
+            timestamp (str | datetime): 交易时间
+            transaction_type (str): 交易类型
+            risk (int): 风险等级
+            case_id (int): 所属案例编号
+        """
+        sender_card_balance_old = sender_card.balance_cents
+        sender_card.balance_cents = sender_card_balance_old - amount
+        receiver_card_balance_old = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+        receiver_card.balance_cents = receiver_card.balance_cents + amount
+        receiver_card_balance_new = receiver_card.balance_cents if receiver_card.card_type == 'C' else 0
+
+        return {
+            'sender_id': sender.person_id,
+            'sender_card_bank': sender_card.bank_name,
+            'sender_card_number': sender_card.account_number,
+            'sender_card_balance_old': sender_card_balance_old,
+            'sender_card_balance_new': sender_card.balance_cents,
+            'receiver_id': receiver.person_id,
+            'receiver_card_bank': receiver_card.bank_name,
+            'receiver_card_number': receiver_card.account_number,
+            'receiver_card_balance_old': receiver_card_balance_old,
+            'receiver_card_balance_new': receiver_card_balance_new,
+            'amount': amount,
+            'timestamp': timestamp,
+            'transaction_type': transaction_type,
+            'risk_level': risk,
+            'typology': 'regular_pattern',
+            'case_id': case_id,
+        }
+
+    def draw_intervals(self, num_cycles, y_threshold, low=28, high=31, size=None):
+        """
+        批量抽取规律性交易的间隔天数(每月一次，间隔28-31天)，
+        每组内最大最小间隔差<=Y天，不满足的组整组重抽
+
+        Args:
+            num_cycles (int): 每组的交易周期数
+            y_threshold (int): 时间间隔差异阈值(天)
+            low (int): 最小间隔(天)
+            high (int): 最大间隔(天)
+            size (int, optional): 组数, 为 None 时返回一维数组
+
+        Returns:
+            np.ndarray: (size, num_cycles) 或 (num_cycles,) 的 int64 天数
+        """
+        groups = 1 if size is None else size
+        intervals = self.rng.integers(low, high + 1, (groups, num_cycles))
+        invalid = np.ptp(intervals, axis=1) > y_threshold
+        while invalid.any():
+            intervals[invalid] = self.rng.integers(low, high + 1, (np.count_nonzero(invalid), num_cycles))
+            invalid = np.ptp(intervals, axis=1) > y_threshold
+        return intervals[0] if size is None else intervals
 
     def generate_regular_pattern_transfers(self, sender, receiver, base_amount=10000,
                                            risk=2, num_cycles=6, x_threshold=3000,
-                                           y_threshold=3):
+                                           y_threshold=3, case_id=0, buffer=None):
         """
         生成具有明显规律性的异常转账模式
         特征：
@@ -77,81 +128,178 @@ class TransactionGeneratorIllegal:
             num_cycles: 交易周期数(半年约6次)
             x_threshold: 入账金额阈值(元)
             y_threshold: 时间间隔差异阈值(天)
+            case_id: 案例编号, 写入标注列
+            buffer (TransactionBuffer, optional): 列式缓冲区, 传入时交易直接追加到其中并返回该缓冲区
         """
+        # 金额在内部以分计算
+        x_threshold_cents = to_cents(x_threshold)
+
         # 确保入账金额<=X元
-        transfer_amount = min(base_amount * 0.3, x_threshold)  # 示例按基础金额的30%计算
+        transfer_amount = to_cents(min(base_amount * 0.3, x_threshold))  # 示例按基础金额的30%计算
 
         # 生成交易时间序列(确保间隔规律)
-        time_intervals = [random.randint(28, 31) for _ in range(num_cycles)]  # 每月一次，间隔28-31天
-        # 确保最大最小间隔差<=Y天
-        while max(time_intervals) - min(time_intervals) > y_threshold:
-            time_intervals = [random.randint(28, 31) for _ in range(num_cycles)]
+        time_intervals = self.draw_intervals(num_cycles, y_threshold)
 
-        # 生成交易时间(从当前往前推180天)
-        end_date = datetime.now()
+        # 生成交易时间(从结束日期往前推180天, 不依赖运行时的当前时间, 保证同一种子结果可复现)
+        end_date = self.end_date
         start_date = end_date - timedelta(days=180)
         current_date = start_date
 
         # 最早入账前2个月(60天)的转出交易(万元整数倍)
         initial_out_date = current_date - timedelta(days=60)
-        initial_out_amount = base_amount * random.randint(1, 5)  # 1-5万元的整数倍
+        initial_out_amount = to_cents(base_amount) * randint(self.rng, 1, 5)  # 1-5万元的整数倍
 
         # 生成初始转出交易
         transactions = []
         sender_card = self._select_valid_card(sender, initial_out_amount)
         if sender_card:
             initial_trans = self._execute_transfer(
-                sender, receiver, sender_card, random.choice(receiver.cards),
+                sender, receiver, sender_card, pick(self.rng, receiver.cards),
                 initial_out_amount, initial_out_date.strftime("%Y-%m-%d %H:%M:%S"),
-                'regular_pattern_initial', risk
+                'regular_pattern_initial', risk, case_id
             )
             transactions.append(initial_trans)
 
         # 生成规律性入账交易
-        for interval in time_intervals:
+        for interval in time_intervals.tolist():
             current_date += timedelta(days=interval)
             timestamp = current_date.strftime("%Y-%m-%d %H:%M:%S")
 
             # 随机选择倍数关系(1-3倍)
-            multiple = random.randint(1, 3)
-            amount = round(transfer_amount * multiple, 2)
+            multiple = randint(self.rng, 1, 3)
+            amount = transfer_amount * multiple
 
             sender_card = self._select_valid_card(sender, amount)
             if not sender_card:
                 continue
 
             trans = self._execute_transfer(
-                sender, receiver, sender_card, random.choice(receiver.cards),
-                amount, timestamp, 'regular_pattern_in', risk
+                sender, receiver, sender_card, pick(self.rng, receiver.cards),
+                amount, timestamp, 'regular_pattern_in', risk, case_id
             )
             transactions.append(trans)
 
-        # 添加一些倍数关系的返利交易
-        for _ in range(int(num_cycles * 0.5)):  # 约50%的返利交易
-            current_date += timedelta(days=random.randint(5, 10))
+        # 添加一些倍数关系的返利交易, 参照金额取自不超过 X 元的入账, 没有这样的入账时不返利
+        references = [t['amount'] for t in transactions if t['amount'] <= x_threshold_cents]
+        for _ in range(int(num_cycles * 0.5) if references else 0):  # 约50%的返利交易
+            current_date += timedelta(days=randint(self.rng, 5, 10))
             timestamp = current_date.strftime("%Y-%m-%d %H:%M:%S")
 
             # 返利金额与之前交易呈倍数关系
-            reference_amount = random.choice([t['amount'] for t in transactions if t['amount'] <= x_threshold])
-            rebate_amount = round(reference_amount * random.uniform(0.5, 1.5), 2)  # 0.5-1.5倍的返利
+            reference_amount = pick(self.rng, references)
+            rebate_amount = int(round(reference_amount * self.rng.uniform(0.5, 1.5)))  # 0.5-1.5倍的返利
 
             sender_card = self._select_valid_card(sender, rebate_amount)
             if sender_card:
                 trans = self._execute_transfer(
-                    sender, receiver, sender_card, random.choice(receiver.cards),
-                    rebate_amount, timestamp, 'regular_pattern_rebate', risk
+                    sender, receiver, sender_card, pick(self.rng, receiver.cards),
+                    rebate_amount, timestamp, 'regular_pattern_rebate', risk, case_id
                 )
                 transactions.append(trans)
 
-        df = pd.DataFrame(transactions)
+        # 交易本身已按时间先后生成
+        if buffer is not None:
+            buffer.extend_records(transactions)
+            return buffer
+
+        return records_to_dataframe(transactions)
+
+    def draw_cases(self, num_people, prevalence):
+        """
+        按流行率抽取案例: 每个案例一名收款人(互不重复)和一名其他人作为付款人
+
+        Args:
+            num_people (int): 人数(至少 2 人)
+            prevalence (float): 作为收款人卷入案例的人员比例
+
+        Returns:
+            tuple: (senders, receivers) 人员下标
+        """
+        num_cases = min(int(round(num_people * prevalence)), num_people)
+        receivers = self.rng.choice(num_people, size=num_cases, replace=False)
+        senders = self.rng.integers(num_people - 1, size=num_cases)
+        senders += senders >= receivers
+        return senders, receivers
+
+    def expand_regular_patterns(self, cards, senders, receivers, base_amount=10000, risk=2, num_cycles=6,
+                                x_threshold=3000, y_threshold=3, first_case=0):
+        """
+        把整批规律性异常案例一次性展开成逐笔交易数组，规则与 generate_regular_pattern_transfers 相同:
+        初始转出(万元整数倍) 60 天后按近似每月的间隔入账 num_cycles 次(1-3 倍金额)，
+        之后每隔 5-10 天返利一次(不超过 X 元入账金额的 0.5-1.5 倍)
+
+        与逐笔接口不同, 各案例的起始日在日期范围内随机分布(整个案例放得下时完全落在范围内,
+        否则只保留与范围重叠的部分)，每个案例固定使用一张付款卡和一张收款卡；
+        是否成交由调用方结算时按余额规则判定
+
+        Args:
+            cards (CardTable): 银行卡数组表
+            senders (np.ndarray): 每个案例的付款人下标
+            receivers (np.ndarray): 每个案例的收款人下标
+            base_amount (int): 基础金额(元)
+            risk (int): 风险等级
+            num_cycles (int): 入账次数
+            x_threshold (int): 入账金额阈值(元)
+            y_threshold (int): 间隔差异阈值(天)
+            first_case (int): 第一个案例的编号, 其余依次递增
+
+        Returns:
+            dict: 逐笔交易数组(按案例、时间先后排列), 带 risk_level / typology / case_id 列
+        """
+        rng = self.rng
+        senders = np.asarray(senders, dtype=np.int64)
+        receivers = np.asarray(receivers, dtype=np.int64)
+        num_cases = len(senders)
+        num_rebates = int(num_cycles * 0.5)
+        transfer_amount = to_cents(min(base_amount * 0.3, x_threshold))
+
+        # 案例内的相对日期: 初始转出为第 0 天
+        intervals = self.draw_intervals(num_cycles, y_threshold, size=num_cases)
+        in_days = 60 + np.cumsum(intervals, axis=1)
+        rebate_days = in_days[:, -1:] + np.cumsum(rng.integers(5, 11, (num_cases, num_rebates)), axis=1)
+        days = np.hstack([np.zeros((num_cases, 1), dtype=np.int64), in_days, rebate_days])
+
+        initial_amounts = to_cents(base_amount) * rng.integers(1, 6, num_cases)
+        in_amounts = transfer_amount * rng.integers(1, 4, (num_cases, num_cycles))
+
+        # 每笔返利在本案例不超过 X 元的入账中随机取一笔作参照: 取第 k 个满足条件的入账
+        eligible = in_amounts <= to_cents(x_threshold)
+        counts = eligible.sum(axis=1)
+        ranks = (rng.random((num_cases, num_rebates)) * counts[:, None]).astype(np.int64)
+        positions = (np.cumsum(eligible, axis=1)[:, None, :] > ranks[:, :, None]).argmax(axis=2)
+        references = np.take_along_axis(in_amounts, positions, axis=1)
+        rebate_amounts = np.rint(references * rng.uniform(0.5, 1.5, (num_cases, num_rebates))).astype(np.int64)
+        amounts = np.hstack([initial_amounts[:, None], in_amounts, rebate_amounts])
+
+        valid = np.ones(days.shape, dtype=bool)
+        valid[:, 1 + num_cycles:] = (counts > 0)[:, None]
+
+        # 案例起始日
+        first_day = self.timestamp_sampler.start // SECONDS_PER_DAY
+        last_day = self.timestamp_sampler.end // SECONDS_PER_DAY
+        days = days + self.timestamp_sampler.sample_start_days(days[:, -1])[:, None]
+        valid &= (days >= first_day) & (days <= last_day)
 
-        # 按时间排序
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp').reset_index(drop=True)
-        df['timestamp'] = df['timestamp'].dt.strftime("%Y-%m-%d %H:%M:%S")
+        types = np.array([TRANSACTION_TYPES.index('regular_pattern_initial')] +
+                         [TRANSACTION_TYPES.index('regular_pattern_in')] * num_cycles +
+                         [TRANSACTION_TYPES.index('regular_pattern_rebate')] * num_rebates, dtype=np.int64)
+        sender_cards = cards.pick(senders, rng)
+        receiver_cards = cards.pick(receivers, rng)
 
-        return df
+        case = np.broadcast_to(np.arange(num_cases)[:, None], days.shape)[valid]
+        day = days[valid]
+        seconds = self.timestamp_sampler.sample_hours(len(day)) * 3600 + rng.integers(0, 3600, len(day))
+        return {
+            "sender_card": sender_cards[case],
+            "receiver_card": receiver_cards[case],
+            "amount": amounts[valid],
+            "timestamp": day * SECONDS_PER_DAY + seconds,
+            "transaction_type": np.broadcast_to(types, days.shape)[valid],
+            "risk_level": np.full(len(case), risk, dtype=np.int64),
+            "typology": np.full(len(case), TYPOLOGIES.index("regular_pattern"), dtype=np.int64),
+            "case_id": first_case + case,
+        }
 
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    pass
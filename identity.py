@@ -0,0 +1,284 @@
+from datetime import date
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+from seeding import make_rng
+
+"""
+    批量身份生成
+    姓名、省份词表只从 Faker 的 zh_CN provider 中读取一次，之后用 NumPy 下标数组整列抽样；
+    身份证号由 (年龄, 性别) 分组计数器经仿射置换映射到 (地区码, 出生日期, 顺序码) 得到，
+    计数器不重复则号码不重复，无需像 Faker.unique 那样维护已用集合并在冲突时重试
+"""
+
+# GB 11643 校验码: 前 17 位的加权和模 11 后查表
+ID_WEIGHTS = np.array([pow(2, 17 - i, 11) for i in range(17)], dtype=np.int64)
+ID_CHECK_CODES = np.array(list("10X98765432"))
+
+# 每个年龄覆盖的出生日期天数，与 Faker 的 ssn 一样按 365 天一岁计算
+DAYS_PER_AGE = 365
+# 顺序码 000-999, 末位奇数为男、偶数为女，每个性别 500 个
+SEQUENCES_PER_GENDER = 500
+
+# GB 32100 统一社会信用代码: 登记管理部门码和机构类别码(9 工商、1 企业) + 6 位地区码 + 9 位组织机构代码 + 校验码
+CREDIT_CODE_PREFIX = "91"
+CREDIT_CODE_CHARSET = np.array(list("0123456789ABCDEFGHJKLMNPQRTUWXY"))
+CREDIT_CODE_WEIGHTS = np.array([pow(3, i, 31) for i in range(17)], dtype=np.int64)
+# GB 11714 组织机构代码: 8 位本体 + 1 位校验码(10 为 X, 11 为 0)
+ORGANIZATION_WEIGHTS = np.array([3, 7, 9, 10, 5, 8, 4, 2], dtype=np.int64)
+ORGANIZATION_SPACE = 10 ** 8
+
+GENDERS = ['男', '女']
+
+
+@lru_cache(maxsize=None)
+def load_vocabulary(locale='zh_CN'):
+    """
+    从 Faker provider 中一次性读取词表
+
+    Returns:
+        dict: last_names / last_name_cdf / first_names_male / first_names_female / provinces / area_codes /
+            company_prefixes / company_suffixes
+    """
+    from importlib import import_module
+
+    person = import_module(f"faker.providers.person.{locale}").Provider
+    address = import_module(f"faker.providers.address.{locale}").Provider
+    ssn = import_module(f"faker.providers.ssn.{locale}").Provider
+    company = import_module(f"faker.providers.company.{locale}").Provider
+
+    last_names = person.last_names
+    if hasattr(last_names, 'items'):
+        names, weights = list(last_names.keys()), np.array(list(last_names.values()), dtype=np.float64)
+    else:
+        names, weights = list(last_names), np.ones(len(last_names))
+    cdf = np.cumsum(weights)
+
+    return {
+        'last_names': np.array(names),
+        'last_name_cdf': cdf / cdf[-1],
+        'first_names_male': np.array(person.first_names_male),
+        'first_names_female': np.array(person.first_names_female),
+        'provinces': np.array(address.provinces, dtype=object),
+        'area_codes': np.array(ssn.area_codes, dtype=np.int64),
+        'company_prefixes': np.array(company.company_prefixes),
+        'company_suffixes': np.array(company.company_suffixes),
+    }
+
+
+def id_checksum(base):
+    """
+    计算身份证校验码
+
+    Args:
+        base (np.ndarray): 前 17 位组成的 int64 整数
+
+    Returns:
+        np.ndarray: 校验码字符
+    """
+    base = np.asarray(base, dtype=np.int64)
+    total = np.zeros(len(base), dtype=np.int64)
+    for position in range(17):
+        total += (base // 10 ** (16 - position)) % 10 * ID_WEIGHTS[position]
+    return ID_CHECK_CODES[total % 11]
+
+
+def coprime_multiplier(space, rng):
+    """抽取与 space 互素的乘数, 仿射变换 x -> (x * 乘数 + 平移) % space 是 [0, space) 上的置换"""
+    multiplier = int(rng.integers(1, space))
+    while gcd(multiplier, space) != 1:
+        multiplier = int(rng.integers(1, space))
+    return multiplier
+
+
+def credit_codes(areas, organization):
+    """
+    由地区码和组织机构代码本体拼出统一社会信用代码, 两级校验码按 GB 11714 / GB 32100 计算
+
+    Args:
+        areas (np.ndarray): 6 位地区码
+        organization (np.ndarray): 组织机构代码本体(8 位整数)
+
+    Returns:
+        np.ndarray: 18 位统一社会信用代码(object 数组)
+    """
+    organization = np.asarray(organization, dtype=np.int64)
+    total = np.zeros(len(organization), dtype=np.int64)
+    for position in range(8):
+        total += (organization // 10 ** (7 - position)) % 10 * ORGANIZATION_WEIGHTS[position]
+    # 组织机构代码校验位 0-10, 10 写作 X
+    organization_check = (11 - total % 11) % 11
+    organization_char = CREDIT_CODE_CHARSET[organization_check]
+    organization_char[organization_check == 10] = 'X'
+    organization_value = np.where(organization_check == 10, np.flatnonzero(CREDIT_CODE_CHARSET == 'X')[0],
+                                  organization_check)
+
+    # 前 17 位: 前缀 2 位 + 地区码 6 位 + 组织机构代码 9 位, 前 16 位都是数字
+    number = np.asarray(areas, dtype=np.int64) * ORGANIZATION_SPACE + organization
+    total = np.full(len(organization), sum(int(digit) * int(weight) for digit, weight
+                                           in zip(CREDIT_CODE_PREFIX, CREDIT_CODE_WEIGHTS)), dtype=np.int64)
+    for position in range(14):
+        total += (number // 10 ** (13 - position)) % 10 * CREDIT_CODE_WEIGHTS[position + 2]
+    total += organization_value * CREDIT_CODE_WEIGHTS[16]
+    check = CREDIT_CODE_CHARSET[(31 - total % 31) % 31]
+
+    base = np.char.add(CREDIT_CODE_PREFIX, np.char.zfill(number.astype('U14'), 14))
+    return np.char.add(np.char.add(base, organization_char), check).astype(object)
+
+
+def _yyyymmdd(days):
+    """距 1970-01-01 的天数 -> YYYYMMDD 整数"""
+    dates = np.asarray(days, dtype=np.int64).astype('datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    year = months.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (dates - months).astype(np.int64) + 1
+    return year * 10000 + month * 100 + day
+
+
+class IdentityGenerator:
+    """
+    批量生成姓名、地址和唯一且校验位正确的身份证号
+
+    分片生成时各分片使用相同的 id_key 和 id_stride(=分片数)、不同的 id_offset(=分片序号)，
+    计数器互不相交，因此合并后的身份证号仍全局唯一
+    """
+
+    def __init__(self, rng=None, id_stride=1, id_offset=0, id_key=0, reference_date=date(2023, 12, 31),
+                 max_age=120, locale='zh_CN'):
+        """
+        Args:
+            rng (np.random.Generator | int, optional): 姓名、地址抽样用的随机数生成器或种子
+            id_stride (int): 计数器步长, 分片数
+            id_offset (int): 计数器偏移, 分片序号
+            id_key (int): 决定身份证号置换的密钥, 同一批分片必须相同
+            reference_date (date): 计算出生日期时的参照日期
+            max_age (int): 支持的最大年龄
+            locale (str): 词表语言区域
+        """
+        self.rng = make_rng(rng)
+        self.vocabulary = load_vocabulary(locale)
+        self.id_stride = id_stride
+        self.id_offset = id_offset
+        self.reference_days = (reference_date - date(1970, 1, 1)).days
+        self.max_age = max_age
+
+        # 每个 (年龄, 性别) 分组的号码空间: 地区码 x 出生日 x 顺序码
+        self.space = len(self.vocabulary['area_codes']) * DAYS_PER_AGE * SEQUENCES_PER_GENDER
+        key_rng = np.random.default_rng(id_key)
+        self.multiplier = coprime_multiplier(self.space, key_rng)
+        # 每个分组各自的平移量, 避免不同分组的同一序号落在相同的地区码和顺序码上
+        self.shifts = key_rng.integers(self.space, size=(max_age + 1) * len(GENDERS))
+        # 组织机构代码本体用另一组置换参数, 在身份证号的参数之后抽取, 不改变已有的身份证号
+        self.organization_multiplier = coprime_multiplier(ORGANIZATION_SPACE, key_rng)
+        self.organization_shift = int(key_rng.integers(ORGANIZATION_SPACE))
+
+        self._counters = np.zeros((max_age + 1, len(GENDERS)), dtype=np.int64)
+        self._organizations = 0
+
+    def draw_names(self, genders):
+        """
+        按性别抽取姓名
+
+        Args:
+            genders (np.ndarray): 性别编码, 0 为男、1 为女
+        """
+        vocabulary = self.vocabulary
+        genders = np.asarray(genders)
+        last = vocabulary['last_names'][np.searchsorted(vocabulary['last_name_cdf'], self.rng.random(len(genders)),
+                                                        side='right')]
+        first = np.empty(len(genders), dtype=object)
+        for code, key in enumerate(('first_names_male', 'first_names_female')):
+            mask = genders == code
+            names = vocabulary[key]
+            first[mask] = names[self.rng.integers(len(names), size=np.count_nonzero(mask))]
+        return np.char.add(last, first.astype(str)).astype(object)
+
+    def draw_provinces(self, num):
+        """等概率抽取省份"""
+        provinces = self.vocabulary['provinces']
+        return provinces[self.rng.integers(len(provinces), size=num)]
+
+    def id_numbers(self, ages, genders):
+        """
+        生成唯一的 18 位身份证号: 出生日期与年龄一致，顺序码末位与性别一致
+
+        Args:
+            ages (np.ndarray): 年龄
+            genders (np.ndarray): 性别编码, 0 为男、1 为女
+
+        Returns:
+            np.ndarray: 身份证号(object 数组)
+        """
+        ages = np.asarray(ages, dtype=np.int64)
+        genders = np.asarray(genders, dtype=np.int64)
+        if len(ages) and (ages.min() < 0 or ages.max() > self.max_age):
+            raise ValueError(f"年龄须在 0-{self.max_age} 之间")
+
+        # 组内名次 + 分组计数器 = 本分片内的序号, 再按步长和偏移错开各分片
+        groups = ages * len(GENDERS) + genders
+        order = np.argsort(groups, kind='stable')
+        sorted_groups = groups[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) if len(groups) else order
+        counts = np.diff(np.r_[starts, len(groups)])
+        rank = np.empty(len(groups), dtype=np.int64)
+        rank[order] = np.arange(len(groups)) - np.repeat(starts, counts)
+
+        counters = self._counters.reshape(-1)
+        local = counters[groups] + rank
+        np.add.at(counters, sorted_groups[starts], counts)
+
+        ordinal = self.id_offset + self.id_stride * local
+        if len(ordinal) and ordinal.max() >= self.space:
+            raise ValueError("身份证号空间已用尽")
+
+        # 仿射置换把连续序号打散到 (地区码, 出生日, 顺序码) 空间
+        permuted = (ordinal * self.multiplier + self.shifts[groups]) % self.space
+        area, rest = np.divmod(permuted, DAYS_PER_AGE * SEQUENCES_PER_GENDER)
+        day, sequence = np.divmod(rest, SEQUENCES_PER_GENDER)
+
+        birth = _yyyymmdd(self.reference_days - ages * DAYS_PER_AGE - day)
+        sequence = sequence * 2 + (genders == 0)  # 男性顺序码为奇数
+        base = self.vocabulary['area_codes'][area] * 10 ** 11 + birth * 1000 + sequence
+        return np.char.add(base.astype('U17'), id_checksum(base)).astype(object)
+
+    def credit_codes(self, num):
+        """
+        生成 num 个唯一的统一社会信用代码, 计数器与身份证号一样按步长和偏移在分片间错开
+
+        Returns:
+            np.ndarray: 18 位统一社会信用代码(object 数组)
+        """
+        local = self._organizations + np.arange(num, dtype=np.int64)
+        self._organizations += num
+        ordinal = self.id_offset + self.id_stride * local
+        if len(ordinal) and ordinal.max() >= ORGANIZATION_SPACE:
+            raise ValueError("组织机构代码空间已用尽")
+        organization = (ordinal * self.organization_multiplier + self.organization_shift) % ORGANIZATION_SPACE
+        areas = self.vocabulary['area_codes'][self.rng.integers(len(self.vocabulary['area_codes']), size=num)]
+        return credit_codes(areas, organization)
+
+    def draw_company_names(self, num):
+        """按 Faker zh_CN 的公司名格式(前缀 + 后缀)整列抽取公司名称"""
+        prefixes, suffixes = self.vocabulary['company_prefixes'], self.vocabulary['company_suffixes']
+        return np.char.add(prefixes[self.rng.integers(len(prefixes), size=num)],
+                           suffixes[self.rng.integers(len(suffixes), size=num)]).astype(object)
+
+    def generate(self, ages, genders):
+        """
+        批量生成身份信息
+
+        Args:
+            ages (np.ndarray): 年龄
+            genders (np.ndarray): 性别编码, 0 为男、1 为女
+
+        Returns:
+            dict: person_id / name / address 三列
+        """
+        return {
+            'person_id': self.id_numbers(ages, genders),
+            'name': self.draw_names(genders),
+            'address': self.draw_provinces(len(ages)),
+        }
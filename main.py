@@ -1,27 +1,235 @@
-import random
+import argparse
+from datetime import date
 
+import generate_company
 import generate_person
 
 import generate_transaction_model
 import generate_transaction
+from event_engine import TRANSACTION_ENGINES
+import parallel
+import profiling
+import snapshot
+from checkpoint import Checkpointer
+from population_store import is_population, open_population, save_population
 import numpy as np
 import pandas as pd
 
-if __name__ == "__main__":
+from social_graph import CounterpartyGraph
+from transaction_sink import SINKS, open_sink
 
-    # 生成交易账户，并为他们随机开卡
-    people, persons = generate_person.generate_person_data(100)
-    print(persons.head())
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成交易账户和交易流水")
+    parser.add_argument("--persons", type=int, default=100, help="交易人数")
+    parser.add_argument("--num", type=int, default=1000, help="交易生成循环次数")
+    parser.add_argument("--output", default="data/normal_n.csv", help="交易输出文件, 默认按扩展名推断格式")
+    parser.add_argument("--format", choices=sorted(SINKS), default=None, help="交易输出格式")
+    parser.add_argument("--batch-size", type=int, default=100000, help="每批写出的交易行数")
+    parser.add_argument("--persons-output", default="data/persons.csv", help="人员表输出文件(.csv / .parquet)")
+    parser.add_argument("--demographics", default=None, help="人口属性概率表(JSON), 默认使用内置表")
+    parser.add_argument("--row-group-size", type=int, default=None, help="Parquet 每个行组的最大行数")
+    parser.add_argument("--money", choices=["decimal", "cents"], default="decimal",
+                        help="Parquet 金额编码: decimal128(18, 2) 元或 int64 分")
+    parser.add_argument("--progress-every", type=int, default=0, help="每写出多少行打印一次进度, 0 为不打印")
+    parser.add_argument("--shards", type=int, default=0, help="分片数, 大于 0 时按分片多进程生成")
+    parser.add_argument("--workers", type=int, default=None, help="分片生成使用的进程数, 默认取 CPU 核数")
+    parser.add_argument("--seed", type=int, default=None, help="主种子, 指定后结果可复现")
+    parser.add_argument("--keep-shards", action="store_true", help="保留各分片文件, 不合并")
+    parser.add_argument("--engine", choices=sorted(TRANSACTION_ENGINES), default="event",
+                        help="event 按时间顺序结算余额并输出有序流, batch 按循环顺序结算(时间戳无序)")
+    parser.add_argument("--graph", choices=["uniform", "community"], default="uniform",
+                        help="接收方抽取方式: uniform 为全体均匀, community 为按社区/优先连接的交易对手图")
+    parser.add_argument("--avg-degree", type=float, default=8, help="交易对手图的平均出度")
+    parser.add_argument("--community-size", type=int, default=50, help="交易对手图的平均社区人数")
+    parser.add_argument("--local-fraction", type=float, default=0.8, help="交易对手图中连向本社区的边的比例")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None,
+                        help="交易开始日期(YYYY-MM-DD), 默认 2023-01-01, 追加模式下默认为快照的下一天")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None,
+                        help="交易结束日期(含当天), 默认 2023-12-31, 追加模式下默认为开始日期起 --window-days 天")
+    parser.add_argument("--window-days", type=int, default=1, help="追加模式每次生成的天数")
+    parser.add_argument("--partition-by-date", action="store_true",
+                        help="--output 作为目录, 按交易日期分区写出(date=YYYY-MM-DD/part-NNNNN)")
+    parser.add_argument("--snapshot", default=None, help="生成结束后保存人员、账本余额和对手图的快照(.npz)")
+    parser.add_argument("--append", default=None, metavar="SNAPSHOT",
+                        help="追加模式: 加载快照, 只生成新的日期窗口并追加到分区输出, 结束后更新快照")
+    parser.add_argument("--illegal-prevalence", type=float, default=0.0,
+                        help="作为收款人卷入规律性异常案例的人员比例(event 引擎), 异常交易带 typology / case_id 标注")
+    parser.add_argument("--rule-cases", type=int, default=0,
+                        help="十条异常规则各自合成的案例数(event 引擎), 用于生成类别均衡的带标注数据")
+    parser.add_argument("--companies", type=int, default=0,
+                        help="公司数(event 引擎), 大于 0 时公司在人员账本中开立对公账户, 并按月向员工发放工资")
+    parser.add_argument("--companies-output", default="data/companies.csv", help="公司表输出文件(.csv / .parquet)")
+    parser.add_argument("--company-flows", type=int, default=0,
+                        help="供应商付款(公司间)和消费付款(个人向公司)的总对数, 需要 --companies")
+    parser.add_argument("--population", default=None, metavar="DIR",
+                        help="人口库目录: 已存在时挂载其中的人员和账本(不再生成人员), 否则生成人员后保存到该目录; "
+                             "分片生成时各进程共享同一个人口库")
+    parser.add_argument("--cross-shard", type=float, default=0.0,
+                        help="正常转账中收款人为其他分片人员的比例(需要 --shards、--population 和 event 引擎), "
+                             "各分片生成后统一做跨分片余额结算")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件(.npz), 生成过程中定期保存, 完成后删除")
+    parser.add_argument("--checkpoint-every", type=float, default=60, help="两次检查点之间的最短间隔(秒)")
+    parser.add_argument("--resume", action="store_true", help="从 --checkpoint 指定的检查点继续上次中断的运行")
+    parser.add_argument("--profile", default=None, metavar="PATH",
+                        help="统计各阶段耗时、吞吐量、各交易类型行数和峰值内存, 结束后写出 JSON 报告")
+    parser.add_argument("--cprofile", default=None, metavar="PATH", help="用 cProfile 剖析主进程, 写出 pstats 文件")
+    parser.add_argument("--pyinstrument", default=None, metavar="PATH",
+                        help="用 pyinstrument 剖析主进程, 写出报告(.html 为 HTML, 否则为文本)")
+    args = parser.parse_args()
+    if args.shards > 0 and (args.snapshot or args.append or args.checkpoint):
+        parser.error("--snapshot / --append / --checkpoint 只支持单进程生成")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume 需要同时指定 --checkpoint")
+    if (args.illegal_prevalence > 0 or args.rule_cases > 0 or args.companies > 0) and args.engine != "event":
+        parser.error("--illegal-prevalence / --rule-cases / --companies 只支持 event 引擎")
+    if args.company_flows > 0 and args.companies <= 0:
+        parser.error("--company-flows 需要同时指定 --companies")
+    if args.companies > 0 and args.append:
+        parser.error("追加模式不支持 --companies, 快照中只保存人员")
+    if args.population and args.append:
+        parser.error("追加模式从快照恢复人员, 不能同时指定 --population")
+    if args.cross_shard > 0 and (args.shards <= 0 or not args.population or args.engine != "event"):
+        parser.error("--cross-shard 需要同时指定 --shards、--population 和 event 引擎")
 
-    normal_n=generate_transaction.generate_transactions(people,1000)
-    normal_n.to_csv('data/normal_n.csv', index=False, encoding='utf-8-sig')
+    sink_options = {'progress_every': args.progress_every}
+    parquet = (args.format or args.output.rsplit('.', 1)[-1]) == 'parquet'
+    if parquet:
+        sink_options.update(row_group_size=args.row_group_size, money=args.money)
+    # 追加模式总是写入分区输出, 已有分区文件保持不变
+    partitioned = args.partition_by_date or args.append is not None
 
-    # abnormal_n=generate_transaction.generate_transactions_illegal(people,1000)
-    # abnormal_n.to_csv('data/abnormal_n.csv', index=False, encoding='utf-8-sig')
+    checkpointer = None
+    if args.checkpoint:
+        if parquet or partitioned:
+            parser.error("断点续跑只支持单文件 csv / jsonl 输出")
+        checkpointer = Checkpointer(args.checkpoint, every_seconds=args.checkpoint_every)
+        if args.resume:
+            checkpointer.load()
+            if args.seed is None:
+                args.seed = checkpointer.info['config']['seed']
+        elif args.seed is None:
+            # 续跑要重新生成同样的人员和对手图, 未指定种子时取一个随机种子并记入检查点
+            args.seed = int(np.random.SeedSequence().entropy)
+        ignored = ('checkpoint_every', 'resume', 'progress_every', 'workers')
+        checkpointer.config = {key: str(value) if isinstance(value, date) else value
+                               for key, value in vars(args).items() if key not in ignored}
+        if args.resume and checkpointer.info['config'] != checkpointer.config:
+            parser.error(f"运行参数与检查点不一致: {checkpointer.info['config']}")
 
+    try:
+        hooks = profiling.ProfileHooks(cprofile=args.cprofile, pyinstrument=args.pyinstrument)
+    except ImportError as error:
+        parser.error(str(error))
+    profiler = profiling.enable() if args.profile else None
+    hooks.start()
 
+    graph_options = None
+    if args.graph == "community":
+        graph_options = {'avg_degree': args.avg_degree, 'community_size': args.community_size,
+                         'local_fraction': args.local_fraction}
 
+    if args.shards > 0:
+        # 同一主种子、同一分片数下，输出与进程数无关
+        results = parallel.generate_sharded(args.persons, args.num, args.output, args.persons_output,
+                                            num_shards=args.shards, workers=args.workers, seed=args.seed,
+                                            merge=not args.keep_shards, format=args.format,
+                                            batch_size=args.batch_size, sink_options=sink_options,
+                                            demographics=args.demographics, graph_options=graph_options,
+                                            engine=args.engine, illegal_prevalence=args.illegal_prevalence,
+                                            rule_cases=args.rule_cases, num_companies=args.companies,
+                                            companies_output=args.companies_output,
+                                            company_flows=args.company_flows, population=args.population,
+                                            cross_shard=args.cross_shard)
+        for result in results:
+            print(result)
+        print(f"{args.output}: {sum(result['rows'] for result in results)} 行, {len(results)} 个分片")
+    else:
+        if args.append:
+            # 从快照恢复人员、账本余额和对手图，日期窗口接在快照之后
+            people, graph, metadata = snapshot.load_snapshot(args.append)
+            start_date, end_date = snapshot.next_window(metadata, args.window_days)
+            start_date = args.start_date or start_date
+            end_date = args.end_date or max(end_date, start_date)
+            # 每个窗口的种子由主种子和窗口开始日期派生, 同一主种子下各天的交易互不相同
+            _, transaction_rng = parallel.shard_rngs(
+                np.random.SeedSequence(args.seed, spawn_key=(start_date.toordinal(),)))
+            print(f"{args.append}: {len(people)} 人, 追加 {start_date} - {end_date}")
+            # 各窗口的AA制群组编号和异常案例编号按开始日期错开, 不与之前追加的窗口重复
+            first_group = first_case = start_date.toordinal() << 32
+        else:
+            # 生成交易账户，并为他们随机开卡
+            seed_sequence = np.random.SeedSequence(args.seed)
+            person_rng, transaction_rng = parallel.shard_rngs(seed_sequence)
+            if args.population and is_population(args.population):
+                # 挂载人口库: 卡和余额以内存映射方式共享, 余额写时复制, 不改动人口库
+                store = open_population(args.population)
+                with profiling.stage("population.attach") as stage:
+                    people = store.people(ledger=store.ledger(rng=person_rng))
+                    stage.add_rows(len(people))
+                print(f"{args.population}: {len(people)} 人, {store.num_cards} 张卡")
+            else:
+                with profiling.stage("persons") as stage:
+                    people, persons = generate_person.generate_person_data(args.persons, args.persons_output,
+                                                                           row_group_size=args.row_group_size,
+                                                                           rng=person_rng,
+                                                                           demographics=args.demographics)
+                    stage.add_rows(len(people))
+                print(persons.head())
+                if args.population:
+                    # 在开立对公账户之前保存, 人口库中只有人员及其银行卡
+                    with profiling.stage("population.save"):
+                        save_population(args.population, people, persons, metadata={'seed': args.seed})
+            if args.companies > 0:
+                # 公司在人员的账本中开立对公账户, 与人员一起结算
+                with profiling.stage("companies"):
+                    companies, company_frame = generate_company.generate_company_data(
+                        args.companies, args.companies_output, row_group_size=args.row_group_size,
+                        rng=parallel.company_rng(seed_sequence), ledger=people[0].ledger)
+                print(company_frame.head())
+            first_group = first_case = 0
+            graph = None
+            if graph_options is not None:
+                with profiling.stage("graph"):
+                    graph = CounterpartyGraph.build(len(people), rng=transaction_rng, **graph_options)
+            start_date = args.start_date or generate_transaction.START_DATE.date()
+            end_date = args.end_date or generate_transaction.END_DATE.date()
 
+        # 流式生成交易并按批写出，内存占用只与批大小有关
+        if partitioned:
+            sink_options.update(partition_by_date=True, ordered=args.engine == "event")
+        if checkpointer is not None and checkpointer.resuming:
+            # 输出截断到检查点时的偏移量后接着写
+            sink_options.update(resume=checkpointer.info['sink'])
+            print(f"{args.checkpoint}: 从第 {checkpointer.info['sink']['rows']} 行继续")
+        options = {key: getattr(args, key) for key in ('illegal_prevalence', 'rule_cases') if getattr(args, key) > 0}
+        if options:
+            options['first_case'] = first_case
+        options['first_group'] = first_group
+        if args.companies > 0:
+            options.update(companies=companies, company_flows=args.company_flows)
+        with open_sink(args.output, args.format, **sink_options) as sink:
+            if checkpointer is not None:
+                checkpointer.sink = sink
+            iter_transactions = TRANSACTION_ENGINES[args.engine]
+            # 交易生成阶段的耗时包含写出
+            with profiling.stage("transactions"):
+                for batch in iter_transactions(people, args.num, batch_size=args.batch_size, rng=transaction_rng,
+                                               graph=graph, start_date=start_date, end_date=end_date,
+                                               checkpoint=checkpointer, **options):
+                    sink.write(batch)
+        print(sink.format_progress())
+        if checkpointer is not None:
+            checkpointer.remove()
 
+        if args.snapshot or args.append:
+            # 快照记录期末余额和已生成的最后一天, 下次追加从其后一天开始
+            snapshot.save_snapshot(args.snapshot or args.append, people, end_date, graph=graph,
+                                   metadata={'seed': args.seed})
 
+    hooks.stop()
+    if profiler is not None:
+        # 分片模式下各进程的统计已在 generate_sharded 中合并
+        print(f"{profiler.write(args.profile)}: 性能统计报告")
 
+    # abnormal_n=generate_transaction.generate_transactions_illegal(people,1000)
+    # abnormal_n.to_csv('data/abnormal_n.csv', index=False, encoding='utf-8-sig')
@@ -0,0 +1,20 @@
+import numpy as np
+
+"""
+    金额的定点表示
+    生成过程中所有金额和余额都以分(int64)保存和计算，只在导出时转换为元
+"""
+
+
+def to_cents(value):
+    """元 -> 分(int64)，支持标量和数组"""
+    if np.ndim(value) == 0:
+        return int(round(float(value) * 100))
+    return np.rint(np.asarray(value, dtype=np.float64) * 100).astype(np.int64)
+
+
+def to_yuan(cents):
+    """分 -> 元(float64)，支持标量和数组；float64 能精确往返 2^53 分以内的两位小数"""
+    if np.ndim(cents) == 0:
+        return int(cents) / 100
+    return np.asarray(cents, dtype=np.int64) / 100
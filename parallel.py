@@ -0,0 +1,361 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+import generate_company
+import generate_person
+import profiling
+from event_engine import TRANSACTION_ENGINES
+from identity import IdentityGenerator
+from population_store import is_population, open_population, save_population
+from settlement import CrossShardRouter, SpoolSink, finalize_shard, settle_shard
+from social_graph import CounterpartyGraph
+from transaction_sink import open_sink
+
+"""
+    多进程分片生成
+    人员按分片划分，每个分片在独立进程中生成自己的人员、银行卡和交易，身份证号跨分片唯一；
+    分片的随机种子由主种子经 SeedSequence.spawn 派生，只与主种子和分片序号有关，
+    因此同一主种子、同一分片数下，无论使用多少个进程，输出都逐字节一致
+"""
+
+
+def shard_sizes(total, num_shards):
+    """把 total 尽量均匀地分给 num_shards 个分片(前面的分片多分 1)"""
+    base, extra = divmod(total, num_shards)
+    return [base + (shard < extra) for shard in range(num_shards)]
+
+
+def shard_path(path, shard):
+    """data/normal_n.csv -> data/normal_n.shard-00003.csv"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard:05d}{ext}"
+
+
+def shard_rngs(seed_sequence):
+    """
+    由分片种子派生人员和交易两个独立的随机数生成器，
+    人员表只取决于分片种子，不受交易循环次数影响
+
+    Args:
+        seed_sequence (np.random.SeedSequence): 分片种子
+    """
+    person_seed, transaction_seed = seed_sequence.spawn(2)
+    return np.random.default_rng(person_seed), np.random.default_rng(transaction_seed)
+
+
+def company_rng(seed_sequence):
+    """
+    由分片种子派生公司表的随机数生成器: 取分片种子的第三个子种子(不改变 spawn 计数),
+    与人员、交易两个生成器互相独立, 生成公司不影响人员表和正常交易
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed_sequence.entropy, pool_size=seed_sequence.pool_size,
+                                                        spawn_key=tuple(seed_sequence.spawn_key) + (2,)))
+
+
+def build_population(path, num_persons, persons_path, seed=None, row_group_size=None, demographics=None):
+    """
+    按主种子生成人员(与单进程生成相同), 写出人员表并保存为人口库
+
+    Returns:
+        tuple: (people, persons) 与 generate_person_data 相同
+    """
+    person_rng, _ = shard_rngs(np.random.SeedSequence(seed))
+    people, persons = generate_person.generate_person_data(num_persons, persons_path, row_group_size=row_group_size,
+                                                           rng=person_rng, demographics=demographics)
+    save_population(path, people, persons, metadata={'seed': seed})
+    return people, persons
+
+
+def run_shard(task):
+    """
+    在当前进程中生成一个分片并写出到分片文件(进程池的工作函数)
+
+    Args:
+        task (dict): 分片参数, 见 generate_sharded
+
+    Returns:
+        dict: 分片的人数、交易行数和耗时
+    """
+    start = time.perf_counter()
+    person_rng, transaction_rng = shard_rngs(task['seed_sequence'])
+    # 各分片共用置换密钥、按分片序号错开计数器，身份证号跨分片唯一
+    identity = IdentityGenerator(person_rng, id_stride=task['num_shards'], id_offset=task['shard'],
+                                 id_key=task['id_key'])
+
+    if task['population'] is not None:
+        # 挂载共享的人口库, 只为本分片负责的一段人员创建 Person, 卡和余额不复制
+        store = open_population(task['population'])
+        with profiling.stage("population.attach") as stage:
+            people = store.people(*task['person_range'], ledger=store.ledger(rng=person_rng))
+            stage.add_rows(len(people))
+    else:
+        with profiling.stage("persons") as stage:
+            people, _ = generate_person.generate_person_data(
+                task['num_persons'], task['persons_path'], row_group_size=task['sink_options'].get('row_group_size'),
+                rng=person_rng, identity=identity, demographics=task['demographics'])
+            stage.add_rows(len(people))
+    router = None
+    if task['cross_shard'] > 0:
+        # 一部分转账付给其他分片的人员, 交易先暂存, 全部分片结算后再写出
+        router = CrossShardRouter(store, task['shard'], task['bounds'], task['cross_shard'])
+    companies = None
+    if task['companies_path'] is not None:
+        # 统一社会信用代码与身份证号一样按分片序号错开计数器; 公司只与本分片的人员往来
+        company_identity = IdentityGenerator(company_rng(task['seed_sequence']), id_stride=task['num_shards'],
+                                             id_offset=task['shard'], id_key=task['id_key'])
+        with profiling.stage("companies"):
+            companies, _ = generate_company.generate_company_data(
+                task['num_companies'], task['companies_path'],
+                row_group_size=task['sink_options'].get('row_group_size'), rng=company_identity.rng,
+                identity=company_identity, ledger=people[0].ledger if people else None)
+    rows = 0
+    if router is not None:
+        sink = SpoolSink(task['settlement_dir'], task['shard'],
+                         progress_every=task['sink_options'].get('progress_every', 0))
+    else:
+        sink = open_sink(task['output_path'], task['format'], **task['sink_options'])
+    with sink:
+        if len(people) > 1:
+            # 交易对手图只连接本分片内的人员
+            graph = None
+            if task['graph_options'] is not None:
+                with profiling.stage("graph"):
+                    graph = CounterpartyGraph.build(len(people), rng=transaction_rng, **task['graph_options'])
+            iter_transactions = TRANSACTION_ENGINES[task['engine']]
+            # AA制群组编号与异常案例编号一样按分片错开
+            options = {'first_group': task['shard'] << 32}
+            if task['illegal_prevalence'] > 0 or task['rule_cases'] > 0:
+                # 异常案例编号按分片错开
+                options.update(illegal_prevalence=task['illegal_prevalence'], rule_cases=task['rule_cases'],
+                               first_case=task['shard'] << 32)
+            if companies:
+                options.update(companies=companies, company_flows=task['company_flows'])
+            if router is not None:
+                options['router'] = router
+            with profiling.stage("transactions"):
+                for batch in iter_transactions(people, task['num'], task['batch_size'], rng=transaction_rng,
+                                               graph=graph, **options):
+                    sink.write(batch)
+        rows = sink.rows
+
+    result = {
+        'shard': task['shard'],
+        'persons': len(people),
+        'companies': len(companies or ()),
+        'rows': rows,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    if router is not None:
+        result['outgoing'] = router.save(task['settlement_dir'])
+    return result
+
+
+def settle_task(task):
+    """跨分片结算的第一步(进程池的工作函数): 重算本分片名下各卡的余额链"""
+    with profiling.stage("settlement.settle"):
+        incoming = settle_shard(task['settlement_dir'], task['population'], task['shard'], task['bounds'])
+    return {'shard': task['shard'], 'incoming': incoming}
+
+
+def finalize_task(task):
+    """跨分片结算的第二步(进程池的工作函数): 改写余额后写出分片文件"""
+    with profiling.stage("settlement.finalize"):
+        rows = finalize_shard(task['settlement_dir'], task['shard'], task['output_path'], task['format'],
+                              task['sink_options'])
+    return {'shard': task['shard'], 'rows': rows}
+
+
+def _call(function, task):
+    """执行 function(task); 需要性能统计时在单独的 Profiler 下执行, 报告放在结果的 profile 键中"""
+    if not task['profile']:
+        return function(task)
+    previous = profiling.active()
+    profiler = profiling.enable()
+    try:
+        result = function(task)
+    finally:
+        profiling.activate(previous)
+    result['profile'] = profiler.report()
+    return result
+
+
+def _map(function, tasks, workers):
+    """
+    在进程池(workers 为 1 时在当前进程)中按分片顺序执行;
+    各任务的性能统计报告合并到当前进程的统计中, 并从结果中移除
+    """
+    function = partial(_call, function)
+    if workers == 1:
+        results = [function(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(function, tasks))
+    for result in results:
+        if 'profile' in result:
+            profiling.active().merge(result.pop('profile'))
+    return results
+
+
+def merge_outputs(paths, output, format=None):
+    """
+    按分片顺序把分片文件合并为一个文件
+    CSV / JSONL 直接拼接字节(CSV 只保留第一个非空分片的 BOM 和表头)，Parquet 逐行组复制
+
+    Args:
+        paths (list): 分片文件路径, 按分片序号排列
+        output (str): 合并后的文件路径
+        format (str, optional): csv / jsonl / parquet, 默认按扩展名推断
+    """
+    if format is None:
+        format = os.path.splitext(output)[1].lstrip('.').lower()
+
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        from arrow_export import parquet_writer
+
+        writer = None
+        for path in paths:
+            parquet_file = pq.ParquetFile(path)
+            for row_group in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(row_group)
+                if writer is None:
+                    writer = parquet_writer(output, table.schema)
+                writer.write_table(table)
+        if writer is not None:
+            writer.close()
+        return output
+
+    with open(output, 'wb') as merged:
+        header_written = False
+        for path in paths:
+            with open(path, 'rb') as part:
+                if format == 'csv':
+                    header = part.readline()
+                    if not header:
+                        continue
+                    if not header_written:
+                        merged.write(header)
+                        header_written = True
+                while True:
+                    chunk = part.read(1 << 24)
+                    if not chunk:
+                        break
+                    merged.write(chunk)
+    return output
+
+
+def generate_sharded(num_persons, num, output, persons_output, num_shards=8, workers=None, seed=0, merge=True,
+                     format=None, batch_size=100000, sink_options=None, demographics=None, graph_options=None,
+                     engine="event", illegal_prevalence=0.0, rule_cases=0, num_companies=0,
+                     companies_output="data/companies.csv", company_flows=0, population=None, cross_shard=0.0):
+    """
+    分片并行生成人员和交易
+
+    Args:
+        num_persons (int): 总人数
+        num (int): 交易生成的总循环次数, 按人数比例分给各分片
+        output (str): 交易输出文件
+        persons_output (str): 人员表输出文件
+        num_shards (int): 分片数, 决定输出内容; 与进程数无关
+        workers (int, optional): 进程数, 默认取 CPU 核数, 1 时在当前进程中顺序执行
+        seed (int): 主种子
+        merge (bool): True 时合并为 output / persons_output 并删除分片文件, False 时保留各分片文件
+        format (str, optional): 交易输出格式, 默认按扩展名推断
+        batch_size (int): 每批写出的交易行数
+        sink_options (dict, optional): 传给输出端的其他参数
+        demographics (dict | str, optional): 人口属性概率表或其 JSON 路径
+        graph_options (dict, optional): 交易对手图参数(见 CounterpartyGraph.build), 默认接收方均匀抽取
+        engine (str): 交易生成引擎, 见 event_engine.TRANSACTION_ENGINES
+        illegal_prevalence (float): 注入规律性异常案例的人员比例, 只支持 event 引擎
+        rule_cases (int): 十条异常规则各自合成的案例总数, 按人数比例分给各分片, 只支持 event 引擎
+        num_companies (int): 公司总数, 均分给各分片, 只支持 event 引擎
+        companies_output (str): 公司表输出文件
+        company_flows (int): 供应商付款和消费付款的总对数, 均分给各分片
+        population (str, optional): 人口库目录; 给出时各分片挂载同一个人口库并按人数划分人员,
+            不再各自生成人员, 目录不存在时先在当前进程中按主种子生成(与单进程生成的人员相同)
+        cross_shard (float): 正常转账中收款人为其他分片人员的比例, 需要 population 和 event 引擎;
+            大于 0 时各分片生成完后再做一次跨分片结算(见 settlement), 余额链在全部分片之间一致
+
+    Returns:
+        list: 各分片的统计信息
+    """
+    sink_options = dict(sink_options or {})
+    if cross_shard > 0 and (population is None or engine != "event"):
+        raise ValueError("跨分片转账需要人口库和 event 引擎")
+    settlement_dir = None
+    if cross_shard > 0:
+        settlement_dir = f"{os.path.splitext(output)[0]}.settlement"
+        os.makedirs(settlement_dir, exist_ok=True)
+    if population is not None:
+        if not is_population(population):
+            with profiling.stage("population.build"):
+                build_population(population, num_persons, persons_output, seed=seed,
+                                 row_group_size=sink_options.get('row_group_size'), demographics=demographics)
+        num_persons = len(open_population(population))
+    persons = shard_sizes(num_persons, num_shards)
+    bounds = np.concatenate([[0], np.cumsum(persons)]).tolist()
+    iterations = shard_sizes(num, num_shards)
+    cases = shard_sizes(rule_cases, num_shards)
+    company_counts = shard_sizes(num_companies, num_shards)
+    flows = shard_sizes(company_flows, num_shards)
+    root = np.random.SeedSequence(seed)
+    seed_sequences = root.spawn(num_shards)
+
+    tasks = [{
+        'shard': shard,
+        'num_shards': num_shards,
+        'seed_sequence': seed_sequences[shard],
+        'id_key': root.entropy,
+        'num_persons': persons[shard],
+        'num': iterations[shard],
+        'persons_path': shard_path(persons_output, shard),
+        'output_path': shard_path(output, shard),
+        'format': format,
+        'batch_size': batch_size,
+        'sink_options': sink_options,
+        'demographics': demographics,
+        'graph_options': graph_options,
+        'engine': engine,
+        'illegal_prevalence': illegal_prevalence,
+        'rule_cases': cases[shard],
+        'num_companies': company_counts[shard],
+        'companies_path': shard_path(companies_output, shard) if num_companies > 0 else None,
+        'company_flows': flows[shard],
+        'population': population,
+        'person_range': (bounds[shard], bounds[shard + 1]),
+        'bounds': bounds,
+        'cross_shard': cross_shard,
+        'settlement_dir': settlement_dir,
+        'profile': profiling.enabled(),
+    } for shard in range(num_shards)]
+
+    workers = workers or os.cpu_count()
+    results = _map(run_shard, tasks, workers)
+    if settlement_dir is not None:
+        # 两步之间是唯一的同步点: 先由收款分片重算余额链, 再由各分片改写并写出自己的交易
+        for result, settled in zip(results, _map(settle_task, tasks, workers)):
+            result['incoming'] = settled['incoming']
+        _map(finalize_task, tasks, workers)
+        for path in glob.glob(os.path.join(settlement_dir, '*.npz')):
+            os.remove(path)
+        os.rmdir(settlement_dir)
+
+    if merge:
+        outputs = [('output_path', output)]
+        if population is None:
+            # 使用人口库时人员表在生成人口库时已经写出
+            outputs.append(('persons_path', persons_output))
+        if num_companies > 0:
+            outputs.append(('companies_path', companies_output))
+        with profiling.stage("merge"):
+            for key, path in outputs:
+                paths = [task[key] for task in tasks]
+                merge_outputs(paths, path, format if key == 'output_path' else None)
+                for part in paths:
+                    os.remove(part)
+    return results
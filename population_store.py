@@ -0,0 +1,234 @@
+import gc
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from generate_person import BankCard, CardLedger, Person
+from snapshot import PERSON_FIELDS, PERSON_INTEGER_FIELDS
+
+"""
+    内存映射的人口库
+    人员属性、银行卡账本各列和期末余额按列保存为目录中的 .npy 文件，打开时只读元数据，
+    各列在首次访问时以内存映射方式挂载；多个工作进程挂载同一个人口库时共享操作系统的页缓存，
+    不必把 Person 列表序列化到每个进程，也不会各自复制一份千万级的人口。
+    余额默认以写时复制方式挂载，进程内的记账只影响自己改动过的页，不写回文件
+"""
+
+POPULATION_VERSION = 1
+
+# 取值种类很少的字符串属性保存为编码 + 编码表, 其余(证件号、姓名)保存为定长字节串(UTF-8)
+PERSON_CATEGORY_FIELDS = ('gender', 'occupation', 'income_level', 'marital_status', 'address', 'education')
+
+LEDGER_COLUMNS = ('owners', 'bank_codes', 'type_codes', 'numbers', 'balances', 'owner_ids')
+
+
+def _encode_bytes(values):
+    """字符串列 -> 定长 UTF-8 字节数组"""
+    return np.char.encode(np.asarray(values, dtype=str), 'utf-8')
+
+
+def save_population(path, people, persons=None, metadata=None):
+    """
+    保存人口库(先写临时目录再替换, 中途失败时旧人口库保留在原目录或 path.old 中)
+
+    Args:
+        path (str): 人口库目录
+        people (list): 交易人员(Person)列表, 须共用同一个账本
+        persons (pd.DataFrame, optional): generate_person_data 返回的人员表, 与 people 一一对应,
+            给出时直接按列写出, 不再逐个读取 Person 属性
+        metadata (dict, optional): 其他需要记录的信息
+    """
+    temporary = f"{path}.tmp"
+    if os.path.isdir(temporary):
+        shutil.rmtree(temporary)
+    os.makedirs(temporary)
+
+    def write(name, values):
+        np.save(os.path.join(temporary, f"{name}.npy"), np.ascontiguousarray(values))
+
+    categories = {}
+    for field in PERSON_FIELDS:
+        if persons is not None:
+            values = persons[field].to_numpy()
+        else:
+            values = [getattr(person, field) for person in people]
+        if field in PERSON_INTEGER_FIELDS:
+            write(f"person_{field}", np.asarray(values, dtype=np.int64))
+        elif field in PERSON_CATEGORY_FIELDS:
+            codes, names = pd.factorize(np.asarray(values, dtype=object))
+            write(f"person_{field}", codes.astype(np.int16))
+            categories[field] = names.tolist()
+        else:
+            write(f"person_{field}", _encode_bytes(values))
+    write('person_index', np.asarray([person.index for person in people], dtype=np.int64))
+
+    ledger = people[0].ledger
+    arrays = ledger.to_arrays()
+    for name in LEDGER_COLUMNS:
+        # 证件号只含数字和大写字母, 按 ASCII 保存
+        write(f"ledger_{name}", arrays[name].astype('S') if name == 'owner_ids' else arrays[name])
+    # 按持有人分组的卡下标一并保存, 挂载后不必重新排序
+    indptr, cards = ledger.owner_cards()
+    write('ledger_indptr', indptr)
+    write('ledger_cards', cards)
+
+    info = {
+        'version': POPULATION_VERSION,
+        'num_persons': len(people),
+        'num_cards': len(ledger),
+        'categories': categories,
+        'bank_names': ledger.bank_names,
+        'card_types': ledger.card_types,
+        **(metadata or {}),
+    }
+    with open(os.path.join(temporary, 'metadata.json'), 'w', encoding='utf-8') as file:
+        json.dump(info, file, ensure_ascii=False)
+
+    # 旧人口库先改名移开再换上新目录, 任何时刻 path 或其 .old 中都有一份完整的人口库
+    previous = f"{path}.old"
+    if os.path.isdir(previous):
+        shutil.rmtree(previous)
+    if os.path.isdir(path):
+        os.replace(path, previous)
+    os.replace(temporary, path)
+    if os.path.isdir(previous):
+        shutil.rmtree(previous)
+    return path
+
+
+class PopulationStore:
+    """
+    打开的人口库: 只读取元数据, 各列在首次访问时以内存映射方式挂载
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): save_population 写出的目录
+        """
+        self.path = path
+        with open(os.path.join(path, 'metadata.json'), encoding='utf-8') as file:
+            self.metadata = json.load(file)
+        if self.metadata.get('version') != POPULATION_VERSION:
+            raise ValueError(f"不支持的人口库版本: {self.metadata.get('version')}")
+        self._arrays = {}
+
+    def __len__(self):
+        return self.metadata['num_persons']
+
+    @property
+    def num_cards(self):
+        return self.metadata['num_cards']
+
+    def array(self, name, mode='r'):
+        """
+        以内存映射方式挂载一列
+
+        Args:
+            name (str): 列名, 如 person_age / ledger_balances
+            mode (str): np.load 的 mmap_mode, 'r' 只读(缓存复用), 'c' 写时复制, 'r+' 写回文件
+        """
+        if mode != 'r':
+            return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode=mode)
+        values = self._arrays.get(name)
+        if values is None:
+            values = self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return values
+
+    def column(self, field, start=0, stop=None):
+        """
+        解码一段人员属性
+
+        Args:
+            field (str): 属性名, 见 snapshot.PERSON_FIELDS
+            start (int): 起始人员下标
+            stop (int, optional): 结束人员下标(不含), 默认到末尾
+
+        Returns:
+            np.ndarray: 整数属性为 int64, 其余为 object 字符串数组
+        """
+        values = self.array(f"person_{field}")[start:stop]
+        if field in PERSON_INTEGER_FIELDS:
+            return np.asarray(values)
+        if field in PERSON_CATEGORY_FIELDS:
+            return np.asarray(self.metadata['categories'][field], dtype=object)[values]
+        return np.char.decode(values, 'utf-8').astype(object)
+
+    def frame(self, start=0, stop=None):
+        """一段人员的人员表, 列与 generate_person_data 返回的人员表相同"""
+        return pd.DataFrame({field: self.column(field, start, stop) for field in PERSON_FIELDS})
+
+    def ledger(self, rng=None, mode='c'):
+        """
+        挂载账本: 卡的各列只读共享, 余额按 mode 挂载
+
+        Args:
+            rng (np.random.Generator, optional): 之后新开卡时生成卡号用的随机数生成器
+            mode (str): 余额的挂载方式, 'c' 写时复制(默认, 记账不写回文件), 'r+' 记账直接写回人口库
+
+        Returns:
+            CardLedger: 不复制数据的账本
+        """
+        arrays = {name: self.array(f"ledger_{name}") for name in LEDGER_COLUMNS if name != 'balances'}
+        arrays['balances'] = self.array('ledger_balances', mode=mode)
+        arrays['bank_names'] = self.metadata['bank_names']
+        arrays['card_types'] = self.metadata['card_types']
+        return CardLedger.attach(arrays, rng=rng, owner_cards=(self.array('ledger_indptr'),
+                                                               self.array('ledger_cards')))
+
+    def people(self, start=0, stop=None, ledger=None):
+        """
+        为一段人员创建 Person 对象, 各进程只需创建自己负责的那一段
+
+        Args:
+            start (int): 起始人员下标
+            stop (int, optional): 结束人员下标(不含), 默认到末尾
+            ledger (CardLedger, optional): 人员所在的账本, 默认挂载一个写时复制的账本;
+                同一进程中多次调用时应传入同一个账本
+
+        Returns:
+            list: Person 列表, 持有人下标与保存时一致
+        """
+        ledger = ledger if ledger is not None else self.ledger()
+        columns = [self.column(field, start, stop).tolist() for field in PERSON_FIELDS]
+        indices = np.asarray(self.array('person_index')[start:stop])
+        indptr, cards = ledger.owner_cards()
+
+        # 与批量生成时一样, 大批量创建对象时暂停循环垃圾回收
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            people = [Person(*row, ledger=ledger, index=index) for row, index in zip(zip(*columns), indices.tolist())]
+            if len(indices):
+                # 只把这段人员涉及的卡下标转为列表
+                starts, stops = indptr[indices], indptr[indices + 1]
+                low = int(starts.min())
+                cards = cards[low:int(stops.max())].tolist()
+                view = BankCard.view
+                for person, first, last in zip(people, (starts - low).tolist(), (stops - low).tolist()):
+                    person.cards = [view(ledger, card, person) for card in cards[first:last]]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return people
+
+
+def open_population(path):
+    """
+    打开人口库(只读元数据, 毫秒级)
+
+    Args:
+        path (str): 人口库目录
+
+    Returns:
+        PopulationStore
+    """
+    return PopulationStore(path)
+
+
+def is_population(path):
+    """path 是否为已写完的人口库目录"""
+    return os.path.isfile(os.path.join(path, 'metadata.json'))
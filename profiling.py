@@ -0,0 +1,294 @@
+import importlib.util
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块, 不统计峰值内存
+    resource = None
+
+"""
+    生成过程的性能统计
+    各阶段(人员生成、计划展开、时间戳、余额结算、列组装、写出等)在代码中用 stage() 计时、count() 计数，
+    统计写到当前启用的 Profiler 中，运行结束后导出为 JSON 报告: 各阶段耗时和吞吐量、各交易类型的行数和
+    因余额不足跳过的笔数、写出字节数和峰值内存。
+    未启用时使用 NullProfiler, stage() 返回同一个空的上下文管理器, 每次调用只多一次函数调用;
+    阶段计时都在整批数组操作的外层, 不在逐行循环中
+"""
+
+REPORT_VERSION = 1
+
+
+def peak_rss_mb(children=False):
+    """
+    当前进程(children 为 True 时为已结束的子进程中最大的一个)的峰值常驻内存(MB), 不支持的平台返回 None
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux 上 ru_maxrss 的单位为 KB
+    return round(usage.ru_maxrss / 1024, 1)
+
+
+class _Stage:
+    """一次阶段计时, 退出时把耗时和行数累加到 Profiler"""
+
+    __slots__ = ('profiler', 'name', 'rows', '_start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.rows = 0
+
+    def add_rows(self, rows):
+        """记录本阶段处理的行数, 报告中据此计算吞吐量"""
+        self.rows += int(rows)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add(self.name, time.perf_counter() - self._start, self.rows)
+        return False
+
+
+class _NullStage:
+    """未启用时的阶段计时, 什么也不做"""
+
+    __slots__ = ()
+
+    def add_rows(self, rows):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullProfiler:
+    """未启用统计时的占位实现, 所有方法都是空操作"""
+
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def add(self, name, seconds, rows=0):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def record_rows(self, names, codes, accepted):
+        pass
+
+
+class Profiler:
+    """
+    阶段计时和计数: 阶段按名称累加耗时、调用次数和行数, 名称用 "." 分层(如 expand.transfers),
+    外层阶段的耗时包含内层
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = Counter()
+        # 各交易类型成功和因余额不足跳过的笔数
+        self.pattern_rows = Counter()
+        self.pattern_skipped = Counter()
+        # 分片进程各自的峰值内存, 由 merge 汇总
+        self.worker_peak_rss_mb = []
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        """
+        阶段计时的上下文管理器
+
+        Args:
+            name (str): 阶段名称
+        """
+        return _Stage(self, name)
+
+    def add(self, name, seconds, rows=0):
+        """累加一个阶段的耗时(秒)和行数"""
+        totals = self.stages.get(name)
+        if totals is None:
+            totals = self.stages[name] = [0.0, 0, 0]
+        totals[0] += seconds
+        totals[1] += 1
+        totals[2] += rows
+
+    def count(self, name, value=1):
+        """累加一个计数器"""
+        self.counters[name] += int(value)
+
+    def record_rows(self, names, codes, accepted):
+        """
+        按交易类型统计一批结算结果
+
+        Args:
+            names (list): 交易类型名称, 下标即编码
+            codes (np.ndarray): 每笔交易的类型编码
+            accepted (np.ndarray): 每笔交易是否成功(bool), 失败即余额不足被跳过
+        """
+        rows = np.bincount(codes[accepted], minlength=len(names))
+        skipped = np.bincount(codes[~accepted], minlength=len(names))
+        for name, count, skip in zip(names, rows.tolist(), skipped.tolist()):
+            if count:
+                self.pattern_rows[name] += count
+            if skip:
+                self.pattern_skipped[name] += skip
+
+    def merge(self, report):
+        """
+        合并另一个进程的报告(report() 的输出), 耗时和计数相加, 峰值内存逐个进程记录
+
+        Args:
+            report (dict): 分片进程返回的报告
+        """
+        for name, values in report['stages'].items():
+            totals = self.stages.setdefault(name, [0.0, 0, 0])
+            totals[0] += values['seconds']
+            totals[1] += values['calls']
+            totals[2] += values['rows']
+        self.counters.update(report['counters'])
+        for name, values in report['patterns'].items():
+            self.pattern_rows[name] += values['rows']
+            self.pattern_skipped[name] += values['skipped']
+        self.worker_peak_rss_mb.append(report['peak_rss_mb'])
+
+    def report(self):
+        """
+        结构化报告
+
+        Returns:
+            dict: wall_seconds / peak_rss_mb / stages / patterns / counters; 各交易类型的吞吐量按整段运行时间折算
+        """
+        wall = time.perf_counter() - self._start
+        stages = {}
+        for name, (seconds, calls, rows) in sorted(self.stages.items()):
+            stages[name] = {'seconds': round(seconds, 6), 'calls': calls, 'rows': rows,
+                            'rows_per_second': round(rows / seconds, 1) if rows and seconds > 0 else None}
+        patterns = {}
+        for name in sorted(set(self.pattern_rows) | set(self.pattern_skipped)):
+            rows = self.pattern_rows[name]
+            patterns[name] = {'rows': rows, 'skipped': self.pattern_skipped[name],
+                              'rows_per_second': round(rows / wall, 1) if wall > 0 else None}
+        return {
+            'version': REPORT_VERSION,
+            'wall_seconds': round(wall, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_rss_children_mb': peak_rss_mb(children=True),
+            'worker_peak_rss_mb': self.worker_peak_rss_mb,
+            'stages': stages,
+            'patterns': patterns,
+            'counters': dict(self.counters),
+        }
+
+    def write(self, path):
+        """把报告写为 JSON 文件"""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, ensure_ascii=False, indent=2)
+        return path
+
+
+# 当前启用的统计, 默认不统计
+_active = NullProfiler()
+
+
+def enable():
+    """启用统计并返回新的 Profiler, 之后各模块的 stage() / count() 都记到它上面"""
+    return activate(Profiler())
+
+
+def activate(profiler):
+    """把给定的 Profiler / NullProfiler 设为当前统计(如分片结束后恢复调用方的统计)"""
+    global _active
+    _active = profiler
+    return profiler
+
+
+def disable():
+    """停止统计"""
+    activate(NullProfiler())
+
+
+def active():
+    return _active
+
+
+def enabled():
+    return _active.enabled
+
+
+def stage(name):
+    """当前统计上的阶段计时, 见 Profiler.stage"""
+    return _active.stage(name)
+
+
+def count(name, value=1):
+    """当前统计上的计数, 见 Profiler.count"""
+    _active.count(name, value)
+
+
+def record_rows(names, codes, accepted):
+    """当前统计上按交易类型计数, 见 Profiler.record_rows"""
+    _active.record_rows(names, codes, accepted)
+
+
+class ProfileHooks:
+    """
+    外部剖析器的开关: cProfile(标准库)写出 pstats 文件, pyinstrument(可选依赖)写出文本或 HTML 报告
+    """
+
+    def __init__(self, cprofile=None, pyinstrument=None):
+        """
+        Args:
+            cprofile (str, optional): cProfile 统计的输出路径(可用 pstats / snakeviz 查看)
+            pyinstrument (str, optional): pyinstrument 报告的输出路径, 扩展名为 .html 时写 HTML, 否则写文本
+        """
+        self.cprofile_path = cprofile
+        self.pyinstrument_path = pyinstrument
+        self._cprofile = None
+        self._pyinstrument = None
+        if pyinstrument is not None and importlib.util.find_spec('pyinstrument') is None:
+            raise ImportError("pyinstrument 报告需要安装 pyinstrument: pip install pyinstrument")
+
+    def start(self):
+        if self.cprofile_path is not None:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if self.pyinstrument_path is not None:
+            from pyinstrument import Profiler as SamplingProfiler
+
+            self._pyinstrument = SamplingProfiler()
+            self._pyinstrument.start()
+        return self
+
+    def stop(self):
+        """停止剖析并写出结果"""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+            self._cprofile = None
+        if self._pyinstrument is not None:
+            self._pyinstrument.stop()
+            if self.pyinstrument_path.endswith('.html'):
+                text = self._pyinstrument.output_html()
+            else:
+                text = self._pyinstrument.output_text(unicode=True)
+            with open(self.pyinstrument_path, 'w', encoding='utf-8') as file:
+                file.write(text)
+            self._pyinstrument = None
@@ -0,0 +1,487 @@
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from pandas.api.types import union_categoricals
+
+from generate_transaction_model import RULE_TYPOLOGIES
+from money import to_cents
+from timestamp_sampler import SECONDS_PER_DAY
+
+"""
+    十条异常规则的批量检测
+    交易表展开成账户视角的流水(每笔交易对付款卡、收款卡各一条)，按 (账户, 时间) 只排序一次；
+    各规则用到的滚动窗口统计量(转入转出笔数和金额、不同对手数、同额入账的间隔差、开卡后前后 15 天对比)
+    都由分组前缀和、二分查找和 +1/-1 事件累加得到，不逐个账户循环。
+    阈值的名称和默认值与 generate_transaction_model_illegal.TransactionGenerator 中的规则相同，
+    检测结果可与生成器写入的 typology / case_id 标注对照，检验标注质量
+"""
+
+# 时间窗的上限(秒), 决定排序键中为每个账户预留的时间跨度
+MAX_WINDOW = 366 * SECONDS_PER_DAY
+
+
+def _interleave(first, second):
+    """[a0, a1, ...], [b0, b1, ...] -> [a0, b0, a1, b1, ...]"""
+    result = np.empty(2 * len(first), dtype=np.result_type(first, second))
+    result[0::2] = first
+    result[1::2] = second
+    return result
+
+
+def _window_sum(values, start):
+    """每个位置 i 上 values[start[i]:i + 1] 之和"""
+    total = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(values, out=total[1:])
+    return total[1:] - total[start]
+
+
+def _ratio_within(inflow, outflow, ratio):
+    """转入与转出金额之比是否在 ratio 范围内(没有转出时为否)"""
+    low, high = ratio
+    return (outflow > 0) & (inflow >= low * outflow) & (inflow <= high * outflow)
+
+
+def _cents_column(values, cents):
+    return np.asarray(values, dtype=np.int64) if cents else to_cents(np.asarray(values, dtype=np.float64))
+
+
+def _seconds_column(values):
+    """时间戳列(datetime / 字符串 / int64 秒) -> int64 秒"""
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy(dtype=np.int64)
+    return pd.to_datetime(values).to_numpy().astype('datetime64[s]').astype(np.int64)
+
+
+def _factorize_pair(first, second):
+    """
+    付款方、收款方两列按同一编码表编码; 两列都是分类类型(如读取 Parquet 字典列)时只对整数编码去重
+
+    Returns:
+        tuple: (交错排列的编码, 取值) 编码从 0 起连续
+    """
+    if isinstance(first.dtype, pd.CategoricalDtype) and isinstance(second.dtype, pd.CategoricalDtype):
+        combined = union_categoricals([first, second])
+        codes, uniques = pd.factorize(combined.codes)
+        values = np.asarray(combined.categories, dtype=object)[uniques]
+    else:
+        codes, values = pd.factorize(np.concatenate([first.to_numpy(dtype=object), second.to_numpy(dtype=object)]))
+    return _interleave(codes[:len(first)], codes[len(first):]).astype(np.int64), np.asarray(values, dtype=object)
+
+
+class RuleDetector:
+    """
+    账户级规则检测: 账户即银行卡，每条 detect_<规则> 返回长度为账户数的布尔数组
+    """
+
+    def __init__(self, transactions, persons=None, corporate_ids=None, customer_types=None, keywords=(),
+                 cents=False):
+        """
+        Args:
+            transactions (pd.DataFrame): 交易表, 列同 transaction_buffer.TRANSACTION_COLUMNS
+            persons (pd.DataFrame, optional): 人员表, 用 person_id / address 判断开户地(模式4)
+            corporate_ids (iterable, optional): 对公客户的证件号; 不给出时不区分对公对私,
+                所有账户都可作为主体, 对手既算对公也算对私
+            customer_types (dict | pd.Series, optional): 证件号 -> 客户类型或名称, 与 keywords 一起判断
+                模式8-10 的关键字条件; 不给出时不检查关键字
+            keywords (tuple): 关键字
+            cents (bool): 金额和余额列是否已是 int64 分(--money cents 导出的 Parquet)
+        """
+        num_rows = len(transactions)
+        times = _seconds_column(transactions['timestamp'])
+        amounts = _cents_column(transactions['amount'], cents)
+
+        accounts, self.account_numbers = _factorize_pair(transactions['sender_card_number'],
+                                                         transactions['receiver_card_number'])
+        owners, self.owner_ids = _factorize_pair(transactions['sender_id'], transactions['receiver_id'])
+        self.num_accounts = len(self.account_numbers)
+
+        # 案例主体: _out 交易的付款卡, 其余异常交易的收款卡
+        if 'typology' in transactions.columns:
+            labelled = np.flatnonzero(transactions['typology'].to_numpy(dtype=object) != 'normal')
+            outgoing = transactions['transaction_type'].iloc[labelled].str.endswith('_out').to_numpy(dtype=bool)
+            self.labels = pd.DataFrame({
+                'typology': transactions['typology'].to_numpy(dtype=object)[labelled],
+                'case_id': transactions['case_id'].to_numpy()[labelled],
+                'subject': np.where(outgoing, accounts[2 * labelled], accounts[2 * labelled + 1]),
+            })
+        else:
+            self.labels = None
+
+        # 每笔交易对应的两条流水, 对手为同一笔交易的另一方
+        pairs = np.arange(2 * num_rows) ^ 1
+        self.base_time = int(times.min()) if num_rows else 0
+        relative = _interleave(times, times) - self.base_time
+        self.span = int(relative.max(initial=0)) + 1 + 2 * MAX_WINDOW
+        if self.num_accounts * self.span * 2 >= 2 ** 63:
+            raise ValueError("账户数与时间跨度过大, 排序键会溢出")
+
+        self.key = accounts * self.span + relative
+        order = np.argsort(self.key, kind='stable')
+        self.key = self.key[order]
+        self.account = accounts[order]
+        self.time = relative[order]
+        self.outgoing = (order & 1) == 0
+        self.amount = _interleave(amounts, amounts)[order]
+        self.balance = _interleave(_cents_column(transactions['sender_card_balance_new'], cents),
+                                   _cents_column(transactions['receiver_card_balance_new'], cents))[order]
+        self.counterparty = accounts[pairs[order]]
+
+        # 每个账户的第一条流水(账户按编码顺序排列, 每个账户至少一条)和每条流水所在账户的起始位置
+        self.first = np.flatnonzero(np.r_[True, self.account[1:] != self.account[:-1]]) if len(order) else order
+        self.start = self.first[self.account]
+        # 账户 -> 持有人编码
+        self.account_owner = owners[order[self.first]]
+        owner, counterparty_owner = self.account_owner[self.account], self.account_owner[self.counterparty]
+
+        if corporate_ids is None:
+            self.corporate = np.ones(len(order), dtype=bool)
+            self.private_counterparty = np.ones(len(order), dtype=bool)
+            self.corporate_counterparty = np.ones(len(order), dtype=bool)
+        else:
+            corporate = pd.Index(self.owner_ids).isin(list(corporate_ids))
+            self.corporate = corporate[owner]
+            self.corporate_counterparty = corporate[counterparty_owner]
+            self.private_counterparty = ~self.corporate_counterparty
+
+        if customer_types is None:
+            self.keyword = np.ones(len(order), dtype=bool)
+        else:
+            types = pd.Series(customer_types).reindex(self.owner_ids).fillna('').astype(str)
+            pattern = '|'.join(re.escape(keyword) for keyword in keywords)
+            matched = types.str.contains(pattern).to_numpy(dtype=bool) if keywords else np.zeros(len(types), bool)
+            self.keyword = matched[owner]
+
+        # 开户地: 人员的省份, 不在人员表中的客户(如对公客户)记为 -1, 不参与比较
+        self.provinces = None
+        if persons is not None:
+            codes, _ = pd.factorize(persons['address'])
+            provinces = pd.Series(codes, index=persons['person_id'].astype(str))
+            self.provinces = provinces.reindex(pd.Index(self.owner_ids).astype(str)).fillna(-1).to_numpy(np.int64)
+
+        # 流水所在的日期(距 1970-01-01 的天数)
+        self.day = (self.time + self.base_time) // SECONDS_PER_DAY
+
+        self._distinct_cache = {}
+
+    def _flag(self, hit):
+        """逐条流水的条件 -> 账户是否至少有一条满足"""
+        flags = np.zeros(self.num_accounts, dtype=bool)
+        flags[self.account[hit]] = True
+        return flags
+
+    def _window_start(self, window):
+        """每条流水的时间窗 (t - window, t] 在本账户内的起始位置"""
+        if window > MAX_WINDOW:
+            raise ValueError(f"时间窗不能超过 {MAX_WINDOW // SECONDS_PER_DAY} 天")
+        return np.maximum(np.searchsorted(self.key, self.key - window + 1, side='left'), self.start)
+
+    def _flows(self, window):
+        """时间窗内的转入笔数、转出笔数、转入金额、转出金额"""
+        start = self._window_start(window)
+        incoming = ~self.outgoing
+        return (_window_sum(incoming, start), _window_sum(self.outgoing, start),
+                _window_sum(np.where(incoming, self.amount, 0), start),
+                _window_sum(np.where(self.outgoing, self.amount, 0), start))
+
+    def _distinct_counterparties(self, window):
+        """
+        每条流水的时间窗 (t - window, t] 内不同的对私对手账户数
+
+        每个 (账户, 对手) 出现时 +1，到 window 之后或同一对手再次出现时 -1；
+        事件按 (账户, 时间, 先 -1 后 +1) 排序后的累加和就是当时窗内的对手数，每个账户的事件合计为 0
+        """
+        if window in self._distinct_cache:
+            return self._distinct_cache[window]
+        index = np.flatnonzero(self.private_counterparty)
+        account, time = self.account[index], self.time[index]
+
+        # 同一 (账户, 对手) 的下一次出现时间; 流水在账户内已按时间排序, 稳定排序后同一对手按时间排列
+        pair = account * self.num_accounts + self.counterparty[index]
+        order = np.argsort(pair, kind='stable')
+        expire = time + window
+        repeated = pair[order][1:] == pair[order][:-1]
+        expire[order[:-1][repeated]] = np.minimum(expire[order[:-1][repeated]], time[order[1:][repeated]])
+
+        base = account * self.span
+        keys = np.concatenate([(base + expire) * 2, (base + time) * 2 + 1])
+        deltas = np.concatenate([np.full(len(index), -1, dtype=np.int64), np.ones(len(index), dtype=np.int64)])
+        order = np.argsort(keys, kind='stable')
+        keys, counts = keys[order], np.cumsum(deltas[order])
+
+        position = np.searchsorted(keys, self.key * 2 + 1, side='right') - 1
+        result = np.where(position >= 0, counts[np.maximum(position, 0)], 0)
+        self._distinct_cache[window] = result
+        return result
+
+    def detect_daily_open_account_and_outflow(self, account_threshold=10, outflow_threshold=100000):
+        """
+        模式1: 同一客户当天开户数大于X个且当天汇出金额累计大于X元; 账户的第一条流水所在日视为开户日,
+        标记当天新开的账户
+        """
+        first_day = self.day[self.first]
+        low_day = first_day.min(initial=0)
+        num_days = int(self.day.max(initial=0) - low_day) + 1
+        keys, inverse, counts = np.unique(self.account_owner * num_days + (first_day - low_day),
+                                          return_inverse=True, return_counts=True)
+        candidate = counts > account_threshold
+        if not candidate.any():
+            return np.zeros(self.num_accounts, dtype=bool)
+
+        # 候选 (客户, 日) 当天所有账户的转出合计
+        out = np.flatnonzero(self.outgoing)
+        out_keys = self.account_owner[self.account[out]] * num_days + (self.day[out] - low_day)
+        position = np.minimum(np.searchsorted(keys, out_keys), len(keys) - 1)
+        hit = (keys[position] == out_keys) & candidate[position]
+        totals = np.bincount(position[hit], self.amount[out][hit], minlength=len(keys))
+        return (candidate & (totals > to_cents(outflow_threshold)))[inverse]
+
+    def detect_short_term_private_transactions(self, num_days=10, account_threshold=10):
+        """模式2: 对公账户 num_days 天内的交易对手均为对私账户，且不同的对私账户数大于X户"""
+        window = num_days * SECONDS_PER_DAY
+        private = self._distinct_counterparties(window)
+        corporate = _window_sum(self.corporate_counterparty & ~self.private_counterparty,
+                                self._window_start(window))
+        return self._flag(self.corporate & (private > account_threshold) & (corporate == 0))
+
+    def detect_incoming_and_outgoing_transactions(self, transaction_threshold=20, days_threshold=2, num_days=10):
+        """
+        模式3: 对公账户在最晚一笔转入前 num_days 天内收到对公账户转入>=X笔，且转出日期-最晚转入日期<=Y天
+        """
+        incoming = ~self.outgoing & self.corporate_counterparty
+        counts = _window_sum(incoming, self._window_start(num_days * SECONDS_PER_DAY))
+        # 每条流水之前(含)本账户最近一笔转入的位置
+        last = np.maximum.accumulate(np.where(incoming, np.arange(len(incoming)), -1))
+        valid = self.outgoing & self.corporate & (last >= self.start)
+        last = np.where(valid, last, 0)
+        hit = valid & (counts[last] >= transaction_threshold) & (self.day - self.day[last] <= days_threshold)
+        return self._flag(hit)
+
+    def detect_location_mismatch(self, num_days=30, min_transactions=3):
+        """
+        模式4: 交易地区(对手的省份)与开户地(本人的省份)不一致; num_days 天内至少 min_transactions 笔
+        且全部不一致时标记。需要人员表
+        """
+        if self.provinces is None:
+            raise ValueError("模式4 需要人员表(person_id / address)")
+        own = self.provinces[self.account_owner[self.account]]
+        other = self.provinces[self.account_owner[self.counterparty]]
+        # 只在双方省份都已知的流水中计数, 与对公客户(省份为 -1)的交易不影响判定
+        known = (own >= 0) & (other >= 0)
+        start = self._window_start(num_days * SECONDS_PER_DAY)
+        total = _window_sum(known, start)
+        return self._flag((total >= min_transactions) & (_window_sum(known & (own != other), start) == total))
+
+    def detect_new_account_activity(self, transaction_threshold=30, amount_threshold=500000, half_days=15):
+        """
+        模式5: 新账户开卡(第一条流水)后前后 half_days 天对比，后一段交易数量和金额都更多，
+        且后一段笔数>=X、金额>=X元
+        """
+        period = (self.time - self.time[self.start]) // (half_days * SECONDS_PER_DAY)
+        counts, amounts = [], []
+        for half in (0, 1):
+            accounts = self.account[period == half]
+            counts.append(np.bincount(accounts, minlength=self.num_accounts))
+            amounts.append(np.bincount(accounts, self.amount[period == half], minlength=self.num_accounts))
+        return ((counts[1] > counts[0]) & (amounts[1] > amounts[0]) & (counts[1] >= transaction_threshold) &
+                (amounts[1] >= to_cents(amount_threshold)))
+
+    def detect_online_bank_low_balance(self, inflow_outflow_ratio=(0.9, 1.1), inflow_threshold=200000,
+                                       balance_threshold=100, num_days=7):
+        """模式6: 余额<=100元，num_days 天内转入>=X元且转入转出之比接近 1 (交易表不含渠道, 不区分网银和柜面)"""
+        _, _, inflow, outflow = self._flows(num_days * SECONDS_PER_DAY)
+        hit = ((self.balance <= to_cents(balance_threshold)) & (inflow >= to_cents(inflow_threshold)) &
+               _ratio_within(inflow, outflow, inflow_outflow_ratio))
+        return self._flag(hit)
+
+    def detect_frequent_small_inflows(self, interval_spread=3, backtracking_period=60, base_amount=10000,
+                                      min_inflows=4):
+        """
+        模式7: 回溯期内同一金额(万元整数倍)连续入账至少 min_inflows 次，相邻间隔的最大最小差<=3天
+        """
+        unit = to_cents(base_amount)
+        index = np.flatnonzero(~self.outgoing & (self.amount > 0) & (self.amount % unit == 0))
+        # 按 (账户, 金额) 分组, 组内保持时间顺序
+        index = index[np.lexsort((self.amount[index], self.account[index]))]
+        width = min_inflows - 1
+        if len(index) <= width or width < 1:
+            return np.zeros(self.num_accounts, dtype=bool)
+
+        account, amount, day = self.account[index], self.amount[index], self.day[index]
+        intervals = np.diff(day)
+        broken = (account[1:] != account[:-1]) | (amount[1:] != amount[:-1])
+        windows = np.lib.stride_tricks.sliding_window_view(intervals, width)
+        valid = _window_sum(broken, np.maximum(np.arange(len(broken)) - width + 1, 0))[width - 1:] == 0
+        hit = (valid & (windows.max(axis=1) - windows.min(axis=1) <= interval_spread) &
+               (windows.sum(axis=1) <= backtracking_period))
+        flags = np.zeros(self.num_accounts, dtype=bool)
+        flags[account[:len(hit)][hit]] = True
+        return flags
+
+    def detect_keyword_related_outflows(self, inflow_outflow_ratio=(0.9, 1.1), inflow_threshold=500000,
+                                        count_ratio=5, private_count=10, num_days=15):
+        """
+        模式8: 带关键字的对公客户 num_days 天内转入笔数/转出笔数>=5，转入>=X元，转入转出之比接近 1，
+        不同的对私对手>=10户
+        """
+        window = num_days * SECONDS_PER_DAY
+        in_count, out_count, inflow, outflow = self._flows(window)
+        hit = (self.corporate & self.keyword & self.outgoing & (in_count >= count_ratio * out_count) &
+               (inflow >= to_cents(inflow_threshold)) & _ratio_within(inflow, outflow, inflow_outflow_ratio) &
+               (self._distinct_counterparties(window) >= private_count))
+        return self._flag(hit)
+
+    def detect_low_balance_large_inflow_outflow(self, inflow_outflow_ratio=(0.9, 1.1), inflow_threshold=200000,
+                                                balance_threshold=1000, transaction_threshold=10, num_days=15):
+        """模式9: 带关键字的客户余额<=1000元，num_days 天内转入>=X元、转入转出之比接近 1、交易>=10笔"""
+        in_count, out_count, inflow, outflow = self._flows(num_days * SECONDS_PER_DAY)
+        hit = (self.keyword & (self.balance <= to_cents(balance_threshold)) &
+               (inflow >= to_cents(inflow_threshold)) & _ratio_within(inflow, outflow, inflow_outflow_ratio) &
+               (in_count + out_count >= transaction_threshold))
+        return self._flag(hit)
+
+    def detect_outflow_dominant_transactions(self, inflow_outflow_ratio=(0.9, 1.1), inflow_threshold=200000,
+                                             count_ratio=5, private_count=10, num_days=15):
+        """
+        模式10: 带关键字的对公客户 num_days 天内转出笔数/转入笔数>=5，转入>=X元，转入转出之比接近 1，
+        不同的对私对手>=10户
+        """
+        window = num_days * SECONDS_PER_DAY
+        in_count, out_count, inflow, outflow = self._flows(window)
+        hit = (self.corporate & self.keyword & self.outgoing & (in_count > 0) &
+               (out_count >= count_ratio * in_count) & (inflow >= to_cents(inflow_threshold)) &
+               _ratio_within(inflow, outflow, inflow_outflow_ratio) &
+               (self._distinct_counterparties(window) >= private_count))
+        return self._flag(hit)
+
+    def detect(self, typologies=None, thresholds=None):
+        """
+        检测多条规则
+
+        Args:
+            typologies (list, optional): 规则名称, 默认 RULE_TYPOLOGIES 全部(没有人员表时跳过 location_mismatch)
+            thresholds (dict, optional): 规则名称 -> 传给对应 detect_<规则> 的阈值参数
+
+        Returns:
+            pd.DataFrame: 每个账户一行: account / owner_id 和每条规则一列布尔标记
+        """
+        if typologies is None:
+            typologies = [name for name in RULE_TYPOLOGIES
+                          if name != "location_mismatch" or self.provinces is not None]
+        thresholds = thresholds or {}
+        flags = pd.DataFrame({'account': self.account_numbers, 'owner_id': self.owner_ids[self.account_owner]})
+        for typology in typologies:
+            if typology not in RULE_TYPOLOGIES:
+                raise ValueError(f"未知的异常规则: {typology}")
+            flags[typology] = getattr(self, f"detect_{typology}")(**thresholds.get(typology, {}))
+        return flags
+
+    def evaluate(self, flags):
+        """
+        用交易表中的标注检验检测结果: 案例的主体账户至少有一个被该规则标记即算检出(召回)，
+        被标记的账户中属于该规则案例主体的比例为精确率
+
+        Args:
+            flags (pd.DataFrame): detect 的输出
+
+        Returns:
+            pd.DataFrame: 每条规则一行: cases / detected / recall / flagged / true_flagged / precision
+        """
+        if self.labels is None:
+            raise ValueError("交易表没有 typology / case_id 标注")
+        rows = []
+        for typology in [name for name in RULE_TYPOLOGIES if name in flags.columns]:
+            flagged = flags[typology].to_numpy(dtype=bool)
+            labels = self.labels[self.labels['typology'] == typology]
+            detected = labels.assign(hit=flagged[labels['subject'].to_numpy()]).groupby('case_id')['hit'].any()
+            subjects = np.zeros(self.num_accounts, dtype=bool)
+            subjects[labels['subject'].to_numpy()] = True
+            true_flagged = int((flagged & subjects).sum())
+            rows.append({
+                'typology': typology,
+                'cases': len(detected),
+                'detected': int(detected.sum()),
+                'recall': detected.mean() if len(detected) else np.nan,
+                'flagged': int(flagged.sum()),
+                'true_flagged': true_flagged,
+                'precision': true_flagged / flagged.sum() if flagged.any() else np.nan,
+            })
+        return pd.DataFrame(rows).set_index('typology')
+
+
+# 检测用到的列; 账户和人员编号读成分类类型, 避免整列 Python 字符串对象
+READ_COLUMNS = ['sender_id', 'sender_card_number', 'sender_card_balance_new', 'receiver_id',
+                'receiver_card_number', 'receiver_card_balance_new', 'amount', 'timestamp',
+                'transaction_type', 'typology', 'case_id']
+CATEGORY_COLUMNS = ['sender_id', 'sender_card_number', 'receiver_id', 'receiver_card_number',
+                    'transaction_type', 'typology']
+
+
+def _read_parquet(path):
+    """读取 Parquet 文件或分区目录: 只取检测用到的列, 十进制金额转为 float64, 字符串列字典编码"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(path) if not os.path.isdir(path) else pq.ParquetDataset(path).schema
+    table = pq.read_table(path, columns=[name for name in READ_COLUMNS if name in schema.names])
+    for name in table.column_names:
+        column = table[name]
+        if pa.types.is_decimal(column.type):
+            column = pc.cast(column, pa.float64())
+        elif name in CATEGORY_COLUMNS and not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        table = table.set_column(table.schema.get_field_index(name), name, column)
+    return table.to_pandas()
+
+
+def read_transactions(paths):
+    """读取一个或多个交易文件(csv / parquet), 按给出的顺序拼接"""
+    frames = []
+    for path in paths:
+        if path.endswith('.parquet') or os.path.isdir(path):
+            frames.append(_read_parquet(path))
+        else:
+            frames.append(pd.read_csv(path, usecols=lambda name: name in READ_COLUMNS,
+                                      dtype={name: 'category' for name in CATEGORY_COLUMNS}))
+    if len(frames) == 1:
+        return frames[0]
+    # 各文件的分类取值不同, 拼接前统一为同一组取值
+    for name in CATEGORY_COLUMNS:
+        if all(name in frame.columns for frame in frames):
+            combined = union_categoricals([frame[name] for frame in frames]).categories
+            for frame in frames:
+                frame[name] = frame[name].cat.set_categories(combined)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在整张交易表上批量检测十条异常规则, 并与生成器的标注对照")
+    parser.add_argument("transactions", nargs="+", help="交易文件(csv / parquet, 或 Parquet 分区目录)")
+    parser.add_argument("--persons", default=None, help="人员表(csv / parquet), 用于模式4 的开户地")
+    parser.add_argument("--companies", default=None,
+                        help="公司表(csv / parquet), 其中的 company_id 作为对公客户, 用于对公交易对手相关的条件")
+    parser.add_argument("--cents", action="store_true", help="金额列为 int64 分(--money cents 导出)")
+    parser.add_argument("--flags-output", default=None, help="账户标记结果输出文件(.csv)")
+    args = parser.parse_args()
+
+    transactions = read_transactions(args.transactions)
+    persons = None
+    if args.persons:
+        persons = (pd.read_parquet(args.persons) if args.persons.endswith('.parquet')
+                   else pd.read_csv(args.persons, dtype={'person_id': str}))
+    corporate_ids = None
+    if args.companies:
+        companies = (pd.read_parquet(args.companies, columns=['company_id']) if args.companies.endswith('.parquet')
+                     else pd.read_csv(args.companies, usecols=['company_id'], dtype=str))
+        corporate_ids = companies['company_id']
+    detector = RuleDetector(transactions, persons=persons, corporate_ids=corporate_ids, cents=args.cents)
+    flags = detector.detect()
+    print(flags[[name for name in RULE_TYPOLOGIES if name in flags.columns]].sum().to_string())
+    if detector.labels is not None:
+        print(detector.evaluate(flags).to_string())
+    if args.flags_output:
+        flags.to_csv(args.flags_output, index=False, encoding='utf-8-sig')
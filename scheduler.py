@@ -0,0 +1,168 @@
+import numpy as np
+
+"""
+    交易计划调度
+    用别名法(Walker / Vose)一次抽出全部循环的 (模式, 发送方, 接收方, 群组人数)，
+    再按模式分组整批交给对应的生成函数
+"""
+
+
+class AliasTable:
+    """
+    别名表: O(n) 预处理后，每次加权抽样只需一个均匀整数和一个均匀浮点数
+    """
+
+    def __init__(self, weights):
+        """
+        Args:
+            weights (array-like): 非负权重, 不要求归一化
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or len(weights) == 0 or weights.min() < 0 or weights.sum() <= 0:
+            raise ValueError(f"权重无效: {weights.tolist()}")
+
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        self.prob = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, size, rng):
+        """
+        Args:
+            size (int): 样本数
+            rng (np.random.Generator): 随机数生成器
+
+        Returns:
+            np.ndarray: 下标(int64)
+        """
+        column = rng.integers(len(self.prob), size=size)
+        return np.where(rng.random(size) < self.prob[column], column, self.alias[column])
+
+
+def distinct_members(num_people, sizes, rng):
+    """
+    为每个群组不放回地抽取成员
+
+    先整表有放回地抽取，再只对出现重复成员的群组重抽；人数很少、重复概率高时改为逐组抽取
+
+    Args:
+        num_people (int): 总人数
+        sizes (np.ndarray): 每个群组的人数(不超过 num_people)
+        rng (np.random.Generator): 随机数生成器
+
+    Returns:
+        tuple: (members, offsets) 第 g 组成员为 members[offsets[g]:offsets[g + 1]]
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    if len(sizes) == 0:
+        return np.empty(0, dtype=np.int64), offsets
+
+    width = int(sizes.max())
+    if num_people < 4 * width:
+        members = [rng.choice(num_people, size=size, replace=False) for size in sizes.tolist()]
+        return np.concatenate(members).astype(np.int64), offsets
+
+    # 超出群组人数的位置填入互不相同的负数，排序后比较相邻元素即可发现重复
+    padding = -1 - np.arange(width)
+    valid = np.arange(width) < sizes[:, None]
+    table = np.where(valid, rng.integers(num_people, size=(len(sizes), width)), padding)
+    redraw = np.arange(len(sizes))
+    while len(redraw):
+        ordered = np.sort(table[redraw], axis=1)
+        redraw = redraw[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)]
+        table[redraw] = np.where(valid[redraw], rng.integers(num_people, size=(len(redraw), width)),
+                                 padding)
+    return table[valid], offsets
+
+
+class PatternScheduler:
+    """
+    交易模式调度器: 按权重用别名法抽取模式，发送方、接收方和群组人数也整列抽取
+    """
+
+    def __init__(self, patterns, weights, group_patterns=("aa_payment",), group_size=(3, 10)):
+        """
+        Args:
+            patterns (list): 模式名称
+            weights (list): 模式权重
+            group_patterns (tuple): 多人参与(需要群组人数)的模式
+            group_size (tuple): 群组人数范围(含两端)
+        """
+        self.patterns = list(patterns)
+        self.alias = AliasTable(weights)
+        self.group_codes = np.array([self.patterns.index(name) for name in group_patterns], dtype=np.int64)
+        self.group_size = group_size
+
+    def draw(self, num, num_people, rng, graph=None):
+        """
+        抽出 num 次循环的完整计划
+
+        未给出交易对手图时，接收方从其余 num_people - 1 人中抽取，抽到的下标不小于发送方时加一，
+        因此不会出现自己转给自己，也不需要重抽；给出图时接收方从发送方的对手中抽取(图中无自环)
+
+        Args:
+            num (int): 循环次数
+            num_people (int): 参与人数(至少 2 人)
+            rng (np.random.Generator): 随机数生成器
+            graph (CounterpartyGraph, optional): 交易对手图, 节点为人员下标
+
+        Returns:
+            dict: pattern / sender / receiver / group_size 四列, 非群组模式的 group_size 为 0
+        """
+        if num_people < 2:
+            raise ValueError("至少需要 2 个交易人员")
+
+        pattern = self.alias.sample(num, rng)
+        sender = rng.integers(num_people, size=num)
+        if graph is None:
+            receiver = rng.integers(num_people - 1, size=num)
+            receiver += receiver >= sender
+        else:
+            if graph.num_nodes != num_people:
+                raise ValueError(f"交易对手图节点数 {graph.num_nodes} 与人数 {num_people} 不一致")
+            receiver = graph.sample_neighbors(sender, rng)
+
+        group_size = np.zeros(num, dtype=np.int64)
+        grouped = np.isin(pattern, self.group_codes)
+        low, high = self.group_size
+        group_size[grouped] = np.minimum(rng.integers(low, high + 1, np.count_nonzero(grouped)), num_people)
+
+        return {
+            'pattern': pattern,
+            'sender': sender,
+            'receiver': receiver,
+            'group_size': group_size,
+        }
+
+    def batches(self, plan, handlers):
+        """
+        按处理函数把计划分组: 共用同一处理函数的模式合成一批
+
+        Args:
+            plan (dict): draw 的输出
+            handlers (dict): 模式名称 -> 处理函数
+
+        Yields:
+            tuple: (处理函数, 该批的循环序号数组)
+        """
+        order = {}
+        for code, name in enumerate(self.patterns):
+            order.setdefault(handlers[name], []).append(code)
+        for handler, codes in order.items():
+            iterations = np.flatnonzero(np.isin(plan['pattern'], codes))
+            if len(iterations):
+                yield handler, iterations
@@ -0,0 +1,32 @@
+import numpy as np
+
+"""
+    随机数来源
+    所有生成器都从注入的 np.random.Generator 取随机数，
+    不再使用全局 random / np.random，同一种子的运行结果可以复现，多进程时也互不干扰
+"""
+
+# 未注入随机数生成器时，模块级函数使用的共享生成器
+DEFAULT_RNG = np.random.default_rng()
+
+
+def make_rng(seed=None):
+    """
+    构造随机数生成器
+
+    Args:
+        seed (None | int | np.random.SeedSequence | np.random.Generator): 已是 Generator 时原样返回
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def randint(rng, a, b):
+    """[a, b] 内的随机整数(含两端), 对应 random.randint"""
+    return int(rng.integers(a, b + 1))
+
+
+def pick(rng, seq):
+    """从序列中等概率取一个元素, 对应 random.choice"""
+    return seq[int(rng.integers(len(seq)))]
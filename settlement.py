@@ -0,0 +1,327 @@
+import glob
+import os
+
+import numpy as np
+
+from population_store import open_population
+from transaction_sink import TransactionSink, open_sink
+
+"""
+    跨分片结算
+    挂载同一个人口库的分片可以把一部分正常转账付给其他分片的人员。分片进程只在本地结算付款方
+    (付款卡都属于本分片), 收款卡属于其他分片时本地算出的收款余额不可信; 每个分片把结算后的
+    逐笔交易记入日志, 并把付给其他分片的入账按收款分片分别写成一批。
+    全部分片生成完之后分两步结算, 每步各分片互不依赖, 可以并行、不需要全局锁:
+    1. settle_shard: 每个分片收集其他分片发来的入账, 与本分片日志中的交易一起按
+       (卡, 时间戳, 分片, 行号) 重新累加余额链, 得到本分片各笔交易的余额, 以及发来的入账的收款余额
+    2. finalize_shard: 每个分片读取暂存的交易, 改写付款余额和收款余额后写出最终输出
+    付款方是否余额不足仍按分片内的判断: 其他分片发来的只有入账, 只会使真实余额更高
+"""
+
+
+def _spool_paths(directory, shard):
+    return sorted(glob.glob(os.path.join(directory, f"spool-{shard:05d}-*.npz")))
+
+
+def _journal_path(directory, shard):
+    return os.path.join(directory, f"journal-{shard:05d}.npz")
+
+
+def _credits_path(directory, sender, receiver):
+    return os.path.join(directory, f"credits-{sender:05d}-to-{receiver:05d}.npz")
+
+
+def _settled_path(directory, shard):
+    return os.path.join(directory, f"settled-{shard:05d}.npz")
+
+
+def _patch_path(directory, sender, receiver):
+    return os.path.join(directory, f"patch-{sender:05d}-from-{receiver:05d}.npz")
+
+
+class SpoolSink(TransactionSink):
+    """
+    分片的暂存输出: 每批按内部列(金额为分、时间戳为秒)保存为一个 .npz, 结算后再写出最终格式
+    """
+
+    stage_name = "spool"
+    bytes_counter = "bytes_spooled"
+
+    def __init__(self, directory, shard, **kwargs):
+        """
+        Args:
+            directory (str): 暂存目录
+            shard (int): 分片序号
+        """
+        super().__init__(directory, **kwargs)
+        self.directory = directory
+        self.shard = shard
+        self._bytes = 0
+
+    def _write(self, columns):
+        path = os.path.join(self.directory, f"spool-{self.shard:05d}-{self.batches:06d}.npz")
+        # 字符串列转为定长 Unicode 数组, 读回时不需要 pickle
+        np.savez(path, **{name: values.astype(str) if values.dtype == object else values
+                          for name, values in columns.items()})
+        self._bytes += os.path.getsize(path)
+
+    @property
+    def bytes_written(self):
+        return self._bytes
+
+
+def read_spool(directory, shard):
+    """
+    按写出顺序逐批读回暂存的交易
+
+    Yields:
+        dict: 列名到数组的映射, 字符串列为 object 数组
+    """
+    for path in _spool_paths(directory, shard):
+        with np.load(path) as data:
+            yield {name: data[name].astype(object) if data[name].dtype.kind == 'U' else data[name]
+                   for name in data.files}
+
+
+class CrossShardRouter:
+    """
+    分片的跨分片路由: 生成时把一部分正常转账改投其他分片人员的卡, 结算时记录每笔交易的卡下标,
+    结束后写出本分片的日志和按收款分片分组的入账
+    """
+
+    def __init__(self, store, shard, bounds, fraction):
+        """
+        Args:
+            store (PopulationStore): 各分片共用的人口库
+            shard (int): 本分片序号
+            bounds (list): 各分片人员下标的边界, 分片 k 负责 [bounds[k], bounds[k + 1])
+            fraction (float): 正常转账(不含AA制)中收款人改为其他分片人员的比例
+        """
+        self.shard = shard
+        self.bounds = np.asarray(bounds, dtype=np.int64)
+        self.fraction = fraction
+        self.num_cards = store.num_cards
+        self.person_index = store.array('person_index')
+        if np.any(np.diff(self.person_index) <= 0):
+            raise ValueError("人口库中人员的持有人下标须严格递增")
+        self.owners = store.array('ledger_owners')
+        self.indptr = store.array('ledger_indptr')
+        self.cards = store.array('ledger_cards')
+        self.stored_balances = store.array('ledger_balances')
+        self._parts = []
+        # 结算开始前与人口库不同的期初余额(卡下标, 余额)
+        self._opening = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    def card_shards(self, cards):
+        """
+        卡下标 -> 所属分片; 人口库之外的卡(本分片新开的对公账户等)属于本分片
+        """
+        cards = np.asarray(cards, dtype=np.int64)
+        shards = np.full(len(cards), self.shard, dtype=np.int64)
+        stored = cards < self.num_cards
+        positions = np.searchsorted(self.person_index, self.owners[cards[stored]])
+        shards[stored] = np.searchsorted(self.bounds, positions, side='right') - 1
+        return shards
+
+    def redirect(self, rows, rng):
+        """
+        把一部分正常转账的收款卡改为其他分片随机人员的卡(原地修改 rows)
+
+        Args:
+            rows (dict): 逐笔交易数组, 带 group_id 列时AA制交易不改
+            rng (np.random.Generator): 随机数生成器
+        """
+        if self.fraction <= 0:
+            return rows
+        start, stop = self.bounds[self.shard], self.bounds[self.shard + 1]
+        others = len(self.person_index) - (stop - start)
+        if others <= 0:
+            return rows
+        candidates = (np.flatnonzero(rows["group_id"] < 0) if "group_id" in rows
+                      else np.arange(len(rows["receiver_card"])))
+        chosen = candidates[rng.random(len(candidates)) < self.fraction]
+        # 在其他分片的人员中均匀抽取, 再从其名下的卡中随机选一张
+        positions = rng.integers(others, size=len(chosen))
+        positions += (positions >= start) * (stop - start)
+        owners = np.asarray(self.person_index[positions])
+        first = self.indptr[owners]
+        counts = self.indptr[owners + 1] - first
+        rows["receiver_card"][chosen] = self.cards[first + (rng.random(len(chosen)) * counts).astype(np.int64)]
+        return rows
+
+    def record_opening(self, balances):
+        """
+        记下第一笔交易结算之前账本中与人口库不同的余额(如合成异常案例时为付款卡补足的余额),
+        重算余额链时以此为期初余额
+
+        Args:
+            balances (np.ndarray): 本分片账本的余额(分)
+        """
+        stored = np.asarray(balances[:self.num_cards])
+        changed = np.flatnonzero(stored != self.stored_balances)
+        self._opening = (changed, stored[changed])
+
+    def record(self, sender_cards, receiver_cards, amounts, timestamps):
+        """按输出顺序记录一批已结算的交易"""
+        self._parts.append((np.asarray(sender_cards, dtype=np.int64), np.asarray(receiver_cards, dtype=np.int64),
+                            np.asarray(amounts, dtype=np.int64), np.asarray(timestamps, dtype=np.int64)))
+
+    def save(self, directory):
+        """
+        写出本分片的日志和付给其他分片的入账(每个收款分片一个文件)
+
+        Returns:
+            int: 付给其他分片的交易笔数
+        """
+        if self._parts:
+            sender, receiver, amount, timestamp = (np.concatenate(column) for column in zip(*self._parts))
+        else:
+            sender, receiver, amount, timestamp = (np.empty(0, dtype=np.int64) for _ in range(4))
+        self._parts = []
+        np.savez(_journal_path(directory, self.shard), sender_card=sender, receiver_card=receiver, amount=amount,
+                 timestamp=timestamp, opening_card=self._opening[0], opening_balance=self._opening[1])
+
+        shards = self.card_shards(receiver)
+        outgoing = np.flatnonzero(shards != self.shard)
+        order = outgoing[np.argsort(shards[outgoing], kind='stable')]
+        targets, starts = np.unique(shards[order], return_index=True)
+        for target, rows in zip(targets.tolist(), np.split(order, starts[1:])):
+            np.savez(_credits_path(directory, self.shard, target), row=rows, card=receiver[rows],
+                     amount=amount[rows], timestamp=timestamp[rows])
+        return len(outgoing)
+
+
+def _chain_balances(opening, cards, deltas, keys):
+    """
+    按卡分组、组内按 keys 排序后累加, 返回每条分录发生前的余额
+
+    Args:
+        opening (np.ndarray): 各卡的期初余额(按卡下标)
+        cards (np.ndarray): 每条分录的卡下标
+        deltas (np.ndarray): 每条分录的金额变动(分)
+        keys (tuple): 组内的排序键, 先主后次
+    """
+    order = np.lexsort(tuple(reversed(keys)) + (cards,))
+    sorted_cards, sorted_deltas = cards[order], deltas[order]
+    before = np.cumsum(sorted_deltas) - sorted_deltas
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_cards[1:] != sorted_cards[:-1]
+    segment = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    balances = np.empty(len(order), dtype=np.int64)
+    balances[order] = opening[sorted_cards] + before - before[segment]
+    return balances
+
+
+def settle_shard(directory, population, shard, bounds):
+    """
+    结算一个分片名下的卡: 合并本分片日志和其他分片发来的入账, 按 (时间戳, 分片, 行号) 重算余额链
+
+    Args:
+        directory (str): 暂存目录
+        population (str): 人口库目录
+        shard (int): 分片序号
+        bounds (list): 各分片人员下标的边界
+
+    Returns:
+        int: 收到的其他分片入账笔数
+    """
+    store = open_population(population)
+    router = CrossShardRouter(store, shard, bounds, 0.0)
+    num_cards = store.num_cards
+    # 写时复制挂载, 下面按本分片记录的期初余额改写不影响人口库
+    opening = store.array('ledger_balances', mode='c')
+    card_types = store.metadata['card_types']
+    current_code = card_types.index('C') if 'C' in card_types else -1
+    type_codes = store.array('ledger_type_codes')
+
+    with np.load(_journal_path(directory, shard)) as journal:
+        sender, receiver = journal['sender_card'], journal['receiver_card']
+        amount, timestamp = journal['amount'], journal['timestamp']
+        opening[journal['opening_card']] = journal['opening_balance']
+    rows = np.arange(len(amount))
+    # 只重算人口库中属于本分片的卡, 本分片新开的卡不会收到其他分片的入账, 分片内的余额已经正确
+    sender_mask = (sender < num_cards) & (router.card_shards(sender) == shard)
+    receiver_mask = (receiver < num_cards) & (router.card_shards(receiver) == shard)
+
+    incoming = []
+    for path in sorted(glob.glob(os.path.join(directory, f"credits-*-to-{shard:05d}.npz"))):
+        source = int(os.path.basename(path).split('-')[1])
+        with np.load(path) as data:
+            incoming.append((source, data['row'], data['card'], data['amount'], data['timestamp']))
+    sources = [np.full(len(part[1]), part[0], dtype=np.int64) for part in incoming]
+
+    # 分录: 本分片交易的付款、本分片收款卡的入账、其他分片发来的入账; 同一笔交易先付款后入账
+    cards = np.concatenate([sender[sender_mask], receiver[receiver_mask]] + [part[2] for part in incoming])
+    deltas = np.concatenate([-amount[sender_mask], amount[receiver_mask]] + [part[3] for part in incoming])
+    times = np.concatenate([timestamp[sender_mask], timestamp[receiver_mask]] + [part[4] for part in incoming])
+    shards = np.concatenate([np.full(np.count_nonzero(sender_mask) + np.count_nonzero(receiver_mask), shard,
+                                     dtype=np.int64)] + sources)
+    positions = np.concatenate([rows[sender_mask], rows[receiver_mask]] + [part[1] for part in incoming])
+    sides = np.concatenate([np.zeros(np.count_nonzero(sender_mask), dtype=np.int64),
+                            np.ones(len(cards) - np.count_nonzero(sender_mask), dtype=np.int64)])
+    balances = _chain_balances(opening, cards, deltas, (times, shards, positions, sides))
+
+    # 收款卡非 'C' 类时不展示余额
+    current = type_codes[cards] == current_code
+    count_sender = np.count_nonzero(sender_mask)
+    count_receiver = np.count_nonzero(receiver_mask)
+    sender_old = np.zeros(len(amount), dtype=np.int64)
+    sender_old[sender_mask] = balances[:count_sender]
+    receiver_old = np.zeros(len(amount), dtype=np.int64)
+    receiver_new = np.zeros(len(amount), dtype=np.int64)
+    local = slice(count_sender, count_sender + count_receiver)
+    receiver_old[receiver_mask] = np.where(current[local], balances[local], 0)
+    receiver_new[receiver_mask] = np.where(current[local], balances[local] + deltas[local], 0)
+    np.savez(_settled_path(directory, shard), sender_mask=sender_mask, sender_old=sender_old,
+             sender_new=sender_old - amount, receiver_mask=receiver_mask, receiver_old=receiver_old,
+             receiver_new=receiver_new)
+
+    offset = count_sender + count_receiver
+    for source, source_rows, _, credit, _ in incoming:
+        part = slice(offset, offset + len(source_rows))
+        np.savez(_patch_path(directory, source, shard), row=source_rows,
+                 receiver_old=np.where(current[part], balances[part], 0),
+                 receiver_new=np.where(current[part], balances[part] + credit, 0))
+        offset += len(source_rows)
+    return int(offset - count_sender - count_receiver)
+
+
+def finalize_shard(directory, shard, output_path, format=None, sink_options=None):
+    """
+    按结算结果改写一个分片暂存的交易余额, 写出最终输出
+
+    Args:
+        directory (str): 暂存目录
+        shard (int): 分片序号
+        output_path (str): 分片的输出文件
+        format (str, optional): 输出格式, 默认按扩展名推断
+        sink_options (dict, optional): 传给输出端的其他参数
+
+    Returns:
+        int: 写出的行数
+    """
+    with np.load(_settled_path(directory, shard)) as data:
+        settled = {name: data[name] for name in data.files}
+    # 付给其他分片的交易, 收款余额由收款分片算出
+    for path in glob.glob(os.path.join(directory, f"patch-{shard:05d}-from-*.npz")):
+        with np.load(path) as data:
+            rows = data['row']
+            settled['receiver_mask'][rows] = True
+            settled['receiver_old'][rows] = data['receiver_old']
+            settled['receiver_new'][rows] = data['receiver_new']
+
+    start = 0
+    with open_sink(output_path, format, **(sink_options or {})) as sink:
+        for batch in read_spool(directory, shard):
+            rows = slice(start, start + len(batch['amount']))
+            for side in ('sender', 'receiver'):
+                mask = settled[f'{side}_mask'][rows]
+                for suffix in ('old', 'new'):
+                    column = f'{side}_card_balance_{suffix}'
+                    batch[column] = np.where(mask, settled[f'{side}_{suffix}'][rows], batch[column])
+            sink.write(batch)
+            start = rows.stop
+        written = sink.rows
+    for path in _spool_paths(directory, shard):
+        os.remove(path)
+    return written
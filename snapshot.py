@@ -0,0 +1,121 @@
+import gc
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+from generate_person import BankCard, CardLedger, Person
+from social_graph import CounterpartyGraph
+
+"""
+    数据集快照
+    把人员属性、银行卡账本(含期末余额)、交易对手图和已生成的日期范围保存为一个 .npz 文件，
+    追加模式直接加载数组恢复 Person / 账本，不再重新解析 CSV，只生成新的日期窗口
+"""
+
+SNAPSHOT_VERSION = 1
+
+# Person 的属性列, 顺序与 Person.__init__ 的参数一致
+PERSON_FIELDS = ['person_id', 'name', 'gender', 'age', 'occupation', 'income_level', 'monthly_income',
+                 'marital_status', 'address', 'education', 'credit_score']
+PERSON_INTEGER_FIELDS = ('age', 'monthly_income', 'credit_score')
+
+
+def save_snapshot(path, people, end_date, graph=None, metadata=None):
+    """
+    保存快照(先写临时文件再替换, 中途失败不会破坏旧快照)
+
+    Args:
+        path (str): 快照路径(.npz)
+        people (list): 交易人员(Person)列表, 须共用同一个账本
+        end_date (date): 已生成交易的最后一天
+        graph (CounterpartyGraph, optional): 交易对手图
+        metadata (dict, optional): 其他需要记录的信息
+    """
+    arrays = {}
+    for field in PERSON_FIELDS:
+        values = [getattr(person, field) for person in people]
+        arrays[f'person_{field}'] = np.asarray(values, dtype=np.int64 if field in PERSON_INTEGER_FIELDS else str)
+    arrays['person_index'] = np.asarray([person.index for person in people], dtype=np.int64)
+
+    ledger = people[0].ledger
+    arrays.update({f'ledger_{name}': values for name, values in ledger.to_arrays().items()})
+
+    if graph is not None:
+        arrays['graph_indptr'] = graph.indptr
+        arrays['graph_neighbors'] = graph.neighbors
+        if graph.communities is not None:
+            arrays['graph_communities'] = graph.communities
+
+    info = {
+        'version': SNAPSHOT_VERSION,
+        'end_date': end_date.isoformat(),
+        'num_persons': len(people),
+        'num_cards': len(ledger),
+        **(metadata or {}),
+    }
+    arrays['metadata'] = np.array(json.dumps(info, ensure_ascii=False))
+
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temporary, path)
+
+
+def load_snapshot(path, rng=None):
+    """
+    加载快照
+
+    Args:
+        path (str): 快照路径
+        rng (np.random.Generator, optional): 重建账本之后新开卡时使用的随机数生成器
+
+    Returns:
+        tuple: (people, graph, metadata) 没有保存交易对手图时 graph 为 None
+    """
+    with np.load(path) as data:
+        metadata = json.loads(str(data['metadata']))
+        if metadata.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {metadata.get('version')}")
+
+        ledger = CardLedger.from_arrays({name[len('ledger_'):]: data[name] for name in data.files
+                                         if name.startswith('ledger_')}, rng=rng)
+        columns = [data[f'person_{field}'].tolist() for field in PERSON_FIELDS]
+        indices = data['person_index']
+
+        graph = None
+        if 'graph_indptr' in data.files:
+            graph = CounterpartyGraph(data['graph_indptr'], data['graph_neighbors'],
+                                      data['graph_communities'] if 'graph_communities' in data.files else None)
+
+    # 与批量生成时一样, 大批量创建对象时暂停循环垃圾回收
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        people = [Person(*row, ledger=ledger, index=index) for row, index in zip(zip(*columns), indices.tolist())]
+        indptr, cards = ledger.owner_cards()
+        cards = cards.tolist()
+        starts, stops = indptr[indices].tolist(), indptr[indices + 1].tolist()
+        view = BankCard.view
+        for person, start, stop in zip(people, starts, stops):
+            person.cards = [view(ledger, card, person) for card in cards[start:stop]]
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return people, graph, metadata
+
+
+def next_window(metadata, days=1):
+    """
+    快照之后的下一个日期窗口
+
+    Args:
+        metadata (dict): load_snapshot 返回的快照信息
+        days (int): 窗口天数
+
+    Returns:
+        tuple: (start_date, end_date) 含两端
+    """
+    start = date.fromisoformat(metadata['end_date']) + timedelta(days=1)
+    return start, start + timedelta(days=days - 1)
@@ -0,0 +1,139 @@
+import numpy as np
+
+from seeding import make_rng
+
+"""
+    交易对手图
+    人员划分为若干社区，每人的出度服从幂律分布；每条边以一定比例连向本社区成员，
+    其余按度数成比例连向全体人员(Chung-Lu 式优先连接)。
+    图以 CSR 邻接数组保存(边终点用 int32)，按发送方抽取接收方只需一次下标计算
+"""
+
+
+class CounterpartyGraph:
+    """
+    CSR 交易对手图: 节点 v 的对手为 neighbors[indptr[v]:indptr[v + 1]]，重复边表示更频繁的往来
+    """
+
+    def __init__(self, indptr, neighbors, communities=None):
+        """
+        Args:
+            indptr (np.ndarray): int64, 长度为节点数 + 1
+            neighbors (np.ndarray): int32 / int64 边终点
+            communities (np.ndarray, optional): 每个节点所属社区
+        """
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.communities = communities
+
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.neighbors)
+
+    @property
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    @classmethod
+    def build(cls, num_nodes, avg_degree=8, community_size=50, local_fraction=0.8, degree_exponent=2.5,
+              max_degree=None, rng=None, chunk_edges=1 << 24):
+        """
+        构造交易对手图
+
+        Args:
+            num_nodes (int): 节点数(人数), 至少 2
+            avg_degree (float): 平均出度
+            community_size (int): 平均社区人数, 实际在 0.5-1.5 倍之间均匀分布
+            local_fraction (float): 连向本社区的边的比例
+            degree_exponent (float): 出度幂律分布的指数(>2)
+            max_degree (int, optional): 出度上限, 默认 min(节点数 - 1, 平均出度的 100 倍)
+            rng (np.random.Generator | int, optional): 随机数生成器或种子
+            chunk_edges (int): 每次生成的边数上限, 控制构造时的临时内存
+        """
+        if num_nodes < 2:
+            raise ValueError("交易对手图至少需要 2 个节点")
+        rng = make_rng(rng)
+        if max_degree is None:
+            max_degree = int(avg_degree * 100)
+        max_degree = max(1, min(max_degree, num_nodes - 1))
+
+        # 出度: 连续帕累托分布取整, x_min 使期望约等于 avg_degree
+        x_min = avg_degree * (degree_exponent - 2) / (degree_exponent - 1)
+        raw = x_min * (1 - rng.random(num_nodes)) ** (-1 / (degree_exponent - 1))
+        degrees = np.clip(np.rint(raw), 1, max_degree).astype(np.int64)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+
+        index_type = np.int32 if num_nodes < 2 ** 31 else np.int64
+
+        # 社区: 连续的节点区间
+        low, high = max(community_size // 2, 1), max(community_size * 3 // 2, 1)
+        sizes = rng.integers(low, high + 1, num_nodes // low + 1)
+        bounds = np.cumsum(sizes)
+        count = int(np.searchsorted(bounds, num_nodes)) + 1
+        bounds = np.minimum(bounds[:count], num_nodes)
+        starts = np.r_[0, bounds[:-1]]
+        communities = np.repeat(np.arange(count, dtype=index_type), bounds - starts)
+        community_starts, community_sizes = starts, bounds - starts
+
+        # 全局连接按度数成比例: 在度数累积和上二分查找
+        attachment = indptr[1:]
+        total_degree = int(attachment[-1])
+
+        neighbors = np.empty(total_degree, dtype=index_type)
+        source_start = 0
+        while source_start < num_nodes:
+            # 每块包含尽量多的发送方, 边数不超过 chunk_edges
+            source_stop = int(np.searchsorted(indptr, indptr[source_start] + chunk_edges, side='right')) - 1
+            source_stop = min(max(source_stop, source_start + 1), num_nodes)
+            edge_start, edge_stop = indptr[source_start], indptr[source_stop]
+
+            sources = np.repeat(np.arange(source_start, source_stop), degrees[source_start:source_stop])
+            community = communities[sources]
+            offsets = (rng.random(len(sources)) * community_sizes[community]).astype(np.int64)
+            targets = community_starts[community] + offsets
+
+            # 随机查询的二分查找缓存命中差: 先排序再查找, 最后随机打乱分配给各条边, 分布不变
+            remote = np.flatnonzero(rng.random(len(sources)) >= local_fraction)
+            stubs = np.sort(rng.integers(total_degree, size=len(remote)))
+            targets[remote] = np.searchsorted(attachment, stubs, side='right')[rng.permutation(len(remote))]
+
+            # 去掉自环: 落到自己时顺延到下一个节点
+            targets = np.where(targets == sources, (targets + 1) % num_nodes, targets)
+            neighbors[edge_start:edge_stop] = targets
+            source_start = source_stop
+
+        return cls(indptr, neighbors, communities)
+
+    def sample_neighbors(self, nodes, rng):
+        """
+        为每个节点从其对手中等概率抽取一个(重复边按次数加权)，每个样本 O(1)
+
+        Args:
+            nodes (np.ndarray): 节点下标
+            rng (np.random.Generator): 随机数生成器
+
+        Returns:
+            np.ndarray: int64 对手节点下标
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        start = self.indptr[nodes]
+        degree = self.indptr[nodes + 1] - start
+        return self.neighbors[start + (rng.random(len(nodes)) * degree).astype(np.int64)].astype(np.int64)
+
+    def save(self, path):
+        """保存为 .npz"""
+        arrays = {'indptr': self.indptr, 'neighbors': self.neighbors}
+        if self.communities is not None:
+            arrays['communities'] = self.communities
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """从 .npz 加载"""
+        with np.load(path) as data:
+            return cls(data['indptr'], data['neighbors'], data['communities'] if 'communities' in data else None)
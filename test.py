@@ -1,52 +1,67 @@
-import random
-from datetime import timedelta
+from datetime import datetime
+
+import numpy as np
+
+from timestamp_sampler import SECONDS_PER_DAY, TimestampSampler, epoch_seconds, to_datetime64
 
 
 class IncrementalTimestampGenerator:
-    def __init__(self, start_date, end_date):
+    def __init__(self, start_date, end_date, rng=None):
         self.start_date = start_date
         self.end_date = end_date
         self.last_timestamp = start_date  # 初始化时使用开始时间
 
-    def _generate_weighted_time(self):
-        """生成加权随机时间（白天权重高）"""
+        # 加权随机时间（白天权重高）
         hour_weights = [1]*24
         for h in range(9, 18):  # 9AM-6PM权重高
             hour_weights[h] = 3
-        hour = random.choices(range(24), weights=hour_weights)[0]
-        return hour, random.randint(0, 59), random.randint(0, 59)
+        self.sampler = TimestampSampler(start_date, end_date, hour_weights=hour_weights, rng=rng)
 
-    def generate(self):
-        """生成严格递增的时间戳"""
-        # 计算剩余时间范围
-        remaining_duration = self.end_date - self.last_timestamp
-        if remaining_duration.total_seconds() <= 0:
-            raise ValueError("No more timestamps can be generated")
+    def _sample_after(self, num):
+        """
+        在 (上一个时间戳, 结束时间] 内生成 num 个严格递增的时间戳(秒)
 
-        # 在剩余时间中随机选择一个增量（至少1秒）
-        max_increment = remaining_duration.total_seconds()
-        increment = random.randint(1, int(max_increment))
+        TimestampSampler.sample 只限制日期, 第一天的时间部分可能早于上一个时间戳, 最后一天的可能晚于结束时间,
+        这两类在各自那一天的有效时间段内重新均匀抽取; 排序后逐个至少加 1 秒, 再从后往前压到结束时间以内
+        """
+        low = epoch_seconds(self.last_timestamp) + 1
+        end = self.sampler.end
+        if end - low + 1 < num:
+            raise ValueError("No more timestamps can be generated")
 
-        # 生成新时间戳
-        new_timestamp = self.last_timestamp + timedelta(seconds=increment)
+        rng = self.sampler.rng
+        timestamps = self.sampler.sample(num, start=low)
+        early = timestamps < low
+        timestamps[early] = rng.integers(low, min(low // SECONDS_PER_DAY * SECONDS_PER_DAY + SECONDS_PER_DAY, end + 1),
+                                         early.sum())
+        late = timestamps > end
+        timestamps[late] = rng.integers(max(end // SECONDS_PER_DAY * SECONDS_PER_DAY, low), end + 1, late.sum())
 
-        # 应用加权时间（只修改时间部分，保持日期递增）
-        hour, minute, second = self._generate_weighted_time()
-        new_timestamp = new_timestamp.replace(
-            hour=hour,
-            minute=minute,
-            second=second,
-            microsecond=0
-        )
+        timestamps = np.sort(timestamps)
+        offsets = np.arange(num, dtype=np.int64)
+        timestamps = np.maximum.accumulate(timestamps - offsets) + offsets
+        return np.minimum(timestamps, end - (num - 1) + offsets)
 
-        # 确保不会超出结束时间
-        if new_timestamp > self.end_date:
-            new_timestamp = self.end_date
+    def generate(self):
+        """生成严格递增的时间戳"""
+        self.last_timestamp = to_datetime64(self._sample_after(1)[0]).item()
+        return self.last_timestamp
 
-        self.last_timestamp = new_timestamp
-        return new_timestamp
+    def generate_batch(self, num):
+        """
+        一次生成 num 个严格递增的时间戳, 都晚于上一个时间戳且不晚于结束时间
 
+        Returns:
+            np.ndarray: int64 秒, 需要日期时间时用 to_datetime64 转换
+        """
+        timestamps = self._sample_after(num)
+        if num > 0:
+            self.last_timestamp = to_datetime64(timestamps[-1]).item()
+        return timestamps
 
 
 if __name__ == "__main__":
-
+    generator = IncrementalTimestampGenerator(datetime(2023, 1, 1), datetime(2023, 12, 31),
+                                              rng=np.random.default_rng(0))
+    print(generator.generate())
+    print(to_datetime64(generator.generate_batch(5)))
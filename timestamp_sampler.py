@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+EPOCH = datetime(1970, 1, 1)
+
+# 加权时间段: (开始小时, 结束小时, 权重)
+TIME_SLOTS = [
+    (9, 18, 5),  # 白天正常交易时间 9:00 - 18:00，权重为5
+    (0, 6, 1),   # 凌晨异常交易时间 00:00 - 6:00，权重为1
+    (6, 9, 2),   # 早上 6:00 - 9:00，权重为2
+    (18, 24, 2)  # 晚上 18:00 - 24:00，权重为2
+]
+
+
+def slot_hour_weights(time_slots):
+    """把时间段权重换算成24个小时各自的权重: 先按权重选时段、再在时段内均匀选小时，与逐小时加权等价"""
+    weights = np.zeros(24, dtype=np.float64)
+    for start_hour, end_hour, weight in time_slots:
+        weights[start_hour:end_hour] += weight / (end_hour - start_hour)
+    return weights
+
+
+def epoch_seconds(value):
+    """把 datetime / np.datetime64 / 时间字符串转为 int64 秒"""
+    return int(np.datetime64(value, 's').astype(np.int64))
+
+
+def to_datetime64(seconds):
+    """把 int64 秒数组转为 datetime64[s]，只在最终导出时调用"""
+    return np.asarray(seconds, dtype=np.int64).astype('datetime64[s]')
+
+
+class TimestampSampler:
+    """
+    批量时间戳采样器
+    一次生成 N 个时间戳，以 int64 秒(datetime64[s] 的底层表示)返回:
+    日期在 [开始, 结束] 内均匀抽取，时间部分按小时权重抽取，精确到秒
+    """
+
+    def __init__(self, start_date, end_date, time_slots=None, hour_weights=None, rng=None):
+        """
+        Args:
+            start_date (datetime): 开始日期
+            end_date (datetime): 结束日期
+            time_slots (list, optional): (开始小时, 结束小时, 权重) 列表, 默认使用 TIME_SLOTS
+            hour_weights (list, optional): 24个小时各自的权重, 给出时优先于 time_slots
+            rng (np.random.Generator, optional): 随机数生成器
+        """
+        self.start = epoch_seconds(start_date)
+        self.end = epoch_seconds(end_date)
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        if hour_weights is None:
+            hour_weights = slot_hour_weights(time_slots if time_slots is not None else TIME_SLOTS)
+        hour_weights = np.asarray(hour_weights, dtype=np.float64)
+        self.hour_cdf = np.cumsum(hour_weights) / hour_weights.sum()
+
+        # sample_one 使用的预采样池
+        self._pool = []
+        self._pool_size = 1024
+
+    def sample_hours(self, num):
+        """按小时权重批量抽取小时"""
+        hours = np.searchsorted(self.hour_cdf, self.rng.random(num), side='right')
+        return np.minimum(hours, 23)
+
+    def sample(self, num, start=None, end=None):
+        """
+        批量生成时间戳
+
+        Args:
+            num (int): 数量
+            start (int, optional): 日期下限(秒), 默认为开始日期
+            end (int, optional): 日期上限(秒), 默认为结束日期
+
+        Returns:
+            np.ndarray: int64 秒
+        """
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        days = (start + self.rng.integers(0, end - start + 1, num)) // SECONDS_PER_DAY * SECONDS_PER_DAY
+        return days + self.sample_hours(num) * 3600 + self.rng.integers(0, 3600, num)
+
+    def sample_sorted(self, num, start=None, end=None):
+        """批量生成严格递增的时间戳(秒)，超出上限时截断到上限"""
+        end = self.end if end is None else end
+        timestamps = np.sort(self.sample(num, start, end))
+        # t[i] = max(t[i], t[i-1] + 1): 减去下标后取前缀最大值再加回
+        offsets = np.arange(num, dtype=np.int64)
+        timestamps = np.maximum.accumulate(timestamps - offsets) + offsets
+        return np.minimum(timestamps, end)
+
+    def sample_start_days(self, spans):
+        """
+        为一组跨度为 spans 天的案例抽取起始日(距 1970-01-01 的天数):
+        整个案例放得下时完全落在日期范围内，否则起始日在使案例与范围有重叠的位置中均匀抽取
+
+        Args:
+            spans (np.ndarray): 每个案例首末两笔交易相隔的天数
+
+        Returns:
+            np.ndarray: int64 天数
+        """
+        spans = np.asarray(spans, dtype=np.int64)
+        first_day = self.start // SECONDS_PER_DAY
+        last_day = self.end // SECONDS_PER_DAY
+        fits = spans <= last_day - first_day
+        low = np.where(fits, first_day, first_day - spans)
+        high = np.where(fits, last_day - spans, last_day)
+        return low + (self.rng.random(len(spans)) * (high - low + 1)).astype(np.int64)
+
+    def sample_one(self):
+        """生成单个时间戳，返回 datetime；每次从预采样池中取，池空时批量补充"""
+        if not self._pool:
+            self._pool = self.sample(self._pool_size).tolist()
+        return EPOCH + timedelta(seconds=self._pool.pop())
@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+from money import to_yuan
+from timestamp_sampler import epoch_seconds, to_datetime64
+
+# 交易表的列及其存储类型
+TRANSACTION_COLUMNS = [
+    ("sender_id", object),
+    ("sender_card_bank", object),
+    ("sender_card_number", object),
+    ("sender_card_balance_old", np.int64),
+    ("sender_card_balance_new", np.int64),
+    ("receiver_id", object),
+    ("receiver_card_bank", object),
+    ("receiver_card_number", object),
+    ("receiver_card_balance_old", np.int64),
+    ("receiver_card_balance_new", np.int64),
+    ("amount", np.int64),
+    ("timestamp", np.int64),
+    ("transaction_type", object),
+    ("risk_level", np.int64),
+    ("typology", object),
+    ("case_id", np.int64),
+    ("group_id", np.int64),
+    ("total_amount", np.int64),
+    ("participants_count", np.int64),
+]
+
+# 标注列在正常交易中的取值、AA制群组列在非AA制交易中的取值; 逐笔生成的交易记录可以不带这些键
+LABEL_DEFAULTS = {"typology": "normal", "case_id": -1, "group_id": -1, "total_amount": 0, "participants_count": 0}
+
+TRANSACTION_COLUMN_NAMES = [name for name, _ in TRANSACTION_COLUMNS]
+
+# 时间戳列在缓冲区内以 int64 秒保存，只在导出时转换为日期时间
+TIMESTAMP_COLUMNS = ("timestamp",)
+
+# 金额列在缓冲区内以 int64 分保存，只在导出时转换为元
+MONEY_COLUMNS = ("sender_card_balance_old", "sender_card_balance_new", "receiver_card_balance_old",
+                 "receiver_card_balance_new", "amount", "total_amount")
+
+
+def _to_epoch_seconds(values):
+    """把 datetime64 / 时间字符串数组转为 int64 秒，int64 数组原样返回"""
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        return values
+    return values.astype('datetime64[s]').astype(np.int64)
+
+
+class TransactionBuffer:
+    """
+    列式交易缓冲区
+    每一列预先分配固定类型的数组，容量不足时按倍数扩容，追加的均摊代价为 O(1)，
+    避免逐次 pd.concat 带来的整表复制
+    """
+
+    def __init__(self, capacity=1024, columns=None):
+        """
+        Args:
+            capacity (int): 初始容量(行数)
+            columns (list, optional): (列名, dtype) 列表, 默认使用 TRANSACTION_COLUMNS
+        """
+        self.columns = list(columns) if columns is not None else list(TRANSACTION_COLUMNS)
+        self._size = 0
+        self._capacity = max(int(capacity), 1)
+        self._data = {name: np.empty(self._capacity, dtype=dtype) for name, dtype in self.columns}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def _reserve(self, extra):
+        """确保还能容纳 extra 行，不足时容量翻倍"""
+        required = self._size + extra
+        if required <= self._capacity:
+            return
+
+        capacity = self._capacity
+        while capacity < required:
+            capacity *= 2
+
+        for name, dtype in self.columns:
+            grown = np.empty(capacity, dtype=dtype)
+            grown[:self._size] = self._data[name][:self._size]
+            self._data[name] = grown
+        self._capacity = capacity
+
+    def append(self, record):
+        """
+        追加一条交易记录
+
+        Args:
+            record (dict): 以列名为键的交易记录
+        """
+        self._reserve(1)
+        index = self._size
+        for name, _ in self.columns:
+            value = record[name] if name in record else LABEL_DEFAULTS[name]
+            if name in TIMESTAMP_COLUMNS and not isinstance(value, (int, np.integer)):
+                value = epoch_seconds(value)
+            self._data[name][index] = value
+        self._size += 1
+
+    def extend_records(self, records):
+        """
+        追加多条交易记录
+
+        Args:
+            records (list): 交易记录(dict)列表
+        """
+        self._reserve(len(records))
+        for record in records:
+            self.append(record)
+
+    def extend(self, columns):
+        """
+        按列批量追加
+
+        Args:
+            columns (dict | pd.DataFrame): 列名到等长数组的映射
+        """
+        length = len(columns[self.columns[0][0]])
+        if length == 0:
+            return
+        self._reserve(length)
+        start, stop = self._size, self._size + length
+        for name, dtype in self.columns:
+            values = columns[name] if name in columns else np.full(length, LABEL_DEFAULTS[name], dtype=dtype)
+            if name in TIMESTAMP_COLUMNS:
+                values = _to_epoch_seconds(values)
+            self._data[name][start:stop] = np.asarray(values)
+        self._size = stop
+
+    def column(self, name):
+        """返回某列已写入部分的视图(不复制)"""
+        return self._data[name][:self._size]
+
+    def pop_batch(self, size):
+        """
+        取出最前面的 size 行(复制后返回)，剩余行前移
+
+        Returns:
+            dict: 列名到数组的映射
+        """
+        size = min(size, self._size)
+        batch = {name: self._data[name][:size].copy() for name, _ in self.columns}
+        remaining = self._size - size
+        for name, _ in self.columns:
+            data = self._data[name]
+            data[:remaining] = data[size:self._size]
+        self._size = remaining
+        return batch
+
+    def clear(self):
+        """清空缓冲区，保留已分配的容量"""
+        self._size = 0
+
+    def to_dataframe(self, cents=False):
+        """
+        一次性导出为 DataFrame，时间戳列在此转换为 datetime64[s]
+
+        Args:
+            cents (bool): 为 True 时金额列保留 int64 分, 否则转换为元
+        """
+        return columns_to_dataframe({name: self._data[name][:self._size] for name, _ in self.columns}, cents=cents)
+
+    def to_arrow(self, cents=False):
+        """一次性导出为 pyarrow.Table (需要安装 pyarrow)，时间戳列在此转换为 timestamp[s]，金额列默认转换为元"""
+        import pyarrow as pa
+
+        columns = {}
+        for name, _ in self.columns:
+            values = self._data[name][:self._size]
+            if name in TIMESTAMP_COLUMNS:
+                columns[name] = pa.array(values).cast(pa.timestamp('s'))
+            elif name in MONEY_COLUMNS and not cents:
+                columns[name] = pa.array(to_yuan(values))
+            else:
+                columns[name] = pa.array(values)
+        return pa.table(columns)
+
+
+def columns_to_dataframe(columns, cents=False):
+    """
+    把内部列(时间戳为 int64 秒、金额为 int64 分)导出为 DataFrame
+
+    Args:
+        columns (dict): 列名到数组的映射
+        cents (bool): 为 True 时金额列保留 int64 分, 否则转换为元
+    """
+    frame = {}
+    for name, values in columns.items():
+        if name in TIMESTAMP_COLUMNS:
+            frame[name] = to_datetime64(values)
+        elif name in MONEY_COLUMNS and not cents:
+            frame[name] = to_yuan(values)
+        else:
+            frame[name] = np.array(values, copy=True)
+    return pd.DataFrame(frame)
+
+
+def records_to_dataframe(records, cents=False):
+    """把逐笔生成的交易记录(dict)列表导出为 DataFrame"""
+    buffer = TransactionBuffer(capacity=len(records))
+    buffer.extend_records(records)
+    return buffer.to_dataframe(cents=cents)
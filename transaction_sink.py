@@ -0,0 +1,266 @@
+import os
+import time
+
+import numpy as np
+
+import profiling
+from timestamp_sampler import SECONDS_PER_DAY
+from transaction_buffer import columns_to_dataframe
+
+
+class TransactionSink:
+    """
+    交易输出端基类: 按批增量写出，写出时才把内部列(int64 秒 / int64 分)转换为导出格式
+    同时统计写出的行数、批数、字节数和吞吐量
+    """
+
+    # 性能统计中写出阶段的名称和写出字节数的计数器名称
+    stage_name = "write"
+    bytes_counter = "bytes_written"
+
+    def __init__(self, path, progress_every=0, resume=None):
+        """
+        Args:
+            path (str): 输出文件路径
+            progress_every (int): 每写出这么多行打印一次进度, 0 表示不打印
+            resume (dict, optional): 检查点中保存的 checkpoint_state(), 给出时从该位置继续写出
+        """
+        self.path = path
+        self.rows = resume['rows'] if resume else 0
+        self.batches = resume['batches'] if resume else 0
+        self.progress_every = progress_every
+        self._next_progress = (self.rows // progress_every + 1) * progress_every if progress_every else 0
+        self._start = time.perf_counter()
+
+    def write(self, columns):
+        """
+        写出一批交易
+
+        Args:
+            columns (dict): 列名到等长数组的映射
+        """
+        rows = len(next(iter(columns.values())))
+        with profiling.stage(self.stage_name) as stage:
+            stage.add_rows(rows)
+            self._write(columns)
+        self.rows += rows
+        self.batches += 1
+
+        if self.progress_every and self.rows >= self._next_progress:
+            print(self.format_progress())
+            self._next_progress = (self.rows // self.progress_every + 1) * self.progress_every
+
+    def _write(self, columns):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def checkpoint_state(self):
+        """断点续跑需要的写出位置, 只在缓冲区全部写出后调用"""
+        raise ValueError(f"{type(self).__name__} 不支持断点续跑")
+
+    @property
+    def bytes_written(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def progress(self):
+        """当前进度和吞吐量"""
+        seconds = time.perf_counter() - self._start
+        bytes_written = self.bytes_written
+        return {
+            'rows': self.rows,
+            'batches': self.batches,
+            'bytes': bytes_written,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.rows / seconds, 1) if seconds > 0 else 0.0,
+            'mb_per_second': round(bytes_written / 2 ** 20 / seconds, 2) if seconds > 0 else 0.0,
+        }
+
+    def format_progress(self):
+        progress = self.progress()
+        return (f"{self.path}: {progress['rows']} 行 / {progress['batches']} 批, "
+                f"{progress['bytes'] / 2 ** 20:.1f} MB, {progress['seconds']:.1f} 秒, "
+                f"{progress['rows_per_second']:.0f} 行/秒")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        profiling.count(self.bytes_counter, self.bytes_written)
+
+
+class _TextSink(TransactionSink):
+    """逐批追加到同一个文本文件的输出端"""
+
+    def __init__(self, path, encoding='utf-8', resume=None, **kwargs):
+        super().__init__(path, resume=resume, **kwargs)
+        if resume is None:
+            self._file = open(path, 'w', encoding=encoding, newline='')
+        else:
+            # 丢弃检查点之后写出的部分, 再接着追加
+            with open(path, 'r+b') as file:
+                file.truncate(resume['offset'])
+            self._file = open(path, 'a', encoding=encoding, newline='')
+
+    def checkpoint_state(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'rows': self.rows, 'batches': self.batches, 'offset': self._file.buffer.tell()}
+
+    @property
+    def bytes_written(self):
+        if self._file.closed:
+            return super().bytes_written
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+
+class CsvSink(_TextSink):
+    """CSV 输出, 只在第一批写表头"""
+
+    def __init__(self, path, encoding='utf-8-sig', **kwargs):
+        super().__init__(path, encoding=encoding, **kwargs)
+
+    def _write(self, columns):
+        columns_to_dataframe(columns).to_csv(self._file, index=False, header=self.batches == 0)
+
+
+class JsonlSink(_TextSink):
+    """JSON Lines 输出, 每行一笔交易"""
+
+    def _write(self, columns):
+        text = columns_to_dataframe(columns).to_json(orient='records', lines=True, force_ascii=False,
+                                                     date_format='iso', date_unit='s')
+        self._file.write(text if text.endswith('\n') else text + '\n')
+
+
+class ParquetSink(TransactionSink):
+    """
+    Parquet 输出(需要安装 pyarrow), 每批写成一个或多个行组
+    开户行、交易类型做字典编码，时间戳为 int64 秒，金额为 decimal128(18, 2) 或 int64 分
+    """
+
+    def __init__(self, path, row_group_size=None, money='decimal', timestamp='int64', **kwargs):
+        """
+        Args:
+            row_group_size (int, optional): 每个行组的最大行数, 默认每批一个行组
+            money (str): decimal / cents
+            timestamp (str): int64 / timestamp
+        """
+        super().__init__(path, **kwargs)
+        self.row_group_size = row_group_size
+        self.money = money
+        self.timestamp = timestamp
+        self._writer = None
+
+    def _write(self, columns):
+        from arrow_export import parquet_writer, transactions_to_arrow
+
+        table = transactions_to_arrow(columns, money=self.money, timestamp=self.timestamp)
+        if self._writer is None:
+            self._writer = parquet_writer(self.path, table.schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class PartitionedSink(TransactionSink):
+    """
+    按交易日期分区的输出: 每天一个目录 date=YYYY-MM-DD，目录下每次运行新写一个 part-NNNNN 文件，
+    已有文件不会被改写，因此可以反复向同一输出目录追加新的日期窗口
+    """
+
+    def __init__(self, path, format='csv', ordered=True, **kwargs):
+        """
+        Args:
+            path (str): 输出根目录
+            format (str): 各分区文件的格式, 见 SINKS
+            ordered (bool): 输入是否按时间戳非降序; 为 True 时早于当前批的分区写完即关闭
+            **kwargs: progress_every 用于本输出端, 其余参数传给各分区的输出端
+        """
+        super().__init__(path, progress_every=kwargs.pop('progress_every', 0))
+        if format not in SINKS:
+            raise ValueError(f"不支持的输出格式: {format}, 可选 {sorted(SINKS)}")
+        self.format = format
+        self.ordered = ordered
+        self.options = kwargs
+        self.partitions = []
+        self._open = {}
+        self._closed_bytes = 0
+
+    def partition_path(self, day):
+        """某天(距 1970-01-01 的天数)的新分区文件路径"""
+        directory = os.path.join(self.path, f"date={np.datetime64(day, 'D')}")
+        os.makedirs(directory, exist_ok=True)
+        part = 0
+        while os.path.exists(os.path.join(directory, f"part-{part:05d}.{self.format}")):
+            part += 1
+        return os.path.join(directory, f"part-{part:05d}.{self.format}")
+
+    def _write(self, columns):
+        days = np.asarray(columns['timestamp'], dtype=np.int64) // SECONDS_PER_DAY
+        if len(days) == 0:
+            return
+        if self.ordered:
+            for day in [day for day in self._open if day < days.min()]:
+                self._close_partition(day)
+
+        order = np.argsort(days, kind='stable')
+        sorted_days = days[order]
+        starts = np.flatnonzero(np.r_[True, sorted_days[1:] != sorted_days[:-1]])
+        for start, stop in zip(starts, np.r_[starts[1:], len(days)]):
+            day = int(sorted_days[start])
+            sink = self._open.get(day)
+            if sink is None:
+                path = self.partition_path(day)
+                sink = self._open[day] = SINKS[self.format](path, **self.options)
+                # 分区的写出耗时已计入外层的 write 阶段
+                sink.stage_name = "write.partition"
+                self.partitions.append(path)
+            rows = order[start:stop]
+            sink.write({name: values[rows] for name, values in columns.items()})
+
+    def _close_partition(self, day):
+        sink = self._open.pop(day)
+        sink.close()
+        self._closed_bytes += sink.bytes_written
+
+    @property
+    def bytes_written(self):
+        return self._closed_bytes + sum(sink.bytes_written for sink in self._open.values())
+
+    def close(self):
+        for day in list(self._open):
+            self._close_partition(day)
+
+
+SINKS = {
+    'csv': CsvSink,
+    'jsonl': JsonlSink,
+    'parquet': ParquetSink,
+}
+
+
+def open_sink(path, format=None, partition_by_date=False, **kwargs):
+    """
+    按格式(默认按扩展名推断)打开输出端
+
+    Args:
+        path (str): 输出文件路径, 按日期分区时为输出根目录
+        format (str, optional): csv / jsonl / parquet
+        partition_by_date (bool): 是否按交易日期分区输出(见 PartitionedSink), 此时格式默认为 csv
+    """
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip('.').lower()
+    if partition_by_date:
+        return PartitionedSink(path, format=format or 'csv', **kwargs)
+    if format not in SINKS:
+        raise ValueError(f"不支持的输出格式: {format}, 可选 {sorted(SINKS)}")
+    return SINKS[format](path, **kwargs)